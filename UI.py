@@ -14,11 +14,27 @@ time.
 '''
 # Importing tkinter and required libraries for the GUI interface and plotting features
 # Importing numpy for triginometric functions and 'simulation' module for trim functions
+import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 import numpy as np
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
 import simulation
+import engine
+import plotview
+import trimtable
+
+# Precomputed trim table, built with 'python trimtable.py'. Without it (or outside its envelope) trim is solved exactly.
+# A table built for other aero constants is not used.
+trim_table = None
+if os.path.exists(trimtable.DEFAULT_PATH):
+    try:
+        trim_table = trimtable.TrimTable.load()
+    except trimtable.StaleTableError as error:
+        print(f"{error}; solving trims exactly meanwhile")
 
 # Define the function to execute when the button is pressed
 def run_Trim():
@@ -33,7 +49,7 @@ def run_Trim():
            messagebox.showerror("Error", "Values out of range \n  Velocity from 30 to 343 m/s  \n gamma from -89 to 89 degrees ") 
         else:
         # Call your function with the provided values
-            trimParams = simulation.Trim(velocity, gamma)
+            trimParams = trimtable.trim_lookup(velocity, gamma, trim_table)
         
         # Display the result in a messagebox
         thrust_label.config(text=f"Thrust: {round(trimParams.thrust, 4)}")
@@ -42,14 +58,88 @@ def run_Trim():
         # Handle the case where a non-numeric value is entered
         messagebox.showerror("Error", "Please enter numeric values.")
 
-# Function to clear the output frame
-def clear_output_frame():
-    # Clears all widgets from the output frame.
-    for widget in output_frame.winfo_children():
-        widget.destroy()
+# State of the background simulation, shared between the worker thread and the Tk main thread.
+# 'samples' carries (t, y) pairs from the worker to the live plot, at most one per 'spacing' seconds of simulation.
+job = {"thread": None, "t": 0.0, "t_end": 1.0, "cancel": threading.Event(), "result": None, "error": None,
+       "samples": queue.Queue(), "spacing": 1.0, "next": 0.0}
+STREAM_SAMPLES = 500
+
+# Figure and canvas are created once and reused for every run; 'plotter' keeps the axes of the figure
+figure = None
+canvas = None
+plotter = simulation.Visualise()
+
+def simulation_worker(velocity, gamma, simulationRunTime, initialAltitude, resultList):
+    # Runs off the main thread; only writes to 'job', Tk is updated by 'poll_Simulation'
+    def progress(t, y):
+        job["t"] = t
+        if job["cancel"].is_set():
+            raise simulation.SimulationCancelled()
+        # Forward in time only, so the streamed line never turns back on a rejected step
+        if t >= job["next"]:
+            job["samples"].put((t, np.array(y, dtype=float)))
+            job["next"] = t + job["spacing"]
+    try:
+        job["result"] = engine.simulate(velocity, gamma, simulationRunTime, initialAltitude, resultList,
+                                        trim_table=trim_table, progress=progress)
+    except simulation.SimulationCancelled:
+        pass
+    except Exception as error:
+        job["error"] = error
+
+def drain_Samples():
+    # Draw the samples the worker has produced since the last poll
+    samples = []
+    while True:
+        try:
+            samples.append(job["samples"].get_nowait())
+        except queue.Empty:
+            break
+    if samples:
+        plotter.view.append([t for t, _ in samples], np.column_stack([y for _, y in samples]))
+
+def poll_Simulation():
+    progress_bar["value"] = 100 * min(job["t"] / job["t_end"], 1)
+    drain_Samples()
+    if job["thread"].is_alive():
+        root.after(100, poll_Simulation)
+        return
+
+    # Worker finished, was cancelled or failed; the streamed line stays for a cancelled or failed run
+    plotter.view.end_stream()
+    simulate_button.config(state="normal")
+    cancel_button.config(state="disabled")
+    if job["error"] is not None:
+        messagebox.showerror("Error", f"Simulation failed: {job['error']}")
+    elif job["result"] is not None:
+        progress_bar["value"] = 100
+        draw_Simulation(job["result"])
+    else:
+        progress_bar["value"] = 0
+
+def simulation_View():
+    # The figure, its canvas and the 'plotview.SimView' on it are created on the first run and reused
+    global figure, canvas
+    if figure is None:
+        figure = Figure(figsize=(9, 7))
+        canvas = FigureCanvasTkAgg(figure, master=output_frame)
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)  # Use pack geometry manager
+    if getattr(plotter, "view", None) is None or plotter.view.figure is not figure:
+        plotter.view = plotview.SimView(figure)
+    return plotter.view
+
+def draw_Simulation(trajectory):
+    # The finished run replaces the streamed samples
+    simulation_View()
+    plotter.Display_Sim(trajectory, fig=figure)
+
+def cancel_Simulation():
+    job["cancel"].set()
 
 def run_Simulation():
-    clear_output_frame()  # Clear the frame before running a new simulation
+    # Only one simulation at a time
+    if job["thread"] is not None and job["thread"].is_alive():
+        return
     
     try:
         # Get values
@@ -81,11 +171,16 @@ def run_Simulation():
             if velocity > 200 or gamma > np.deg2rad(89) or velocity < 65 or gamma < np.deg2rad(-89):
                messagebox.showerror("Error", "Flow separation is not simulated, these values may lead to unstable simulation")  
                
-            sim = simulation.A3(velocity, gamma, simulationRunTime, initialAltitude, resultList)
-            
-            fig = sim.Display_Sim(sim.data)
-            canvas = FigureCanvasTkAgg(fig, master=output_frame)
-            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)  # Use pack geometry manager
+            # Start the run in the background and poll it from the Tk event loop
+            job.update(t=0.0, t_end=max(simulationRunTime, 1e-9), result=None, error=None, next=0.0,
+                       spacing=simulationRunTime / STREAM_SAMPLES, samples=queue.Queue())
+            job["cancel"].clear()
+            simulation_View().begin_stream(job["t_end"])
+            job["thread"] = threading.Thread(target=simulation_worker, args=(velocity, gamma, simulationRunTime, initialAltitude, resultList), daemon=True)
+            job["thread"].start()
+            simulate_button.config(state="disabled")
+            cancel_button.config(state="normal")
+            root.after(100, poll_Simulation)
         
     except ValueError:
         # Handle the case where a non-numeric value is entered
@@ -145,8 +240,15 @@ entry7 = ttk.Entry(input_frame)
 entry7.grid(row=9, column=1)
 
 # Create a button to run the simulation in the input frame
-run_button = ttk.Button(input_frame, text="Simulate", command=run_Simulation)
-run_button.grid(row=10, column=0, columnspan=2, pady=10)
+simulate_button = ttk.Button(input_frame, text="Simulate", command=run_Simulation)
+simulate_button.grid(row=10, column=0, pady=10)
+
+cancel_button = ttk.Button(input_frame, text="Cancel", command=cancel_Simulation, state="disabled")
+cancel_button.grid(row=10, column=1, pady=10)
+
+# Progress of the running simulation, in simulated time
+progress_bar = ttk.Progressbar(input_frame, maximum=100)
+progress_bar.grid(row=11, column=0, columnspan=2, sticky="ew")
 
 # Create a label for instructions
 instructions_text = "Input initial velocity and path angle for trim conditions.\nSimulation parameters entered in the lower 5 boxes. ""Input time"" (times after start at which changes are executed) are entered as comma seperated integers.\nChanges in elevator and thrust are also comma seperated and are absolute step changes e.g. (-0.1,0,0.1) is change by -0.1 deg, dont change, change by 0.1 deg.\nIf change lists are unequal in length, the length of the shortest length is used.\n\nClick 'simulate' to display or reset graphs."
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'aerotable', is an alternative to the linear and quadratic fits in 'constants': the aerodynamic
+coefficients are interpolated from the tables themselves, keeping their nonlinearity at high angles of attack.
+    CL = CL(alpha) + CL_el(delta)
+    CM = CM(alpha) + CM_el(delta)
+    CD = CD(alpha) + K * (CL^2 - CL(alpha)^2)
+CD_list is measured at zero elevator, so the elevator only changes the induced drag, through the fitted K.
+
+Each table is a cubic spline (not-a-knot) through its points, precomputed once as cubics in powers of the variable on
+the bins of a uniform grid. The tables against the same variable share the grid, so one bin lookup gives CL, CM and
+CD together, and finding the bin is one multiplication and a truncation instead of a binary search. The bins are
+chosen so that the knots of the table fall on bin edges, so the bin cubics reproduce the spline exactly. Beyond the
+tables the coefficients continue linearly with the end slopes, through bins padded out to +-pi. Values and
+derivatives (used by 'Trim' and the Jacobians) accept scalars and arrays.
+
+An aircraft uses the tables when its 'aero' attribute is set, e.g. Aircraft(aero=aerotable.TABLE) or
+'constants.aero = aerotable.TABLE' for the default aircraft; with 'aero' None the fits are used as before.
+'''
+
+# Import libraries & modules
+import hashlib
+import numpy as np
+from scipy.interpolate import CubicSpline
+import constants as c
+
+def uniform_width(x, max_split=16, tol=1e-9):
+    # Largest bin width that puts every knot of x on a bin edge; a fine grid if the spacings have no common divisor
+    spacing = np.min(np.diff(x))
+    for split in range(1, max_split + 1):
+        width = spacing / split
+        position = (x - x[0]) / width
+        if np.all(np.abs(position - np.round(position)) < tol * len(x)):
+            return width
+    return spacing / max_split
+
+#------------------------------------------------------------------------------
+# Several coefficients against one variable
+
+class CubicTable:
+    def __init__(self, x, columns, span=(-np.pi, np.pi)):
+        x = np.asarray(x, dtype=float)
+        width = uniform_width(x)
+        n = int(round((x[-1] - x[0]) / width))
+        width = (x[-1] - x[0]) / n
+        # Linear bins below and above the table, so that every x within 'span' falls in a bin
+        pad_low = max(int(np.ceil((x[0] - span[0]) / width - 1e-9)), 0)
+        pad_high = max(int(np.ceil((span[1] - x[-1]) / width - 1e-9)), 0) + 1
+        self.low = float(x[0] - pad_low * width)
+        self.inv_width = 1 / width
+        self.n = pad_low + n + pad_high
+        self.columns = len(columns)
+
+        # Cubic of every bin in powers of x, expanded from the spline piece (in powers of x - xk) it lies in
+        middle = x[0] + width * (np.arange(n) + 0.5)
+        blocks = []
+        for y in columns:
+            spline = CubicSpline(x, np.asarray(y, dtype=float))
+            k = np.clip(np.searchsorted(spline.x, middle) - 1, 0, len(spline.x) - 2)
+            s3, s2, s1, s0 = spline.c[:, k]
+            xk = spline.x[k]
+            inner = np.stack([s0 - s1 * xk + s2 * xk**2 - s3 * xk**3, s1 - 2 * s2 * xk + 3 * s3 * xk**2,
+                              s2 - 3 * s3 * xk, s3], axis=1)
+            ends = [[spline(end) - spline(end, 1) * end, spline(end, 1), 0.0, 0.0] for end in (x[0], x[-1])]
+            blocks.append(np.vstack([np.tile(ends[0], (pad_low, 1)), inner, np.tile(ends[1], (pad_high, 1))]))
+        # Per bin (a0, a1, a2, a3) of every column, value a0 + a1 x + a2 x^2 + a3 x^3
+        self.coefficients = np.hstack(blocks)
+        # For scalar lookups the bins as tuples in a plain list, which Python indexes faster than a numpy array
+        self.bins = [tuple(row) for row in self.coefficients.tolist()]
+
+    def Index(self, x):
+        # Bin of x; the end bins are linear, so clipping continues the table beyond 'span' as well
+        return np.clip(((x - self.low) * self.inv_width).astype(int), 0, self.n - 1)
+
+    def evaluate(self, x):
+        # Every column at x and its derivative, from one bin lookup. For arrays the powers of x are formed once and
+        # every column is a product of its bin cubics with them.
+        if isinstance(x, float):
+            i = int((x - self.low) * self.inv_width)
+            a = self.bins[i if 0 <= i < self.n else min(max(i, 0), self.n - 1)]
+            return ([a[j] + x * (a[j + 1] + x * (a[j + 2] + x * a[j + 3])) for j in range(0, 4 * self.columns, 4)],
+                    [a[j + 1] + x * (2 * a[j + 2] + 3 * x * a[j + 3]) for j in range(0, 4 * self.columns, 4)])
+        x = np.asarray(x, dtype=float)
+        a = self.coefficients[self.Index(x)].reshape(x.shape + (self.columns, 4))
+        x2 = x * x
+        powers = np.stack([np.ones_like(x), x, x2, x2 * x], axis=-1)
+        powers_dx = np.stack([np.zeros_like(x), np.ones_like(x), 2 * x, 3 * x2], axis=-1)
+        values = np.einsum("...ck,...k->c...", a, powers)
+        slopes = np.einsum("...ck,...k->c...", a, powers_dx)
+        return list(values), list(slopes)
+
+    def values(self, x):
+        # Every column at x
+        return self.evaluate(x)[0]
+
+    def slopes(self, x):
+        # Derivative of every column with respect to x
+        return self.evaluate(x)[1]
+
+#------------------------------------------------------------------------------
+
+class AeroTable:
+    def __init__(self, alpha=c.alpha_list, CL=c.CL_list, CM=c.CM_list, CD=c.CD_list, delta=c.delta_el_list,
+                 CL_el=c.CL_el_list, CM_el=c.CM_el_list, K=c.K):
+        # Per alpha bin the CL, CM and CD cubics, per elevator bin the CL and CM cubics
+        self.alpha_table = CubicTable(alpha, (CL, CM, CD))
+        self.delta_table = CubicTable(delta, (CL_el, CM_el))
+        self.K = float(K)
+        # Last elevator angle and its terms, see 'elevator_terms'
+        self.elevator = (None, None)
+        # Identity of the tables, for the trim cache
+        self.key = hashlib.sha1(np.concatenate([self.alpha_table.coefficients.ravel(),
+                                                self.delta_table.coefficients.ravel(), [K]]).tobytes()).hexdigest()[:16]
+
+    def elevator_terms(self, delta):
+        '''
+        Elevator increments of CL and CM, with 2 K CL_el and K CL_el^2 so that
+            CD = CD(alpha) + 2 K CL_el * CL(alpha) + K CL_el^2
+        The elevator only moves at control changes, so the terms of the last angle are kept.
+        '''
+        last, terms = self.elevator
+        if delta == last:
+            return terms
+        CL_d, CM_d = self.delta_table.values(float(delta))
+        terms = (CL_d, CM_d, 2 * self.K * CL_d, self.K * CL_d * CL_d)
+        self.elevator = (delta, terms)
+        return terms
+
+    def coefficients(self, alpha, delta):
+        # CL, CD and CM
+        if isinstance(alpha, float) and isinstance(delta, float):
+            x = float(alpha)
+            table = self.alpha_table
+            i = int((x - table.low) * table.inv_width)
+            l0, l1, l2, l3, m0, m1, m2, m3, d0, d1, d2, d3 = table.bins[i if 0 <= i < table.n else min(max(i, 0), table.n - 1)]
+            last, terms = self.elevator
+            CL_d, CM_d, K_1, K_2 = terms if delta == last else self.elevator_terms(delta)
+            CL_a = l0 + x * (l1 + x * (l2 + x * l3))
+            return (CL_a + CL_d, d0 + x * (d1 + x * (d2 + x * d3)) + K_1 * CL_a + K_2,
+                    m0 + x * (m1 + x * (m2 + x * m3)) + CM_d)
+        CL_a, CM_a, CD_a = self.alpha_table.values(alpha)
+        CL_d, CM_d = self.delta_table.values(delta)
+        return CL_a + CL_d, CD_a + self.K * CL_d * (2 * CL_a + CL_d), CM_a + CM_d
+
+    def derivatives(self, alpha, delta):
+        # dCL/dalpha, dCD/dalpha, dCM/dalpha, dCL/ddelta, dCD/ddelta, dCM/ddelta
+        (CL_a, _, _), (dCL_da, dCM_da, dCD_da) = self.alpha_table.evaluate(alpha)
+        (CL_d, _), (dCL_dd, dCM_dd) = self.delta_table.evaluate(delta)
+        return (dCL_da, dCD_da + 2 * self.K * CL_d * dCL_da, dCM_da,
+                dCL_dd, 2 * self.K * (CL_a + CL_d) * dCL_dd, dCM_dd)
+
+    def trim_elevator(self, alpha, iterations=8):
+        '''
+        Elevator angle with zero moment at alpha, CM_el(delta) = -CM(alpha), by Newton's method from the linear
+        estimate, and its derivative d(delta)/d(alpha). CM_el is monotonic, so a few iterations are enough.
+        '''
+        (_, CM_a, _), (_, dCM_da, _) = self.alpha_table.evaluate(alpha)
+        target = -CM_a
+        delta = target / self.delta_table.slopes(0.0)[1]
+        for _ in range(iterations):
+            (_, CM_d), (_, dCM_dd) = self.delta_table.evaluate(delta)
+            delta = delta - (CM_d - target) / dCM_dd
+        return delta, -dCM_da / self.delta_table.slopes(delta)[1]
+
+# Tables of 'constants', shared by every aircraft that uses them
+TABLE = AeroTable()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'aircraft', describes an aircraft as an object instead of the module globals in 'constants'.
+The functions in 'forms' and the trim and simulation classes in 'simulation' take an optional 'aircraft' argument,
+which is any object with the attributes in PARAMETERS. The default is the 'constants' module itself, so existing code
+is unchanged. 'Aircraft' starts from those values and replaces some of them, e.g. Aircraft(mass=1400).
+The optional 'atmosphere' (see the 'atmosphere' module) makes the air density depend on altitude, and the optional
+'aero' (see the 'aerotable' module) takes the aerodynamic coefficients from the tables instead of the fits.
+A parameter can also be an array: the object is then a batch of aircraft, one per element, and the numpy based
+functions ('forms.Equations', 'simulation.trim_batch', 'ensemble.A3Ensemble') evaluate the whole batch at once.
+'''
+
+# Import libraries & modules
+import numpy as np
+import constants as c
+
+# Everything 'forms' reads from an aircraft
+PARAMETERS = ("gravity", "air_density", "wing_surface", "cbar", "mass", "inertia_yy") + c.COEFFICIENTS
+
+class Aircraft:
+    def __init__(self, base=c, atmosphere=..., aero=..., **parameters):
+        # The atmosphere and aero model of 'base' unless one (or None) is given
+        self.atmosphere = getattr(base, "atmosphere", None) if atmosphere is ... else atmosphere
+        self.aero = getattr(base, "aero", None) if aero is ... else aero
+        unknown = set(parameters) - set(PARAMETERS)
+        if unknown:
+            raise TypeError(f"Unknown aircraft parameters {sorted(unknown)}, choose from {PARAMETERS}")
+        for name in PARAMETERS:
+            value = parameters[name] if name in parameters else getattr(base, name)
+            setattr(self, name, np.asarray(value, dtype=float) if np.ndim(value) else float(value))
+        # Shape of the batch, () for a single aircraft
+        self.shape = np.broadcast_shapes(*(np.shape(getattr(self, name)) for name in PARAMETERS))
+
+    @property
+    def batch(self):
+        return self.shape != ()
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    def replace(self, **changes):
+        return Aircraft(self, **changes)
+
+    def broadcast(self, shape):
+        # Batch of the given shape, e.g. the shape of the velocity grid it is trimmed on
+        return Aircraft(atmosphere=self.atmosphere, aero=self.aero,
+                        **{name: np.broadcast_to(getattr(self, name), shape) if np.ndim(getattr(self, name)) else getattr(self, name)
+                           for name in PARAMETERS})
+
+    def take(self, index):
+        # The members selected by 'index' (an index or boolean mask into the batch), as a batch or single aircraft
+        return Aircraft(atmosphere=self.atmosphere, aero=self.aero,
+                        **{name: np.broadcast_to(getattr(self, name), self.shape)[index] for name in PARAMETERS})
+
+    def member(self, i):
+        return self.take(i)
+
+    def values(self):
+        return {name: getattr(self, name) for name in PARAMETERS}
+
+def at_altitude(aircraft, altitude):
+    # The aircraft with the density of its atmosphere at 'altitude' (scalar or array) as 'air_density', for the trim
+    # equations, which have no ze; unchanged without an atmosphere
+    atmosphere = getattr(aircraft, "atmosphere", None)
+    if atmosphere is None:
+        return aircraft
+    return Aircraft(aircraft, air_density=atmosphere.density(altitude))
+
+def take(aircraft, index):
+    # Members of a batch, for code that also accepts the 'constants' module or a single aircraft
+    return aircraft.take(index) if getattr(aircraft, "batch", False) else aircraft
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'atmosphere', gives the air density as a function of altitude from the International Standard Atmosphere
+(troposphere up to 11 km, isothermal stratosphere above). The equations of motion read the density through a
+'DensityTable': the ISA density precomputed on a uniform altitude grid, so that a lookup is one index computation and a
+linear interpolation instead of a power or an exponential at every evaluation. Outside the table the density is held
+at its end values.
+
+An aircraft uses the atmosphere when its 'atmosphere' attribute is set, e.g. Aircraft(atmosphere=atmosphere.ISA) or
+'constants.atmosphere = atmosphere.ISA' for the default aircraft. 'air_density' then only applies where no altitude is
+known. The fixed 'constants.air_density' (1.0065 kg/m^3) is the ISA density at about 2000 m, the altitude of the A3
+reference case.
+'''
+
+# Import libraries & modules
+import numpy as np
+
+# ISA sea level conditions and layers
+SEA_LEVEL_TEMPERATURE = 288.15    # K
+SEA_LEVEL_PRESSURE = 101325.0     # Pa
+LAPSE_RATE = 0.0065               # Temperature drop per metre in the troposphere, K/m
+GAS_CONSTANT = 287.05287          # Specific gas constant of air, J/(kg K)
+GRAVITY = 9.80665                 # Standard gravity used by the ISA, m/s^2
+TROPOPAUSE = 11000.0              # m
+
+def isa_density(altitude):
+    # Exact ISA density [kg/m^3] at the geopotential altitude(s) [m], up to 20 km
+    h = np.asarray(altitude, dtype=float)
+    exponent = GRAVITY / (GAS_CONSTANT * LAPSE_RATE)
+    T = SEA_LEVEL_TEMPERATURE - LAPSE_RATE * np.minimum(h, TROPOPAUSE)
+    p = SEA_LEVEL_PRESSURE * (T / SEA_LEVEL_TEMPERATURE)**exponent
+    # Isothermal above the tropopause
+    p = p * np.exp(-GRAVITY * np.maximum(h - TROPOPAUSE, 0) / (GAS_CONSTANT * T))
+    return p / (GAS_CONSTANT * T)
+
+#------------------------------------------------------------------------------
+
+class DensityTable:
+    def __init__(self, h_min=-1000.0, h_max=20000.0, step=10.0, density=isa_density):
+        # 'density' on the altitudes h_min, h_min + step, ... h_max; 10 m steps keep the interpolation error near 1e-7
+        self.h_min = float(h_min)
+        self.step = float(step)
+        self.h = np.arange(h_min, h_max + step / 2, step)
+        self.rho = density(self.h)
+        # Slope of every interval, per unit of the table index
+        self.slope = np.diff(self.rho)
+        self.last = len(self.h) - 1
+        self.inv_step = 1 / self.step
+        # Table position x = x0 + altitude / step. For scalar lookups every interval i is kept as the (intercept, slope)
+        # of the density against x, in a plain list, which Python indexes faster than a numpy array.
+        self.x0 = -self.h_min * self.inv_step
+        self.intervals = [(rho - slope * i, slope) for i, (rho, slope) in enumerate(zip(self.rho.tolist(), self.slope.tolist()))]
+        self.rho_low, self.rho_high = float(self.rho[0]), float(self.rho[-1])
+
+    def Index(self, altitude):
+        # Table position of the altitude(s): interval index and fraction within it
+        x = np.clip((np.asarray(altitude, dtype=float) - self.h_min) * self.inv_step, 0, self.last)
+        i = np.minimum(x.astype(int), self.last - 1)
+        return i, x - i
+
+    def density(self, altitude):
+        if isinstance(altitude, float):
+            x = self.x0 + altitude * self.inv_step
+            if 0.0 <= x < self.last:
+                intercept, slope = self.intervals[int(x)]
+                return intercept + slope * x
+            return self.rho_low if x < 0.0 else self.rho_high
+        i, fraction = self.Index(altitude)
+        return self.rho[i] + self.slope[i] * fraction
+
+    def gradient(self, altitude):
+        # d(density)/d(altitude) of the interpolation, zero outside the table
+        h = np.asarray(altitude, dtype=float)
+        i, _ = self.Index(h)
+        inside = (h >= self.h[0]) & (h <= self.h[-1])
+        return np.where(inside, self.slope[i] * self.inv_step, 0.0)
+
+    __call__ = density
+
+# Default table, shared by every aircraft that uses the ISA
+ISA = DensityTable()
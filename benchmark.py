@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'benchmark', times the computationally heavy parts of the simulation so that changes to them can be
+compared. 'run_suite' times scalar 'Trim', 'B1' grids of several sizes, right hand side evaluations (with the
+fixed density, the ISA density table and the 'aerotable' coefficient tables), the reference A3 elevator step and the
+B2 climb search. Every case is repeated and its fastest time kept (the right hand side variants interleaved, see
+'bench_rhs'); random inputs come from a fixed seed so that runs are comparable. Results are written as json together
+with a description of the machine, and can be compared against a stored baseline:
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json --tolerance 0.2
+
+The comparison lists every case that became more than 'tolerance' slower and exits with status 1 if there is one.
+'''
+
+# Import libraries & modules
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import scipy
+import forms as f
+import simulation as s
+import aircraft as ac
+import atmosphere
+import aerotable
+
+SEED = 7
+
+def best_time(function, repeat):
+    # Fastest of 'repeat' calls, which is the least disturbed by other load on the machine
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def machine_info():
+    return {"platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "date": datetime.datetime.now().isoformat(timespec="seconds")}
+
+#------------------------------------------------------------------------------
+# Right hand side cost for every backend in 'forms.BACKENDS' and every aircraft of 'aircrafts'. The states of the
+# reference A3 run are replayed in order, with the elevator and thrust as python floats as the solver passes them.
+# Differences of a few percent between variants are smaller than the drift of a shared machine over a run, so the
+# variants are interleaved: every one runs each chunk of states in turn, and the fastest time of each chunk over all
+# rounds is kept.
+
+def bench_rhs(aircrafts={"": s.c}, rounds=60, chunk=100):
+    run = s.A3(100, 0, 300, 2000, [(100.0, -0.0052, 0.0)], display=False, sample_rate=20)
+    states = list(run.data.y.T[::3])
+    controls = [run.schedule(t) for t in run.data.t[::3]]
+    n_chunks = len(states) // chunk
+
+    variants = {(name, label): s.rhs_backend(name, aircraft) for name in f.BACKENDS for label, aircraft in aircrafts.items()}
+    best = {key: np.full(n_chunks, np.inf) for key in variants}
+    for _ in range(rounds):
+        for k in range(n_chunks):
+            block = list(zip(states[k * chunk:(k + 1) * chunk], controls[k * chunk:(k + 1) * chunk]))
+            for key, Equations in variants.items():
+                start = time.perf_counter()
+                for y, (delta, thrust) in block:
+                    Equations(0.0, y, delta, thrust)
+                best[key][k] = min(best[key][k], time.perf_counter() - start)
+    # Seconds per call
+    return {key: times.sum() / (n_chunks * chunk) for key, times in best.items()}
+
+#------------------------------------------------------------------------------
+# Start-up cost of 'import constants' in a fresh interpreter, with and without the coefficient cache, against the
+# old curve_fit version of the module. That version is rebuilt in the temporary directory from the data sets of the
+# current 'constants' followed by the original fits below.
+
+CURVE_FIT_FITS = """
+from scipy import optimize
+
+CL0 = 0.04
+CLa = 0.1
+def CLa_func (x, a, b):
+    return a + b * x
+[CL0, CLa], _ = optimize.curve_fit(CLa_func, alpha_list, CL_list, [CL0, CLa])
+
+CLde = 0.003
+def CLde_func (x, a):
+    return x * a
+[CLde], _ = optimize.curve_fit(CLde_func, delta_el_list, CL_el_list, CLde)
+
+CM0 = 0.0
+CMa = -0.06
+def CM_func(x, a, b):
+    return a + b * x
+[CM0, CMa], _ = optimize.curve_fit(CM_func, alpha_list, CM_list, [CM0, CMa])
+
+CMde = -0.005
+def CMde_func (x, a):
+    return x * a
+[CMde], _ = optimize.curve_fit(CMde_func, delta_el_list, CM_el_list, CMde)
+
+CD0 = 0.02
+K = 0.04
+def CD_func(x, a, b):
+    return a + b * x**2.0
+[CD0, K], _ = optimize.curve_fit(CD_func, CL_list, CD_list, [CD0, K])
+"""
+
+def time_import(statement, cwd, repeat, env=None):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], cwd=cwd, check=True, env=env)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def bench_import(repeat=5):
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "constants.py")
+        shutil.copy(source, directory)
+        with open(source) as file:
+            data_sets = file.read().split("#---")
+        # Header, parameters and data sets of the current module, then the curve_fit fits
+        with open(os.path.join(directory, "constants_curve_fit.py"), "w") as file:
+            file.write("#---".join(data_sets[:3]) + CURVE_FIT_FITS)
+
+        # The coefficient cache goes to the temporary directory instead of the user's cache
+        env = dict(os.environ, XDG_CACHE_HOME=directory)
+        cache = os.path.join(directory, "cmm3-aeroplane", "aero_coefficients.json")
+
+        results = {"python": time_import("pass", directory, repeat, env),
+                   "numpy": time_import("import numpy", directory, repeat, env),
+                   "constants (curve_fit)": time_import("import constants_curve_fit", directory, repeat, env)}
+
+        # Cold: no cache file, so every import refits and writes it
+        cold = []
+        for _ in range(repeat):
+            if os.path.exists(cache):
+                os.remove(cache)
+            cold.append(time_import("import constants", directory, 1, env))
+        results["constants (refit)"] = min(cold)
+        results["constants (cached)"] = time_import("import constants", directory, repeat, env)
+    return results
+
+
+#------------------------------------------------------------------------------
+# Simulation cases. Each returns the time of one run in seconds together with a short description of the case.
+
+def bench_trim(n_points=200, repeat=3):
+    # Scalar Newton solve of 'Trim' (no cache) at random points of the flight envelope
+    rng = np.random.default_rng(SEED)
+    V = rng.uniform(60, 200, n_points)
+    gamma = np.deg2rad(rng.uniform(-5, 5, n_points))
+    seconds = best_time(lambda: [s.Trim(V[i], gamma[i]) for i in range(n_points)], repeat)
+    return {"seconds": seconds / n_points, "unit": "s/trim", "points": n_points}
+
+def bench_B1(sizes=((16, 10), (64, 40), (256, 160)), repeat=3):
+    # 'B1' trim grids of (velocities x path angles) points, without plotting
+    results = {}
+    for n_V, n_gamma in sizes:
+        V_step = 150 / (n_V - 1)
+        gamma_step = 4.5 / (n_gamma - 1)
+        seconds = best_time(lambda: s.B1(50, 200 + V_step / 2, -2, 2.5 + gamma_step / 2, V_step, gamma_step, display=False), repeat)
+        results[f"B1 {n_V}x{n_gamma}"] = {"seconds": seconds, "unit": "s/grid", "points": n_V * n_gamma}
+    return results
+
+def bench_A3(repeat=3):
+    # Reference case: elevator step of -0.0052 rad at 100s, 300s run from trim at 100m/s and 2000m
+    seconds = best_time(lambda: s.A3(100, 0, 300, 2000, [(100.0, -0.0052, 0.0)], display=False), repeat)
+    return {"seconds": seconds, "unit": "s/run"}
+
+def bench_B2(repeat=1):
+    # Group 07 climb search from 1000m to 2000m
+    seconds = best_time(lambda: s.B2(trimVelocity=109, trimGamma=0, t_end=700, initialAltitude=1000, maxAltitude=2000,
+                                     pitchTime=10, climbVelocity=109, climbGamma=np.deg2rad(2), climbTimeGuess=200,
+                                     climbStep=1, display=False), repeat)
+    return {"seconds": seconds, "unit": "s/search"}
+
+def run_suite(quick=False):
+    # All cases as {name: {"seconds": ..., "unit": ...}}; 'quick' uses fewer repeats and skips the largest grid
+    repeat = 1 if quick else 3
+    results = {"Trim": bench_trim(50 if quick else 200, repeat)}
+    results.update(bench_B1(((16, 10), (64, 40)) if quick else ((16, 10), (64, 40), (256, 160)), repeat))
+    # The default aircraft, and the ISA density and the aero tables against the fixed density and the fits, all
+    # through an 'aircraft.Aircraft'
+    aircrafts = {"": s.c, "fixed": ac.Aircraft(), "ISA": ac.Aircraft(atmosphere=atmosphere.ISA),
+                 "table": ac.Aircraft(aero=aerotable.TABLE)}
+    for (name, label), seconds in bench_rhs(aircrafts, 10 if quick else 60).items():
+        results[f"RHS {name} {label}".rstrip()] = {"seconds": seconds, "unit": "s/call"}
+    results["A3 reference"] = bench_A3(repeat)
+    results["B2 climb search"] = bench_B2()
+    return results
+
+#------------------------------------------------------------------------------
+# Baseline comparison
+
+def compare(results, baseline, tolerance=0.1):
+    # Ratio of new to baseline time per case; a case regresses when it is more than 'tolerance' slower
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        rows.append((name, baseline[name]["seconds"], result["seconds"], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the heavy parts of the simulation.")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--compare", help="baseline json file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slow down before a case is flagged")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and smaller grids")
+    parser.add_argument("--imports", action="store_true", help="also time the start-up imports")
+    args = parser.parse_args()
+
+    results = run_suite(args.quick)
+    if args.imports:
+        for name, seconds in bench_import().items():
+            results[f"import {name}"] = {"seconds": seconds, "unit": "s/import"}
+
+    for name, result in results.items():
+        print(f"{name:>24}: {result['seconds']:.3e} {result['unit']}")
+    for label, case in (("ISA density", "ISA"), ("aero tables", "table")):
+        for name in f.BACKENDS:
+            slowdown = results[f"RHS {name} {case}"]["seconds"] / results[f"RHS {name} fixed"]["seconds"] - 1
+            print(f"{label + ' ' + name:>24}: {100 * slowdown:+.1f}% per RHS call")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"machine": machine_info(), "seed": SEED, "results": results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"\nCompared with {args.compare} ({baseline['machine']['processor']}, {baseline['machine']['date']})")
+        rows = compare(results, baseline["results"], args.tolerance)
+        for name, old, new, ratio, regressed in rows:
+            print(f"{name:>24}: {ratio:6.2f}x {'REGRESSION' if regressed else ''}")
+        if any(row[4] for row in rows):
+            sys.exit(1)
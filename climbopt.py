@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'climbopt', finds minimum time or minimum fuel climbs between two altitudes by multiple shooting.
+Where B2 only searches one climb time for a fixed climb trim, here the elevator angle and thrust are free in each of N
+equal segments of the climb, within the elevator range of the aero data (+-20 deg) and 0 <= thrust <= thrust_max.
+Fuel is measured as the thrust integral.
+
+Every segment is integrated on its own from a node state that is a variable of the optimisation, and continuity
+between segments (the end of one segment equals the start node of the next) is a constraint. The segments are
+independent, so they are integrated together: in normalised time, so that segments of any duration share the same
+steps, as one vectorised 'forms.Equations' system. The derivatives come from central differences of each segment's
+node state, controls and duration, which are added to the same batch. Because the perturbed copies share the steps of
+the unperturbed segment, the differences are those of one smooth map and stay accurate. With 'workers' the batch is
+split over a process pool. SLSQP then solves the constrained problem.
+
+The result is an A3 'time_changes' schedule from the initial trim, which 'replay' runs through 'simulation.A3'.
+
+Example:
+    opt = ClimbOptimiser(109, 1000, 2000, objective="time").run()
+    opt.climbTime, opt.time_changes
+    opt.replay(t_end=opt.climbTime + 60)
+'''
+
+# Import libraries & modules
+import numpy as np
+from scipy import integrate, optimize
+import constants as c
+import forms as f
+import simulation as s
+
+# Node states: (q, theta, ub, wb, ze); xe never affects the motion. Scales used to normalise the variables.
+NODE = [0, 1, 2, 3, 5]
+NODE_SCALE = np.array([0.1, 0.1, 100.0, 10.0, 1000.0])
+CONTROL_SCALE = np.array([0.1, 1000.0])
+
+# Bounds of the aero data fits
+DELTA_LIMIT = float(np.max(np.abs(c.delta_el_list)))
+ALPHA_RANGE = (float(np.min(c.alpha_list)), float(np.max(c.alpha_list)))
+
+#------------------------------------------------------------------------------
+# Segment integration. Module level functions, so that they can run in worker processes.
+
+def integrate_segments(states, delta, thrust, durations, rtol=1e-10, atol=1e-10, aircraft=None):
+    '''
+    End states (6, M) of M segments started from 'states' (6, M) with constant 'delta' and 'thrust' (M,) for
+    'durations' (M,), integrated as one system in the normalised time 0 <= tau <= 1. 'aircraft' None is 'constants'.
+    '''
+    aircraft = c if aircraft is None else aircraft
+    M = states.shape[1]
+
+    def Equations(tau, y):
+        return (np.array(f.Equations(tau, y.reshape(6, M), delta, thrust, aircraft)) * durations).ravel()
+
+    result = integrate.solve_ivp(Equations, [0, 1], states.ravel(), rtol=rtol, atol=atol)
+    if not result.success:
+        raise RuntimeError(f"Segment integration failed: {result.message}")
+    return result.y[:, -1].reshape(6, M)
+
+def segment_sensitivities(nodes, controls, duration, rtol=1e-10, atol=1e-10, aircraft=None, relative_step=1e-5):
+    '''
+    End node states (N, 5) of N segments and their derivatives (N, 5, 8) with respect to the start node (5), the
+    controls (delta, thrust) and the duration, by central differences in one batch of 17 N segments.
+    '''
+    N = len(nodes)
+    steps = relative_step * np.concatenate([NODE_SCALE, CONTROL_SCALE, [max(duration, 1.0)]])
+    # Column 0 is the segment itself, then +- each of the 8 inputs
+    perturb = np.zeros((17, 8))
+    perturb[1:9] = np.diag(steps)
+    perturb[9:] = -np.diag(steps)
+
+    inputs = np.concatenate([nodes, controls, np.full((N, 1), duration)], axis=1)       # (N, 8)
+    batch = (inputs[:, None, :] + perturb[None]).reshape(-1, 8)                         # (17 N, 8)
+    states = np.zeros((6, len(batch)))
+    states[NODE] = batch[:, :5].T
+    end = integrate_segments(states, batch[:, 5], batch[:, 6], batch[:, 7], rtol, atol, aircraft)[NODE].T
+    end = end.reshape(N, 17, 5)
+
+    derivatives = (end[:, 1:9] - end[:, 9:]) / (2 * steps[None, :, None])             # (N, 8, 5)
+    return end[:, 0], np.transpose(derivatives, (0, 2, 1))
+
+#------------------------------------------------------------------------------
+
+class ClimbOptimiser:
+    def __init__(self, trimVelocity, initialAltitude, finalAltitude, objective="time", segments=20, climbTime=None,
+                 timeBounds=(10.0, 2000.0), finalVelocity=None, level=True, thrust_max=6000.0,
+                 velocityBounds=(60.0, 200.0), workers=None, rtol=1e-10, aircraft=c):
+        '''
+        Climb from level trim at trimVelocity and initialAltitude to finalAltitude.
+        objective "time" minimises the climb time, "fuel" the thrust integral. For "fuel" a 'climbTime' fixes the
+        duration, otherwise it is free within 'timeBounds'; for "time" 'climbTime' is only the initial guess.
+        level=True ends in level trim at finalVelocity (default trimVelocity), level=False only at finalAltitude.
+        At every node the angle of attack stays within the aero data and the velocity within 'velocityBounds'.
+        '''
+        if objective not in ("time", "fuel"):
+            raise ValueError(f"Unknown objective '{objective}', choose 'time' or 'fuel'")
+        self.trimVelocity = trimVelocity
+        self.initialAltitude = initialAltitude
+        self.finalAltitude = finalAltitude
+        self.objective = objective
+        self.N = segments
+        self.level = level
+        self.thrust_max = thrust_max
+        self.velocityBounds = velocityBounds
+        self.workers = workers
+        self.rtol = rtol
+        self.aircraft = aircraft
+        self.fixedTime = objective == "fuel" and climbTime is not None
+        self.timeBounds = (climbTime, climbTime) if self.fixedTime else timeBounds
+
+        self.Trim = s.trim_service.trim(trimVelocity, 0, aircraft, initialAltitude)
+        self.start = np.array([0, self.Trim.theta, self.Trim.ub, self.Trim.wb, -initialAltitude])
+        self.finalTrim = s.trim_service.trim(trimVelocity if finalVelocity is None else finalVelocity, 0, aircraft, finalAltitude)
+        self.end = np.array([0, self.finalTrim.theta, self.finalTrim.ub, self.finalTrim.wb, -finalAltitude])
+
+        # Initial guess: a steady climb at constant path angle, 3 deg unless the time is given
+        rise = finalAltitude - initialAltitude
+        self.guessTime = climbTime if climbTime is not None else rise / (trimVelocity * np.sin(np.deg2rad(3)))
+        self.nSolves = 0
+
+    #--------------------------------------------------------------------------
+    # Decision vector, scaled: [T, (delta, thrust) of every segment, node 1 ... node N]
+
+    def Guess(self):
+        rise = self.finalAltitude - self.initialAltitude
+        gamma = np.arcsin(np.clip(rise / (self.trimVelocity * self.guessTime), -0.5, 0.5))
+        climb = s.trim_service.trim(self.trimVelocity, gamma, self.aircraft, (self.initialAltitude + self.finalAltitude) / 2)
+        controls = np.tile([climb.delta, climb.thrust], (self.N, 1))
+        altitude = np.linspace(self.initialAltitude, self.finalAltitude, self.N + 1)[1:]
+        nodes = np.tile([0, climb.theta, climb.ub, climb.wb, 0], (self.N, 1))
+        nodes[:, 4] = -altitude
+        return self.Pack(self.guessTime, controls, nodes)
+
+    def Pack(self, T, controls, nodes):
+        return np.concatenate([[T / self.guessTime], (controls / CONTROL_SCALE).ravel(), (nodes / NODE_SCALE).ravel()])
+
+    def Unpack(self, z):
+        T = z[0] * self.guessTime
+        controls = z[1:1 + 2 * self.N].reshape(self.N, 2) * CONTROL_SCALE
+        nodes = z[1 + 2 * self.N:].reshape(self.N, 5) * NODE_SCALE
+        return T, controls, nodes
+
+    def Bounds(self):
+        T = [(self.timeBounds[0] / self.guessTime, self.timeBounds[1] / self.guessTime)]
+        controls = [(-DELTA_LIMIT / CONTROL_SCALE[0], DELTA_LIMIT / CONTROL_SCALE[0]),
+                    (0.0, self.thrust_max / CONTROL_SCALE[1])] * self.N
+        return T + controls + [(None, None)] * (5 * self.N)
+
+    #--------------------------------------------------------------------------
+    # Segments, cached for the last decision vector (constraint values and derivatives use the same solve)
+
+    def Segments(self, z):
+        if getattr(self, "cached", None) is not None and np.array_equal(self.cached[0], z):
+            return self.cached[1]
+        T, controls, nodes = self.Unpack(z)
+        starts = np.vstack([self.start, nodes[:-1]])
+        h = T / self.N
+        if self.pool is None:
+            end, derivatives = segment_sensitivities(starts, controls, h, self.rtol, self.rtol, self.worker_aircraft)
+        else:
+            chunks = np.array_split(np.arange(self.N), self.workers)
+            futures = [self.pool.submit(segment_sensitivities, starts[k], controls[k], h, self.rtol, self.rtol,
+                                        self.worker_aircraft) for k in chunks if len(k)]
+            parts = [future.result() for future in futures]
+            end = np.concatenate([part[0] for part in parts])
+            derivatives = np.concatenate([part[1] for part in parts])
+        self.nSolves += 1
+        self.cached = (z.copy(), (end, derivatives))
+        return end, derivatives
+
+    def Continuity(self, z):
+        # End of every segment minus the next node, scaled
+        T, controls, nodes = self.Unpack(z)
+        end, _ = self.Segments(z)
+        defects = ((end - nodes) / NODE_SCALE).ravel()
+        return np.concatenate([defects, self.Final(nodes[-1])])
+
+    def Final(self, node):
+        if self.level:
+            return (node - self.end) / NODE_SCALE
+        return np.array([(node[4] - self.end[4]) / NODE_SCALE[4]])
+
+    def Continuity_Jacobian(self, z):
+        T, controls, nodes = self.Unpack(z)
+        _, D = self.Segments(z)
+        N = self.N
+        n_final = 5 if self.level else 1
+        J = np.zeros((5 * N + n_final, len(z)))
+        for k in range(N):
+            rows = slice(5 * k, 5 * k + 5)
+            # Duration T / N, scaled by guessTime
+            J[rows, 0] = D[k, :, 7] / N * self.guessTime / NODE_SCALE
+            J[rows, 1 + 2 * k:3 + 2 * k] = D[k, :, 5:7] * CONTROL_SCALE / NODE_SCALE[:, None]
+            if k > 0:
+                J[rows, 1 + 2 * N + 5 * (k - 1):1 + 2 * N + 5 * k] = D[k, :, :5] * NODE_SCALE / NODE_SCALE[:, None]
+            J[rows, 1 + 2 * N + 5 * k:1 + 2 * N + 5 * k + 5] = -np.eye(5)
+        last = 1 + 2 * N + 5 * (N - 1)
+        if self.level:
+            J[5 * N:, last:last + 5] = np.eye(5)
+        else:
+            J[5 * N, last + 4] = 1.0
+        return J
+
+    def Path(self, z):
+        # Angle of attack and velocity bounds at every node, >= 0 when met
+        T, controls, nodes = self.Unpack(z)
+        alpha = np.arctan2(nodes[:, 3], nodes[:, 2])
+        V = np.hypot(nodes[:, 2], nodes[:, 3])
+        return np.concatenate([alpha - ALPHA_RANGE[0], ALPHA_RANGE[1] - alpha,
+                               (V - self.velocityBounds[0]) / 100, (self.velocityBounds[1] - V) / 100])
+
+    def Path_Jacobian(self, z):
+        T, controls, nodes = self.Unpack(z)
+        ub, wb = nodes[:, 2], nodes[:, 3]
+        V2 = ub**2 + wb**2
+        V = np.sqrt(V2)
+        N = self.N
+        J = np.zeros((4 * N, len(z)))
+        for k in range(N):
+            column = 1 + 2 * N + 5 * k
+            dalpha = np.array([-wb[k] / V2[k], ub[k] / V2[k]]) * NODE_SCALE[2:4]
+            dV = np.array([ub[k] / V[k], wb[k] / V[k]]) * NODE_SCALE[2:4] / 100
+            J[k, column + 2:column + 4] = dalpha
+            J[N + k, column + 2:column + 4] = -dalpha
+            J[2 * N + k, column + 2:column + 4] = dV
+            J[3 * N + k, column + 2:column + 4] = -dV
+        return J
+
+    def Objective(self, z):
+        T, controls, nodes = self.Unpack(z)
+        if self.objective == "time":
+            return z[0]
+        # Thrust integral, relative to the initial trim thrust over the climb time
+        return np.sum(controls[:, 1]) * T / self.N / (self.Trim.thrust * self.guessTime)
+
+    def Objective_Gradient(self, z):
+        T, controls, nodes = self.Unpack(z)
+        g = np.zeros(len(z))
+        if self.objective == "time":
+            g[0] = 1.0
+            return g
+        scale = self.Trim.thrust * self.guessTime
+        g[0] = np.sum(controls[:, 1]) / self.N * self.guessTime / scale
+        g[2:1 + 2 * self.N:2] = T / self.N * CONTROL_SCALE[1] / scale
+        return g
+
+    #--------------------------------------------------------------------------
+
+    def run(self, maxiter=500, tol=1e-8):
+        # Aircraft sent to the workers: the 'constants' module itself cannot be pickled
+        self.worker_aircraft = None if self.aircraft is c else self.aircraft
+        self.pool = None
+        if self.workers:
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(self.workers)
+        try:
+            self.result = optimize.minimize(
+                self.Objective, self.Guess(), jac=self.Objective_Gradient, method="SLSQP", bounds=self.Bounds(),
+                constraints=[{"type": "eq", "fun": self.Continuity, "jac": self.Continuity_Jacobian},
+                             {"type": "ineq", "fun": self.Path, "jac": self.Path_Jacobian}],
+                options={"maxiter": maxiter, "ftol": tol})
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+            self.pool = None
+
+        self.climbTime, self.controls, self.nodes = self.Unpack(self.result.x)
+        self.success = bool(self.result.success)
+        self.defect = float(np.max(np.abs(self.Continuity(self.result.x))))
+        self.fuel = float(np.sum(self.controls[:, 1]) * self.climbTime / self.N)
+        self.time_changes = self.Schedule()
+        return self
+
+    def Schedule(self):
+        # A3 'time_changes' from the initial trim: the segment controls, then the final trim (if level) at the end
+        h = self.climbTime / self.N
+        controls = [(self.Trim.delta, self.Trim.thrust)] + [tuple(u) for u in self.controls]
+        if self.level:
+            controls.append((self.finalTrim.delta, self.finalTrim.thrust))
+        return [(k * h, float(controls[k + 1][0] - controls[k][0]), float(controls[k + 1][1] - controls[k][1]))
+                for k in range(len(controls) - 1)]
+
+    def replay(self, t_end=None, **options):
+        # The schedule through the nonlinear A3 from the same initial trim
+        t_end = self.climbTime + 60 if t_end is None else t_end
+        return s.A3(self.trimVelocity, 0, t_end, self.initialAltitude, self.time_changes, aircraft=self.aircraft,
+                    **{"display": False, **options})
+
+    def Display_Profile(self, t_end=None):
+        # Replayed trajectory on the panels of 'Visualise.Display_Sim', with the optimised nodes marked
+        import matplotlib.pyplot as plt
+        run = self.replay(t_end)
+        run.Display_Sim(run.data)
+        t = np.arange(1, self.N + 1) * self.climbTime / self.N
+        run.view.axes[-1].plot(t, -self.nodes[:, 4], "o")
+        plt.show()
+        return run.view.figure
+
+
+if __name__ == "__main__":
+    import time
+
+    for objective, climbTime in (("time", None), ("fuel", 120.0)):
+        start = time.perf_counter()
+        opt = ClimbOptimiser(109, 1000, 2000, objective=objective, climbTime=climbTime).run()
+        print(f"{objective}: {opt.result.message} in {time.perf_counter() - start:.1f}s ({opt.nSolves} batch solves)")
+        print(f"  climb time {opt.climbTime:.1f}s, thrust integral {opt.fuel / 1e3:.0f}kNs, largest defect {opt.defect:.1e}")
+        final = opt.replay(opt.climbTime).data.y[:, -1]
+        print(f"  A3 replay: altitude {-final[5]:.1f}m, velocity {np.hypot(final[2], final[3]):.2f}m/s at the end")
@@ -6,20 +6,23 @@ Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
 October-November 2023  
 
 This module, 'constants', contains evironment defining parameters, physical aircraft properties, as well as data lists 
-copied from aero_tables file provided with the brief. It utilizes the 'optimize' module from the SciPy library to define
-the data sets with linear and quadratic models and hence calculate the relvent coefficients needed for solving the 
-equations of motions.
+copied from aero_tables file provided with the brief. It fits the data sets with linear and quadratic models by least
+squares and hence calculates the relvent coefficients needed for solving the equations of motions.
 '''
 
 # Importing libraries
+import hashlib
+import json
+import os
 import numpy as np
-from scipy import optimize
 
 #-----------------------------------------------------------------------------------------------------------
 # Vehicle and environment parameters
 
 gravity = 9.81  # Gravitational acceleration in m/s^2
 air_density = 1.0065    # Air density in kg/m^3
+atmosphere = None   # Density against altitude, e.g. 'atmosphere.ISA'; None keeps air_density at every altitude
+aero = None     # Table aerodynamic model, e.g. 'aerotable.TABLE'; None uses the fitted coefficients below
 wing_surface = 20.0 # Wing surface in m^2
 cbar = 1.75 # airfoil chord in m
 mass = 1300.0     # Mass of the airplane in kg
@@ -83,34 +86,59 @@ CL_el_list = np.array([
 
 #-----------------------------------------------------------------------------------------------------------
 # Fit curves to data sets, defining constants
+# Every model is linear in its coefficients, so the least squares fit has a closed form (numpy lstsq) and SciPy is
+# not needed. The fitted values are also cached in a json file in the user cache directory ($XDG_CACHE_HOME, or
+# ~/.cache), keyed by a hash of the data sets, and only refitted when the tables change.
 
-CL0 = 0.04
-CLa = 0.1
-def CLa_func (x, a, b):
-    return a + b * x
-[CL0, CLa], _ = optimize.curve_fit(CLa_func, alpha_list, CL_list, [CL0, CLa])
-
-CLde = 0.003
-def CLde_func (x, a):
-    return x * a
-[CLde], _ = optimize.curve_fit(CLde_func, delta_el_list, CL_el_list, CLde)
-
-CM0 = 0.0
-CMa = -0.06
-def CM_func(x, a, b):
-    return a + b * x
-[CM0, CMa], _ = optimize.curve_fit(CM_func, alpha_list, CM_list, [CM0, CMa])
-
-CMde = -0.005
-def CMde_func (x, a):
-    return x * a
-[CMde], _ = optimize.curve_fit(CMde_func, delta_el_list, CM_el_list, CMde)
-
-CD0 = 0.02
-K = 0.04
-def CD_func(x, a, b):
-    return a + b * x**2.0
-[CD0, K], _ = optimize.curve_fit(CD_func, CL_list, CD_list, [CD0, K])
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "cmm3-aeroplane")
+CACHE_PATH = os.path.join(CACHE_DIR, "aero_coefficients.json")
+COEFFICIENTS = ("CL0", "CLa", "CLde", "CM0", "CMa", "CMde", "CD0", "K")
+
+def table_hash():
+    tables = (alpha_list, delta_el_list, CD_list, CL_list, CM_list, CM_el_list, CL_el_list)
+    return hashlib.sha256(b"".join(np.ascontiguousarray(table, dtype=float).tobytes() for table in tables)).hexdigest()
+
+def fit_coefficients():
+    def least_squares(columns, data):
+        return np.linalg.lstsq(np.column_stack(columns), data, rcond=None)[0].tolist()
+
+    ones = np.ones_like(alpha_list)
+    [CL0, CLa] = least_squares([ones, alpha_list], CL_list)          # CL = CL0 + CLa * alpha
+    [CLde] = least_squares([delta_el_list], CL_el_list)              # CL = CLde * delta
+    [CM0, CMa] = least_squares([ones, alpha_list], CM_list)          # CM = CM0 + CMa * alpha
+    [CMde] = least_squares([delta_el_list], CM_el_list)              # CM = CMde * delta
+    [CD0, K] = least_squares([ones, CL_list**2.0], CD_list)         # CD = CD0 + K * CL^2
+    return {"CL0": CL0, "CLa": CLa, "CLde": CLde, "CM0": CM0, "CMa": CMa, "CMde": CMde, "CD0": CD0, "K": K}
+
+def load_coefficients(path=CACHE_PATH):
+    key = table_hash()
+    try:
+        with open(path) as file:
+            cache = json.load(file)
+        if cache["hash"] == key:
+            return {name: cache["coefficients"][name] for name in COEFFICIENTS}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    coefficients = fit_coefficients()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump({"hash": key, "coefficients": coefficients}, file, indent=2)
+    except OSError:
+        # No writable cache directory: keep the fitted values for this process only
+        pass
+    return coefficients
+
+_coefficients = load_coefficients()
+CL0 = _coefficients["CL0"]
+CLa = _coefficients["CLa"]
+CLde = _coefficients["CLde"]
+CM0 = _coefficients["CM0"]
+CMa = _coefficients["CMa"]
+CMde = _coefficients["CMde"]
+CD0 = _coefficients["CD0"]
+K = _coefficients["K"]
 
 # This statement prints coefficients only when this script is run standalone
 # Used for debugging
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'engine', is the headless interface to the simulation for batch jobs, workers and services.
+Each function runs one computation from 'simulation' without plotting and returns a plain result object:
+'simulation.Trim' for a trim condition, 'simulation.TrimGrid' for a B1 style sweep, 'simulation.Trajectory' for an
+A3 style run and 'ClimbResult' for a B2 climb search. Neither matplotlib nor tkinter is imported unless 'plot' is
+called, which hands a result to the plotting layer in 'simulation.Visualise'.
+'''
+
+# Import libraries & modules
+import numpy as np
+import simulation as s
+
+#------------------------------------------------------------------------------
+# Result of a B2 climb search
+
+class ClimbResult:
+    def __init__(self, climb):
+        self.climbTime = climb.climbTime
+        self.nSimulations = climb.nSimulations
+        self.simulationTime = climb.simulationTime
+        self.searchTime = climb.searchTime
+        self.trim = climb.Trim
+        self.climb_trim = climb.Trim2
+        self.trajectory = climb.data
+
+#------------------------------------------------------------------------------
+
+def trim(trimVelocity, trimGamma, trim_table=None):
+    # Trim condition, from the trim table when one is given and covers the point, else the cached exact solve
+    trimParams = None if trim_table is None else trim_table.trim(trimVelocity, trimGamma)
+    if trimParams is None:
+        trimParams = s.trim_service.trim(trimVelocity, trimGamma)
+    return trimParams
+
+def trim_sweep(V_values, gamma_values):
+    # Trim for every combination of velocity and path angle (radians), as in B1
+    return s.trim_grid(V_values, gamma_values)
+
+def simulate(trimVelocity, trimGamma, t_end, initialAltitude, time_changes, **options):
+    # A3 run; options are the keyword arguments of 'simulation.A3' (backend, method, trim_table, store, progress, stats)
+    run = s.A3(trimVelocity, trimGamma, t_end, initialAltitude, time_changes, display=False, **options)
+    run.data.trim = run.Trim
+    run.data.schedule = run.schedule
+    run.data.stats = run.stats
+    return run.data
+
+def climb(trimVelocity, trimGamma, t_end, initialAltitude, maxAltitude, pitchTime, climbVelocity, climbGamma, **options):
+    # B2 climb search; options are the keyword arguments of 'simulation.B2'
+    return ClimbResult(s.B2(trimVelocity, trimGamma, t_end, initialAltitude, maxAltitude, pitchTime, climbVelocity,
+                            climbGamma, display=False, **options))
+
+#------------------------------------------------------------------------------
+# Optional plotting layer
+
+def plot(result):
+    # Figure of a result from this module, drawn with 'simulation.Visualise'
+    if isinstance(result, ClimbResult):
+        result = result.trajectory
+    if isinstance(result, s.TrimGrid):
+        return s.Visualise().Display_B1(result.V_values, np.rad2deg(result.gamma_values), result.thrust,
+                                        np.rad2deg(result.delta), show=False)
+    return s.Visualise().Display_Sim(result)
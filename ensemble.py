@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'ensemble', runs many A3 scenarios together. The states of N aircraft are stacked into one (6, N)
+system and advanced by a single integrator, so the Python overhead of each step is paid once for the whole batch
+instead of once per scenario. Every member can have its own trim point and its own list of time changes. As in
+'simulation.integrate_schedule', the adaptive solve is restarted at every change time of any member, so no member's
+step crosses a control discontinuity.
+The equations of motion in 'forms' are written with numpy functions, so they are evaluated for all members at once.
+'''
+
+# Import libraries & modules
+import numpy as np
+from scipy import integrate
+import forms as f
+import constants as c
+import simulation as s
+
+STATE_NAMES = ("q", "theta", "ub", "wb", "xe", "ze")
+
+#------------------------------------------------------------------------------
+# N-aware version of 'A3.SimControl': returns the elevator angle and thrust of every member at time t
+
+class EnsembleControl:
+    def __init__(self, delta, thrust, time_changes):
+        self.delta = np.asarray(delta, dtype=float)
+        self.thrust = np.asarray(thrust, dtype=float)
+
+        # Pad the schedules to a common length; unused slots never switch on (time = inf)
+        n_changes = max([len(changes) for changes in time_changes] + [1])
+        self.change_time = np.full((len(time_changes), n_changes), np.inf)
+        self.delta_change = np.zeros((len(time_changes), n_changes))
+        self.thrust_change = np.zeros((len(time_changes), n_changes))
+        for i, changes in enumerate(time_changes):
+            for j, (change_time, delta_change, thrust_change) in enumerate(changes):
+                self.change_time[i, j] = change_time
+                self.delta_change[i, j] = delta_change
+                self.thrust_change[i, j] = thrust_change
+
+    def __call__(self, t):
+        # Same rule as A3: a change applies once t is strictly past its time
+        active = t > self.change_time
+        delta = self.delta + np.sum(self.delta_change, axis=1, where=active)
+        thrust = self.thrust + np.sum(self.thrust_change, axis=1, where=active)
+        return delta, thrust
+
+    def segments(self, t_start, t_end):
+        # (start, end, delta, thrust) of every piece between the change times of all members, as 'ControlSchedule.segments'
+        times = np.unique(self.change_time[(self.change_time > t_start) & (self.change_time < t_end)])
+        bounds = [t_start] + times.tolist() + [t_end]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if end > start:
+                yield (start, end) + self(0.5 * (start + end))
+
+#------------------------------------------------------------------------------
+# Single member of an ensemble, shaped like a 'solve_ivp' result so that 'Visualise.Display_Sim' can plot it
+
+class EnsembleMember:
+    def __init__(self, t, y):
+        self.t = t
+        self.y = y
+
+#------------------------------------------------------------------------------
+# A3 for N scenarios at once
+
+class A3Ensemble(s.Visualise):
+    def __init__(self, trimVelocity, trimGamma, t_end, initialAltitude, time_changes, method="RK45", dt=0.02, aircraft=c, sample_rate=50):
+        '''
+        trimVelocity, trimGamma and initialAltitude are scalars or sequences of length N, time_changes is a list of
+        N A3-style schedules [(time of change, change in delta, change in thrust), ...].
+        'method' is any 'solve_ivp' method, sharing one adaptive step between all members, or "RK4" for a
+        fixed step of 'dt' seconds, and 'sample_rate' the number of output points per second of the solve_ivp methods.
+        'aircraft' is one aircraft for all members or a batch of N ('aircraft.Aircraft' with arrays of length N).
+        '''
+        self.N = len(time_changes)
+        self.time_changes = time_changes
+        velocity = np.broadcast_to(np.asarray(trimVelocity, dtype=float), (self.N,))
+        gamma = np.broadcast_to(np.asarray(trimGamma, dtype=float), (self.N,))
+        altitude = np.broadcast_to(np.asarray(initialAltitude, dtype=float), (self.N,))
+
+        # Trim every member in one batch
+        self.aircraft = aircraft
+        self.Trim = s.trim_batch(velocity, gamma, aircraft=aircraft, altitude=altitude)
+        if not self.Trim.converged.all():
+            print(f"Warning: trim did not converge for members {np.flatnonzero(~self.Trim.converged)}")
+        self.control = EnsembleControl(self.Trim.delta, self.Trim.thrust, time_changes)
+
+        y0 = np.stack([np.zeros(self.N), self.Trim.theta, self.Trim.ub, self.Trim.wb, np.zeros(self.N), -altitude])
+
+        if method == "RK4":
+            self.t, self.y = self.RK4(y0, t_end, dt)
+        else:
+            self.t, self.y = self.Solve(y0, t_end, method, s.sample_times(t_end, sample_rate))
+
+        # One record per member, one field per state, each holding the full time history
+        dtype = [("t", float, self.t.shape)] + [(name, float, self.t.shape) for name in STATE_NAMES]
+        self.trajectories = np.empty(self.N, dtype=dtype)
+        self.trajectories["t"] = self.t
+        for k, name in enumerate(STATE_NAMES):
+            self.trajectories[name] = self.y[k]
+
+    # Vectorised right hand side for the flattened (6 * N) state used by 'solve_ivp'
+    def SimControl(self, t, y):
+        delta, thrust = self.control(t)
+        return np.concatenate(f.Equations(t, y.reshape(6, self.N), delta, thrust, self.aircraft))
+
+    # 'solve_ivp' restarted at every change time of any member, sampled at t_eval
+    def Solve(self, y0, t_end, method, t_eval):
+        t_out, y_out = [], []
+        y = y0.ravel()
+        for start, end, delta, thrust in self.control.segments(0.0, t_end):
+            # Each output time belongs to one segment, the last segment also takes t_end; the segment end is always
+            # evaluated so that the next segment starts from the exact state
+            upper = t_eval <= end if end == t_end else t_eval < end
+            segment_eval = t_eval[(t_eval >= start) & upper]
+            n_keep = len(segment_eval)
+            if n_keep == 0 or segment_eval[-1] != end:
+                segment_eval = np.append(segment_eval, end)
+            sol = integrate.solve_ivp(lambda t, y: np.concatenate(f.Equations(t, y.reshape(6, self.N), delta, thrust, self.aircraft)),
+                                      [start, end], y, method=method, t_eval=segment_eval)
+            t_out.append(sol.t[:n_keep])
+            y_out.append(sol.y[:, :n_keep])
+            if sol.status != 0:
+                break
+            y = sol.y[:, -1]
+        return np.concatenate(t_out), np.concatenate(y_out, axis=1).reshape(6, self.N, -1)
+
+    # Classic fixed step Runge-Kutta, stepping all members together; the last step is shortened to end at t_end
+    def RK4(self, y0, t_end, dt):
+        n_steps = max(int(np.ceil(t_end / dt * (1 - 1e-12))), 1)
+        t = np.append(np.arange(n_steps) * dt, t_end)
+        y = np.empty((6, self.N, n_steps + 1))
+        y[:, :, 0] = y0
+
+        def rhs(time, state):
+            delta, thrust = self.control(time)
+            return np.array(f.Equations(time, state, delta, thrust, self.aircraft))
+
+        for i in range(n_steps):
+            state = y[:, :, i]
+            h = t[i + 1] - t[i]
+            k1 = rhs(t[i], state)
+            k2 = rhs(t[i] + h / 2, state + h / 2 * k1)
+            k3 = rhs(t[i] + h / 2, state + h / 2 * k2)
+            k4 = rhs(t[i] + h, state + h * k3)
+            y[:, :, i + 1] = state + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        return t, y
+
+    def member(self, i):
+        return EnsembleMember(self.trajectories["t"][i], np.stack([self.trajectories[name][i] for name in STATE_NAMES]))
+
+    # Plot one member with the standard A3 figure
+    def Display_Member(self, i):
+        return self.Display_Sim(self.member(i))
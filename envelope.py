@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'envelope', maps the trimmable flight envelope over velocity and path angle with an adaptive grid
+instead of the uniform grid of B1. The range starts as a coarse grid of cells. Each level trims the centres of the
+current cells and splits a cell into four (quadtree) only where:
+    - its corners and centre do not all have the same feasibility, i.e. a limit crosses the cell, or
+    - the thrust or elevator at the centre differs from the mean of the corners by more than the tolerance, i.e. the
+      fields are not close to bilinear there.
+A trim is feasible when Newton converges, the elevator stays within the range of 'delta_el_list' (+-20 deg) and the
+thrust is not negative. All points are on the lattice of the finest level, so no point is trimmed twice, and each
+level is one 'trim_batch' call. 'EnvelopeMap.boundary' gives the feasibility boundary, 'interpolate' the thrust and
+elevator at any (V, gamma) from the leaf cells.
+
+Example:
+    emap = EnvelopeMap(20, 250, -30, 40)
+    emap.solves, emap.uniform_solves    # trim solves used, and those of the uniform grid at the finest spacing
+    emap.boundary()                     # points on the feasibility boundary and the limit that bounds each
+'''
+
+# Import libraries & modules
+import numpy as np
+import constants as c
+import simulation as s
+
+# Feasibility limits
+DELTA_LIMIT = np.max(np.abs(c.delta_el_list))   # Largest elevator angle in the aero data [rad]
+THRUST_MIN = 0.0                                 # The engine cannot produce negative thrust [N]
+
+class EnvelopeMap:
+    def __init__(self, V_min, V_max, gamma_min, gamma_max, cells=(8, 8), max_depth=5, thrust_tol=50.0, delta_tol=0.05,
+                 aircraft=c):
+        '''
+        Velocities in m/s and path angles in degrees, as in B1. 'cells' is the coarse grid (velocity, path angle),
+        'max_depth' the number of times a cell may be split. 'thrust_tol' [N] and 'delta_tol' [deg] are the largest
+        departures from bilinear accepted inside a cell.
+        '''
+        self.V_min = V_min
+        self.V_max = V_max
+        self.gamma_min = gamma_min
+        self.gamma_max = gamma_max
+        self.max_depth = max_depth
+        self.thrust_tol = thrust_tol
+        self.delta_tol = np.deg2rad(delta_tol)
+        self.aircraft = aircraft
+
+        # Lattice of the finest level; fields are NaN until a point is trimmed
+        self.shape = (cells[0] * 2**max_depth + 1, cells[1] * 2**max_depth + 1)
+        self.V_values = np.linspace(V_min, V_max, self.shape[0])
+        self.gamma_values = np.linspace(gamma_min, gamma_max, self.shape[1])
+        self.alpha = np.full(self.shape, np.nan)
+        self.thrust = np.full(self.shape, np.nan)
+        self.delta = np.full(self.shape, np.nan)
+        self.converged = np.zeros(self.shape, dtype=bool)
+        self.evaluated = np.zeros(self.shape, dtype=bool)
+        self.solves = 0
+
+        self.Refine(cells)
+
+    @property
+    def uniform_solves(self):
+        # Trim solves of a uniform grid with the spacing of the finest cells
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def feasible(self):
+        return self.converged & (np.abs(self.delta) <= DELTA_LIMIT) & (self.thrust >= THRUST_MIN)
+
+    def Evaluate(self, i, j, guess=0.01):
+        # Trim the lattice points (i, j) not trimmed yet, all in one batch
+        guess = np.broadcast_to(guess, np.shape(i))
+        new = ~self.evaluated[i, j]
+        if not new.any():
+            return
+        # The same point can appear twice, e.g. as the corner of two cells
+        (i, j), first = np.unique(np.stack([i[new], j[new]]), axis=1, return_index=True)
+        guess = np.where(np.isfinite(guess[new][first]), guess[new][first], 0.01)
+        trims = s.trim_batch(self.V_values[i], np.deg2rad(self.gamma_values[j]), guess, aircraft=self.aircraft)
+        self.alpha[i, j] = trims.alpha
+        self.thrust[i, j] = trims.thrust
+        self.delta[i, j] = trims.delta
+        self.converged[i, j] = trims.converged
+        self.evaluated[i, j] = True
+        self.solves += len(i)
+
+    def Refine(self, cells):
+        # Cells are (i, j, size) in lattice units, i and j being the lower corner
+        size = 2**self.max_depth
+        i, j = np.meshgrid(np.arange(cells[0]) * size, np.arange(cells[1]) * size, indexing="ij")
+        i, j = i.ravel(), j.ravel()
+        self.Evaluate(np.concatenate([i, i + size, i, i + size]), np.concatenate([j, j, j + size, j + size]))
+        leaves = []
+
+        for level in range(self.max_depth + 1):
+            corners = (np.stack([i, i + size, i, i + size]), np.stack([j, j, j + size, j + size]))
+            if level == self.max_depth:
+                leaves.append(np.stack([i, j, np.full(len(i), size)], axis=1))
+                break
+
+            # Centres, started from the mean alpha of the corners
+            half = size // 2
+            alpha = self.alpha[corners]
+            guess = np.nanmean(np.where(self.converged[corners], alpha, np.nan), axis=0) if len(i) else []
+            self.Evaluate(i + half, j + half, guess)
+
+            split = self.Split(corners, (i + half, j + half))
+            leaves.append(np.stack([i[~split], j[~split], np.full(np.sum(~split), size)], axis=1))
+
+            # Children of the split cells; their new corners are the edge midpoints
+            i, j = i[split], j[split]
+            i = np.concatenate([i, i + half, i, i + half])
+            j = np.concatenate([j, j, j + half, j + half])
+            size = half
+            self.Evaluate(np.concatenate([i, i + size, i, i + size]), np.concatenate([j, j, j + size, j + size]))
+
+        self.cells = np.concatenate(leaves)
+
+    def Split(self, corners, centre):
+        # Cells crossed by a limit, or whose centre is not close to the bilinear value of the corners
+        feasible = self.feasible
+        points = (np.vstack([corners[0], centre[0]]), np.vstack([corners[1], centre[1]]))
+        mixed = feasible[points].any(axis=0) & ~feasible[points].all(axis=0)
+        mixed |= self.converged[points].any(axis=0) & ~self.converged[points].all(axis=0)
+
+        with np.errstate(invalid="ignore"):
+            thrust_error = np.abs(self.thrust[centre] - self.thrust[corners].mean(axis=0))
+            delta_error = np.abs(self.delta[centre] - self.delta[corners].mean(axis=0))
+        curved = (thrust_error > self.thrust_tol) | (delta_error > self.delta_tol)
+        return mixed | (self.converged[points].all(axis=0) & curved)
+
+    #--------------------------------------------------------------------------
+    # Results
+
+    def points(self):
+        # Every trimmed point: V, gamma [deg], thrust, delta [rad], feasible
+        i, j = np.nonzero(self.evaluated)
+        return self.V_values[i], self.gamma_values[j], self.thrust[i, j], self.delta[i, j], self.feasible[i, j]
+
+    def boundary(self):
+        '''
+        Points where the feasibility boundary crosses the edges of the finest cells, as (V, gamma [deg], limit),
+        'limit' being "elevator", "thrust" or "newton" for the limit broken on the infeasible side. Elevator and
+        thrust crossings are interpolated linearly on the margin to the limit; Newton failures are placed midway.
+        '''
+        feasible = self.feasible
+        i, j, size = self.cells.T
+        finest = size == 1
+        i, j = i[finest], j[finest]
+        edges = set()
+        for (a_i, a_j), (b_i, b_j) in (((0, 0), (1, 0)), ((0, 1), (1, 1)), ((0, 0), (0, 1)), ((1, 0), (1, 1))):
+            a = (i + a_i, j + a_j)
+            b = (i + b_i, j + b_j)
+            cross = feasible[a] != feasible[b]
+            edges.update(zip(a[0][cross], a[1][cross], b[0][cross], b[1][cross]))
+        if not edges:
+            return np.empty(0), np.empty(0), np.empty(0, dtype=object)
+
+        a_i, a_j, b_i, b_j = np.array(sorted(edges)).T
+        # Orient every edge from its feasible end (p) to its infeasible end (q)
+        swap = ~feasible[a_i, a_j]
+        p = (np.where(swap, b_i, a_i), np.where(swap, b_j, a_j))
+        q = (np.where(swap, a_i, b_i), np.where(swap, a_j, b_j))
+
+        limit = np.where(~self.converged[q], "newton",
+                         np.where(np.abs(self.delta[q]) > DELTA_LIMIT, "elevator", "thrust")).astype(object)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta_margin = DELTA_LIMIT - np.abs(self.delta[p]), DELTA_LIMIT - np.abs(self.delta[q])
+            thrust_margin = self.thrust[p] - THRUST_MIN, self.thrust[q] - THRUST_MIN
+            fraction = np.where(limit == "elevator", delta_margin[0] / (delta_margin[0] - delta_margin[1]),
+                                thrust_margin[0] / (thrust_margin[0] - thrust_margin[1]))
+        fraction = np.where(limit == "newton", 0.5, np.clip(fraction, 0, 1))
+
+        V = self.V_values[p[0]] + fraction * (self.V_values[q[0]] - self.V_values[p[0]])
+        gamma = self.gamma_values[p[1]] + fraction * (self.gamma_values[q[1]] - self.gamma_values[p[1]])
+        return V, gamma, limit
+
+    def interpolate(self, V, gamma):
+        '''
+        Thrust, delta [rad] and feasibility at the points (V, gamma [deg]), bilinear in the leaf cell containing each.
+        Feasibility is that of the nearest corner.
+        '''
+        V, gamma = np.broadcast_arrays(np.asarray(V, dtype=float), np.asarray(gamma, dtype=float))
+        # Position in lattice units, and the leaf cell of each finest cell
+        x = np.clip((V - self.V_min) / (self.V_values[1] - self.V_values[0]), 0, self.shape[0] - 1)
+        y = np.clip((gamma - self.gamma_min) / (self.gamma_values[1] - self.gamma_values[0]), 0, self.shape[1] - 1)
+        leaf = self.LeafIndex()
+        cell = self.cells[leaf[np.minimum(x.astype(int), self.shape[0] - 2), np.minimum(y.astype(int), self.shape[1] - 2)]]
+        i, j, size = cell[..., 0], cell[..., 1], cell[..., 2]
+        u, w = (x - i) / size, (y - j) / size
+
+        def bilinear(field):
+            return ((1 - u) * (1 - w) * field[i, j] + u * (1 - w) * field[i + size, j]
+                    + (1 - u) * w * field[i, j + size] + u * w * field[i + size, j + size])
+
+        nearest = (i + size * np.rint(u).astype(int), j + size * np.rint(w).astype(int))
+        return bilinear(self.thrust), bilinear(self.delta), self.feasible[nearest]
+
+    def LeafIndex(self):
+        # Index into 'cells' of the leaf covering each finest cell
+        if getattr(self, "leaf_index", None) is None:
+            self.leaf_index = np.empty((self.shape[0] - 1, self.shape[1] - 1), dtype=int)
+            for n, (i, j, size) in enumerate(self.cells):
+                self.leaf_index[i:i + size, j:j + size] = n
+        return self.leaf_index
+
+    def Display_Envelope(self, resolution=200, show=True):
+        # Thrust and elevator fields over the feasible envelope, with the leaf cells and the boundary
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import PolyCollection
+        V, gamma = np.meshgrid(np.linspace(self.V_min, self.V_max, resolution),
+                               np.linspace(self.gamma_min, self.gamma_max, resolution), indexing="ij")
+        thrust, delta, feasible = self.interpolate(V, gamma)
+
+        i, j, size = self.cells.T
+        dV, dgamma = self.V_values[1] - self.V_values[0], self.gamma_values[1] - self.gamma_values[0]
+        V0, gamma0 = self.V_values[i], self.gamma_values[j]
+        boxes = np.stack([np.stack([V0, gamma0], 1), np.stack([V0 + size * dV, gamma0], 1),
+                          np.stack([V0 + size * dV, gamma0 + size * dgamma], 1), np.stack([V0, gamma0 + size * dgamma], 1)], 1)
+        boundary_V, boundary_gamma, _ = self.boundary()
+
+        fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+        for ax, field, label in zip(axes, (thrust, np.rad2deg(delta)), ('Thrust [N]', 'Elevator Angle δₑ [$^{0}$]')):
+            mesh = ax.pcolormesh(V, gamma, np.where(feasible, field, np.nan), shading="auto")
+            fig.colorbar(mesh, ax=ax, label=label)
+            ax.add_collection(PolyCollection(boxes, facecolors="none", edgecolors="k", linewidths=0.2))
+            ax.plot(boundary_V, boundary_gamma, "r.", markersize=2)
+            ax.set_xlabel('Velocity V [m/s]')
+            ax.set_ylabel('Flight Path Angle γ [$^{0}$]')
+        axes[0].set_title(f'{self.solves} trims ({self.uniform_solves} on the uniform grid)')
+        plt.tight_layout()
+        if show:
+            plt.show()
+        return fig
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    emap = EnvelopeMap(20, 250, -30, 40)
+    elapsed = time.perf_counter() - start
+    print(f"{emap.solves} trims in {elapsed:.2f}s, {len(emap.cells)} cells; uniform grid: {emap.uniform_solves} trims")
+
+    # Accuracy against a uniform B1 style grid at the finest spacing
+    start = time.perf_counter()
+    grid = s.trim_grid(emap.V_values, np.deg2rad(emap.gamma_values))
+    elapsed = time.perf_counter() - start
+    V, gamma = np.meshgrid(emap.V_values, emap.gamma_values, indexing="ij")
+    thrust, delta, feasible = emap.interpolate(V, gamma)
+    both = feasible & grid.converged & (np.abs(grid.delta) <= DELTA_LIMIT) & (grid.thrust >= THRUST_MIN)
+    print(f"Uniform grid in {elapsed:.2f}s; largest difference in the feasible envelope: "
+          f"thrust {np.max(np.abs(thrust - grid.thrust)[both]):.1f}N, "
+          f"delta {np.rad2deg(np.max(np.abs(delta - grid.delta)[both])):.3f}deg")
+    V_b, gamma_b, limit = emap.boundary()
+    print("Boundary points:", {name: int(np.sum(limit == name)) for name in ("elevator", "thrust", "newton")})
@@ -10,51 +10,308 @@ These functions are called in the 'simulation' module(main script) to perform he
 'forms' imports parameters from the 'constants' module, including the coefficients of lift, moment, and drag that were 
 calculated using curve fitting methods, as well as environment defining parameters. Refer to the nomenclature in the README file 
 for a comprehensive list of variable and function definitions.
+Every function takes an optional 'aircraft' (see the 'aircraft' module), which defaults to the 'constants' module.
+When the aircraft has an 'atmosphere', the equations of motion take the air density at the altitude -ze from it, and
+when it has an 'aero' table model (the 'aerotable' module), the coefficients are interpolated from the tables.
 ''' 
 
-#importing numpy library for trigonometric functions
+#importing numpy library for trigonometric functions, and math for the faster scalar versions used in the fused equations
 #importing coefficients and constants from the 'constants' module
+import math
 import numpy as np
 import constants as c
 
-def Coefficient_of_Lift(alpha, delta):
-    return c.CL0 + c.CLa * alpha + c.CLde * delta
+# With an 'aero' table model (see the 'aerotable' module) the coefficients are interpolated from the tables,
+# otherwise they are the linear and quadratic fits
+def Coefficient_of_Lift(alpha, delta, aircraft=c):
+    aero = getattr(aircraft, "aero", None)
+    if aero is not None:
+        return aero.coefficients(alpha, delta)[0]
+    return aircraft.CL0 + aircraft.CLa * alpha + aircraft.CLde * delta
 
-def Coefficient_of_Moment(alpha, delta):
-    return c.CM0 + c.CMa * alpha + c.CMde * delta
+def Coefficient_of_Moment(alpha, delta, aircraft=c):
+    aero = getattr(aircraft, "aero", None)
+    if aero is not None:
+        return aero.coefficients(alpha, delta)[2]
+    return aircraft.CM0 + aircraft.CMa * alpha + aircraft.CMde * delta
 
-def Coefficient_of_Drag(alpha, delta):
-    return c.CD0 + c.K * (Coefficient_of_Lift(alpha, delta))**2
+def Coefficient_of_Drag(alpha, delta, aircraft=c):
+    aero = getattr(aircraft, "aero", None)
+    if aero is not None:
+        return aero.coefficients(alpha, delta)[1]
+    return aircraft.CD0 + aircraft.K * (Coefficient_of_Lift(alpha, delta, aircraft))**2
 
-def Lift(alpha, delta, velocity):
-    return (0.5 * c.air_density * velocity**2 * c.wing_surface *
-            Coefficient_of_Lift(alpha, delta))
+# CL, CD and CM together, computing each term once
+def Coefficients(alpha, delta, aircraft=c):
+    aero = getattr(aircraft, "aero", None)
+    if aero is not None:
+        return aero.coefficients(alpha, delta)
+    return Fit_Coefficients(alpha, delta, aircraft)
 
-def Drag(alpha, delta, velocity):
-    return (0.5 * c.air_density * velocity**2 * c.wing_surface *
-            Coefficient_of_Drag(alpha, delta))
+def Fit_Coefficients(alpha, delta, aircraft=c):
+    CL = aircraft.CL0 + aircraft.CLa * alpha + aircraft.CLde * delta
+    return CL, aircraft.CD0 + aircraft.K * CL**2, aircraft.CM0 + aircraft.CMa * alpha + aircraft.CMde * delta
 
-def Moment(alpha, delta, velocity):
-    return (0.5 * c.air_density * velocity**2 * c.wing_surface *
-           c.cbar * Coefficient_of_Moment(alpha, delta))
+# 'Coefficients' and 'Air_Density' with the choice of model made once for an aircraft, as functions of
+# (alpha, delta) and of ze
+def Coefficient_Lookup(aircraft=c):
+    aero = getattr(aircraft, "aero", None)
+    if aero is not None:
+        return aero.coefficients
+    return lambda alpha, delta: Fit_Coefficients(alpha, delta, aircraft)
 
-def Engine_Thrust(alpha, delta, theta, velocity):
-    return (Drag(alpha, delta, velocity) * np.cos(alpha) - Lift(alpha, delta, velocity) * np.sin(alpha) + c.mass * c.gravity * np.sin(theta))
+def Density_Lookup(aircraft=c):
+    atmosphere = getattr(aircraft, "atmosphere", None)
+    if atmosphere is not None:
+        return lambda ze: atmosphere.density(-ze)
+    air_density = aircraft.air_density
+    return lambda ze: air_density
+
+# Derivatives of the coefficients: dCL/dalpha, dCD/dalpha, dCM/dalpha, dCL/ddelta, dCD/ddelta, dCM/ddelta
+def Coefficient_Derivatives(alpha, delta, aircraft=c):
+    aero = getattr(aircraft, "aero", None)
+    if aero is not None:
+        return aero.derivatives(alpha, delta)
+    CL = Coefficient_of_Lift(alpha, delta, aircraft)
+    return (aircraft.CLa, 2 * aircraft.K * CL * aircraft.CLa, aircraft.CMa,
+            aircraft.CLde, 2 * aircraft.K * CL * aircraft.CLde, aircraft.CMde)
+
+# Elevator angle that gives zero pitching moment at alpha
+def Trim_Elevator(alpha, aircraft=c):
+    aero = getattr(aircraft, "aero", None)
+    if aero is not None:
+        return aero.trim_elevator(alpha)[0]
+    return -(aircraft.CM0 + aircraft.CMa * alpha) / aircraft.CMde
+
+# Air density at the vertical position ze (positive down, so the altitude is -ze)
+def Air_Density(ze, aircraft=c):
+    atmosphere = getattr(aircraft, "atmosphere", None)
+    return aircraft.air_density if atmosphere is None else atmosphere.density(-ze)
+
+# The forces and moment use 'density' when it is given, the aircraft's fixed air_density otherwise
+def Lift(alpha, delta, velocity, aircraft=c, density=None):
+    rho = aircraft.air_density if density is None else density
+    return (0.5 * rho * velocity**2 * aircraft.wing_surface *
+            Coefficient_of_Lift(alpha, delta, aircraft))
+
+def Drag(alpha, delta, velocity, aircraft=c, density=None):
+    rho = aircraft.air_density if density is None else density
+    return (0.5 * rho * velocity**2 * aircraft.wing_surface *
+            Coefficient_of_Drag(alpha, delta, aircraft))
+
+def Moment(alpha, delta, velocity, aircraft=c, density=None):
+    rho = aircraft.air_density if density is None else density
+    return (0.5 * rho * velocity**2 * aircraft.wing_surface *
+           aircraft.cbar * Coefficient_of_Moment(alpha, delta, aircraft))
+
+def Engine_Thrust(alpha, delta, theta, velocity, aircraft=c):
+    return (Drag(alpha, delta, velocity, aircraft) * np.cos(alpha) - Lift(alpha, delta, velocity, aircraft) * np.sin(alpha) + aircraft.mass * aircraft.gravity * np.sin(theta))
 
 # Definition of differential equations
-def Equations ( t, y, delta, thrust):
+# 'density_at(ze)' and 'coefficients(alpha, delta)' are the lookups from 'Density_Lookup' and 'Coefficient_Lookup';
+# without them the aircraft's model is found in every call
+def Equations ( t, y, delta, thrust, aircraft=c, density_at=None, coefficients=None):
     q, theta, ub, wb, xe, ze = y
     
     alpha = np.arctan2(wb, ub)
     velocity = np.sqrt(ub**2 + wb**2)
+    density = Air_Density(ze, aircraft) if density_at is None else density_at(ze)
+    
+    # Dynamic pressure times wing area, and the coefficients once
+    CL, CD, CM = Coefficients(alpha, delta, aircraft) if coefficients is None else coefficients(alpha, delta)
+    dynamic = 0.5 * density * velocity**2 * aircraft.wing_surface
+    lift = dynamic * CL
+    drag = dynamic * CD
     
-    dq_dt = (Moment(alpha, delta, velocity)/c.inertia_yy)
+    dq_dt = dynamic * aircraft.cbar * CM / aircraft.inertia_yy
     dtheta_dt = q
     
-    dub_dt = (Lift(alpha, delta, velocity) * np.sin(alpha) - Drag(alpha, delta, velocity) * np.cos(alpha) - c.mass * q * wb - c.mass * c.gravity * np.sin(theta) + thrust) / c.mass
-    dwb_dt = (-Lift(alpha, delta, velocity) * np.cos(alpha) - Drag(alpha, delta, velocity) * np.sin(alpha) + c.mass * q * ub + c.mass * c.gravity * np.cos(theta)) / c.mass
+    dub_dt = (lift * np.sin(alpha) - drag * np.cos(alpha) - aircraft.mass * q * wb - aircraft.mass * aircraft.gravity * np.sin(theta) + thrust) / aircraft.mass
+    dwb_dt = (-lift * np.cos(alpha) - drag * np.sin(alpha) + aircraft.mass * q * ub + aircraft.mass * aircraft.gravity * np.cos(theta)) / aircraft.mass
     
     dxe_dt = ub * np.cos(theta) + wb * np.sin(theta)
     dze_dt = - ub * np.sin(theta) + wb * np.cos(theta)
     
     return dq_dt, dtheta_dt, dub_dt, dwb_dt, dxe_dt, dze_dt
+
+# Fused version of 'Equations' for the simulation hot path. The aircraft constants are read once when the function
+# is built, and the dynamic pressure, coefficients, lift, drag and moment are each computed once per call.
+# Scalar states only; 'Equations' remains the reference version and also accepts arrays.
+# With an atmosphere the lookup of its 'atmosphere.DensityTable' is inlined, with the table intervals scaled to
+# 0.5 * density * wing area and written against ze. The interval of the last lookup is kept, so while ze stays in it
+# (10 m of altitude) the density costs a comparison and a multiply-add. With an 'aero' table model one bin of its alpha table gives CL, CM and CD as cubics in
+# alpha (atan2 keeps alpha within the bins, which are padded to +-pi). The elevator terms are folded into the
+# cubics of that bin, which are kept until alpha leaves the bin or delta changes, so a call costs a comparison and
+# three cubics.
+def Fused_Equations(aircraft=c):
+    half_S = 0.5 * aircraft.wing_surface
+    rho_S = half_S * aircraft.air_density
+    cbar_I = aircraft.cbar / aircraft.inertia_yy
+    atmosphere = getattr(aircraft, "atmosphere", None)
+    if atmosphere is not None:
+        x0, inv_step, last, step = atmosphere.x0, atmosphere.inv_step, atmosphere.last, atmosphere.step
+        # Interval i, x = x0 - ze / step in [i, i + 1), as P = P_0 + P_1 ze for ze in (z_low, z_high]
+        intervals = [(half_S * (intercept + slope * x0), -half_S * slope * inv_step, (x0 - i - 1) * step, (x0 - i) * step)
+                     for i, (intercept, slope) in enumerate(atmosphere.intervals)]
+        below = (half_S * atmosphere.rho_low, 0.0, x0 * step, math.inf)
+        above = (half_S * atmosphere.rho_high, 0.0, -math.inf, (x0 - last) * step)
+    # Density interval of the last call
+    P_0, P_1, z_low, z_high = 0.0, 0.0, 0.0, 0.0
+    CL0, CLa, CLde = aircraft.CL0, aircraft.CLa, aircraft.CLde
+    CM0, CMa, CMde = aircraft.CM0, aircraft.CMa, aircraft.CMde
+    CD0, K = aircraft.CD0, aircraft.K
+    aero = getattr(aircraft, "aero", None)
+    if aero is not None:
+        a_low, a_inv, alpha_bins = aero.alpha_table.low, aero.alpha_table.inv_width, aero.alpha_table.bins
+        a_width = 1.0 / a_inv
+        elevator_terms = aero.elevator_terms
+    # Alpha bin [a_min, a_max) and elevator angle of the last call, with the CL, CD and CM cubics of both
+    a_min, a_max, d_last = 0.0, 0.0, None
+    L0 = L1 = L2 = L3 = D0 = D1 = D2 = D3 = M0 = M1 = M2 = M3 = 0.0
+    inv_mass = 1.0 / aircraft.mass
+    g = aircraft.gravity
+    atan2, sqrt, sin, cos = math.atan2, math.sqrt, math.sin, math.cos
+
+    def Equations_Fused(t, y, delta, thrust, out=None):
+        nonlocal a_min, a_max, d_last, L0, L1, L2, L3, D0, D1, D2, D3, M0, M1, M2, M3, P_0, P_1, z_low, z_high
+        # A solver passes a new array every call; 'realtime' passes memoryviews of its buffers, which unpack directly
+        q, theta, ub, wb, xe, ze = y.tolist() if isinstance(y, np.ndarray) else y
+        alpha = atan2(wb, ub)
+        sin_a = sin(alpha)
+        cos_a = cos(alpha)
+        sin_t = sin(theta)
+        cos_t = cos(theta)
+
+        if atmosphere is None:
+            P = rho_S
+        else:
+            if not z_low < ze <= z_high:
+                x = x0 - ze * inv_step
+                P_0, P_1, z_low, z_high = intervals[int(x)] if 0.0 <= x < last else below if x < 0.0 else above
+            P = P_0 + P_1 * ze
+
+        if aero is None:
+            CL = CL0 + CLa * alpha + CLde * delta
+            CD = CD0 + K * CL * CL
+            CM = CM0 + CMa * alpha + CMde * delta
+        else:
+            if not (a_min <= alpha < a_max and delta == d_last):
+                # CL = CL_a + CL_d, CD = CD_a + K_1 CL_a + K_2 and CM = CM_a + CM_d as single cubics in alpha
+                i = int((alpha - a_low) * a_inv)
+                a_min = a_low + i * a_width
+                a_max = a_min + a_width
+                d_last = delta
+                CL_d, CM_d, K_1, K_2 = elevator_terms(delta)
+                L0, L1, L2, L3, M0, M1, M2, M3, D0, D1, D2, D3 = alpha_bins[i]
+                D0, D1, D2, D3 = D0 + K_1 * L0 + K_2, D1 + K_1 * L1, D2 + K_1 * L2, D3 + K_1 * L3
+                L0 += CL_d
+                M0 += CM_d
+            CL = L0 + alpha * (L1 + alpha * (L2 + alpha * L3))
+            CD = D0 + alpha * (D1 + alpha * (D2 + alpha * D3))
+            CM = M0 + alpha * (M1 + alpha * (M2 + alpha * M3))
+
+        # Dynamic pressure times wing area, then every aerodynamic term once
+        dynamic = P * (ub * ub + wb * wb)
+        lift = dynamic * CL
+        drag = dynamic * CD
+
+        if out is None:
+            out = np.empty(6)
+        out[0] = dynamic * cbar_I * CM
+        out[1] = q
+        out[2] = (lift * sin_a - drag * cos_a + thrust) * inv_mass - q * wb - g * sin_t
+        out[3] = (-lift * cos_a - drag * sin_a) * inv_mass + q * ub + g * cos_t
+        out[4] = ub * cos_t + wb * sin_t
+        out[5] = -ub * sin_t + wb * cos_t
+        return out
+
+    return Equations_Fused
+
+# 'Equations' with the aircraft bound, for the backends below; the density and coefficient lookups are picked once
+# here instead of being dispatched on the aircraft in every call
+def Python_Equations(aircraft=c):
+    density_at = Density_Lookup(aircraft)
+    coefficients = Coefficient_Lookup(aircraft)
+    def Equations_Aircraft(t, y, delta, thrust):
+        return Equations(t, y, delta, thrust, aircraft, density_at, coefficients)
+    return Equations_Aircraft
+
+# Available right hand side backends, selected in 'simulation' by name; each builds the equations for an aircraft
+BACKENDS = {"python": Python_Equations, "fused": Fused_Equations}
+
+# Analytic Jacobian of 'Equations' with respect to the state (q, theta, ub, wb, xe, ze), for the implicit solvers.
+# Written in terms of ub and wb: sin(alpha) = wb/V and cos(alpha) = ub/V, so the body forces are
+# Fx = L sin(alpha) - D cos(alpha) = P V (CL wb - CD ub) and Fz = -L cos(alpha) - D sin(alpha) = -P V (CL ub + CD wb)
+def Jacobian(t, y, delta, thrust, aircraft=c):
+    q, theta, ub, wb, xe, ze = y
+
+    density = Air_Density(ze, aircraft)
+    P = 0.5 * density * aircraft.wing_surface
+    V2 = ub**2 + wb**2
+    V = np.sqrt(V2)
+    alpha = np.arctan2(wb, ub)
+    CL, CD, CM = Coefficients(alpha, delta, aircraft)
+    dCL_da, dCD_da, dCM_da, *_ = Coefficient_Derivatives(alpha, delta, aircraft)
+
+    # Derivatives of alpha and of the coefficients with respect to ub and wb
+    dalpha_du = -wb / V2
+    dalpha_dw = ub / V2
+    dCL_du = dCL_da * dalpha_du
+    dCL_dw = dCL_da * dalpha_dw
+    dCD_du = dCD_da * dalpha_du
+    dCD_dw = dCD_da * dalpha_dw
+
+    Fx = CL * wb - CD * ub
+    Fz = CL * ub + CD * wb
+    dFx_du = P * (ub / V * Fx + V * (dCL_du * wb - dCD_du * ub - CD))
+    dFx_dw = P * (wb / V * Fx + V * (dCL_dw * wb + CL - dCD_dw * ub))
+    dFz_du = -P * (ub / V * Fz + V * (dCL_du * ub + CL + dCD_du * wb))
+    dFz_dw = -P * (wb / V * Fz + V * (dCL_dw * ub + dCD_dw * wb + CD))
+
+    moment = P * aircraft.cbar / aircraft.inertia_yy
+    sin_t = np.sin(theta)
+    cos_t = np.cos(theta)
+
+    J = np.zeros((6, 6))
+    J[0, 2] = moment * (2 * ub * CM + dCM_da * V2 * dalpha_du)
+    J[0, 3] = moment * (2 * wb * CM + dCM_da * V2 * dalpha_dw)
+    J[1, 0] = 1.0
+    J[2, 0] = -wb
+    J[2, 1] = -aircraft.gravity * cos_t
+    J[2, 2] = dFx_du / aircraft.mass
+    J[2, 3] = dFx_dw / aircraft.mass - q
+    J[3, 0] = ub
+    J[3, 1] = -aircraft.gravity * sin_t
+    J[3, 2] = dFz_du / aircraft.mass + q
+    J[3, 3] = dFz_dw / aircraft.mass
+    J[4, 1] = -ub * sin_t + wb * cos_t
+    J[4, 2] = cos_t
+    J[4, 3] = sin_t
+    J[5, 1] = -ub * cos_t - wb * sin_t
+    J[5, 2] = -sin_t
+    J[5, 3] = cos_t
+
+    # With an atmosphere the aerodynamic terms scale with the density at the altitude -ze
+    atmosphere = getattr(aircraft, "atmosphere", None)
+    if atmosphere is not None:
+        dlnrho_dze = -atmosphere.gradient(-ze) / density
+        J[0, 5] = moment * V2 * CM * dlnrho_dze
+        J[2, 5] = P * V * Fx / aircraft.mass * dlnrho_dze
+        J[3, 5] = -P * V * Fz / aircraft.mass * dlnrho_dze
+    return J
+
+# Derivatives of 'Equations' with respect to the inputs (delta, thrust), as a 6 x 2 array
+def Control_Jacobian(t, y, delta, thrust, aircraft=c):
+    q, theta, ub, wb, xe, ze = y
+
+    P = 0.5 * Air_Density(ze, aircraft) * aircraft.wing_surface
+    V2 = ub**2 + wb**2
+    V = np.sqrt(V2)
+    *_, dCL_dd, dCD_dd, dCM_dd = Coefficient_Derivatives(np.arctan2(wb, ub), delta, aircraft)
+
+    B = np.zeros((6, 2))
+    B[0, 0] = P * V2 * aircraft.cbar * dCM_dd / aircraft.inertia_yy
+    B[2, 0] = P * V * (dCL_dd * wb - dCD_dd * ub) / aircraft.mass
+    B[3, 0] = -P * V * (dCL_dd * ub + dCD_dd * wb) / aircraft.mass
+    B[2, 1] = 1 / aircraft.mass
+    return B
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'instrument', records where the time of an A3 or B2 run goes. Pass 'stats=True' (or a 'RunStats')
+to 'A3' or 'B2' and the run keeps, in 'run.stats':
+    - the solver counters: right hand side evaluations (nfev), Jacobian evaluations (njev), LU decompositions (nlu)
+      and accepted and rejected steps,
+    - the wall time of each phase (trim, integrate, post-process, plot), excluding nested phases,
+    - the Newton iterations and final residual of every trim solve, and whether it came from the trim cache.
+'RunStats(profile=True)' also runs cProfile during the phases, and 'sink' receives the record as a dictionary when
+the run ends, e.g. 'JsonLinesSink("runs.jsonl")' or 'LogSink()'. Without 'stats' the run uses 'OFF', whose methods
+do nothing, so the cost is a few empty calls per run.
+'''
+
+# Import libraries & modules
+import contextlib
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+
+# Explicit Runge-Kutta methods: (right hand side evaluations per attempted step, extra evaluations per dense output).
+# A solve also evaluates twice at the start (initial derivative and initial step size), so the number of attempted
+# steps, and from it the rejected steps, follows from nfev.
+RK_STAGES = {"RK23": (3, 0), "RK45": (6, 0), "DOP853": (12, 3)}
+
+def rejected_steps(method, nfev, accepted, dense=0):
+    # Rejected steps of one explicit Runge-Kutta solve; None for the implicit methods, which do not report them
+    if method not in RK_STAGES:
+        return None
+    stages, extra = RK_STAGES[method]
+    return (nfev - 2 - extra * dense) // stages - accepted
+
+#------------------------------------------------------------------------------
+
+class RunStats:
+    enabled = True
+
+    def __init__(self, kind="", profile=False, sink=None):
+        self.kind = kind
+        self.sink = sink
+        self.counters = {"nfev": 0, "njev": 0, "nlu": 0, "accepted": 0, "rejected": 0, "solves": 0}
+        self.phases = {}
+        self.trims = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self.stack = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # Time spent in 'name', without the time of phases started inside it
+        if not self.stack and self.profiler is not None:
+            self.profiler.enable()
+        frame = [time.perf_counter(), 0.0]
+        self.stack.append(frame)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[1]
+            if self.stack:
+                self.stack[-1][1] += elapsed
+            elif self.profiler is not None:
+                self.profiler.disable()
+
+    def add_solver(self, method, nfev, njev, nlu, accepted, dense=0):
+        # Counters of one solver run, e.g. one segment of 'integrate_schedule'
+        self.counters["nfev"] += int(nfev)
+        self.counters["njev"] += int(njev)
+        self.counters["nlu"] += int(nlu)
+        self.counters["solves"] += 1
+        # 'accepted' is None when the solve did not keep its steps (output at t_eval without dense output)
+        rejected = None if accepted is None else rejected_steps(method, nfev, accepted, dense)
+        for name, value in (("accepted", accepted), ("rejected", rejected)):
+            if value is None or self.counters[name] is None:
+                self.counters[name] = None
+            else:
+                self.counters[name] += value
+
+    def add_trim(self, name, trim):
+        # Newton iterations and residual of a trim solve; trims from the 'trimcache' report 0 iterations and
+        # cached True, trims from a table were not iterated here
+        self.trims[name] = {"iterations": getattr(trim, "iterations", None),
+                            "residual": getattr(trim, "residual", None),
+                            "converged": getattr(trim, "converged", None),
+                            "cached": getattr(trim, "cached", None)}
+
+    def as_dict(self):
+        return {"kind": self.kind, "counters": dict(self.counters), "phases": dict(self.phases),
+                "total": sum(self.phases.values()), "trims": dict(self.trims)}
+
+    def report(self):
+        # Short text summary, one line per counter group
+        lines = [f"{self.kind} run: " + ", ".join(f"{name} {value}" for name, value in self.counters.items())]
+        lines.append("phases: " + ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in self.phases.items()))
+        for name, trim in self.trims.items():
+            source = " (cached)" if trim["cached"] else ""
+            lines.append(f"{name}: {trim['iterations']} Newton iterations, residual {trim['residual']}{source}")
+        return "\n".join(lines)
+
+    def profile_report(self, sort="cumulative", limit=25):
+        if self.profiler is None:
+            return ""
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def finish(self):
+        # End of the run: hand the record to the sink
+        if self.sink is not None:
+            self.sink(self.as_dict())
+
+# Used when a run is not instrumented
+class NullStats:
+    enabled = False
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def add_solver(self, *args, **kwargs):
+        pass
+
+    def add_trim(self, name, trim):
+        pass
+
+    def finish(self):
+        pass
+
+OFF = NullStats()
+
+def run_stats(stats, kind):
+    # The 'stats' argument of A3 and B2: None/False, True or a RunStats
+    if stats is None or stats is False:
+        return OFF
+    if stats is True:
+        return RunStats(kind)
+    if not stats.kind:
+        stats.kind = kind
+    return stats
+
+#------------------------------------------------------------------------------
+# Sinks for the run records
+
+class JsonLinesSink:
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, record):
+        with open(self.path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+class LogSink:
+    def __init__(self, logger="instrument", level=logging.INFO):
+        self.logger = logging.getLogger(logger)
+        self.level = level
+
+    def __call__(self, record):
+        self.logger.log(self.level, json.dumps(record))
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'linear', linearises the equations of motion about a trim point:
+    dx/dt = f0 + A dx + B du
+where dx is the deviation of the state (q, theta, ub, wb, xe, ze) from trim, du the change of (delta, thrust), A the
+analytic 'forms.Jacobian' and B the 'forms.Control_Jacobian'. f0 is the equations at trim, which is zero apart from
+the steady motion in xe and ze. 'LinearModel.modes' gives the eigenvalues of the aircraft dynamics (q, theta, ub, wb)
+with their natural frequency, damping ratio and period, i.e. the short period and phugoid modes. Responses to
+piecewise constant inputs are exact for this model and come from the matrix exponential, so they take microseconds
+instead of an IVP solve. 'compare' runs the same schedule through the nonlinear 'A3' to check the linear model.
+'''
+
+# Import libraries & modules
+import numpy as np
+from scipy import linalg
+import forms as f
+import simulation as s
+
+#------------------------------------------------------------------------------
+# One eigenvalue of the aircraft dynamics (complex pairs are listed once, by the eigenvalue with Im > 0)
+
+class Mode:
+    def __init__(self, eigenvalue, vector):
+        self.eigenvalue = eigenvalue
+        self.vector = vector
+        self.frequency = abs(eigenvalue)
+        self.damping = -eigenvalue.real / abs(eigenvalue) if eigenvalue != 0 else 0.0
+        self.oscillatory = eigenvalue.imag > 0
+        self.period = 2 * np.pi / eigenvalue.imag if self.oscillatory else np.inf
+        # Time to halve (stable) or double (unstable) the amplitude
+        self.half_time = np.log(2) / abs(eigenvalue.real) if eigenvalue.real != 0 else np.inf
+        self.name = ""
+
+    def __repr__(self):
+        return (f"Mode({self.name or 'real'}: eigenvalue={self.eigenvalue:.5f}, damping={self.damping:.4f}, "
+                f"period={self.period:.2f}s)")
+
+#------------------------------------------------------------------------------
+
+class LinearModel:
+    def __init__(self, trimParams, initialAltitude=0.0):
+        self.Trim = trimParams
+        self.u0 = np.array([trimParams.delta, trimParams.thrust])
+        self.x0 = np.array([0, trimParams.theta, trimParams.ub, trimParams.wb, 0, -initialAltitude], dtype=float)
+        self.f0 = np.array(f.Equations(0, self.x0, trimParams.delta, trimParams.thrust))
+        self.A = f.Jacobian(0, self.x0, trimParams.delta, trimParams.thrust)
+        self.B = f.Control_Jacobian(0, self.x0, trimParams.delta, trimParams.thrust)
+
+    # Linear model at the trim of a velocity and path angle (radians)
+    @classmethod
+    def at(cls, trimVelocity, trimGamma, initialAltitude=0.0):
+        return cls(s.trim_service.trim(trimVelocity, trimGamma, altitude=initialAltitude), initialAltitude)
+
+    def modes(self):
+        # Modes of the (q, theta, ub, wb) block; xe and ze do not feed back into the dynamics.
+        # Of the two oscillatory modes the faster is the short period, the slower the phugoid.
+        values, vectors = np.linalg.eig(self.A[:4, :4])
+        modes = [Mode(values[i], vectors[:, i]) for i in range(4) if values[i].imag >= 0]
+        oscillatory = sorted((mode for mode in modes if mode.oscillatory), key=lambda mode: mode.frequency)
+        if len(oscillatory) == 2:
+            oscillatory[0].name = "phugoid"
+            oscillatory[1].name = "short period"
+        return sorted(modes, key=lambda mode: mode.frequency)
+
+    def stable(self):
+        return bool(np.all(np.linalg.eigvals(self.A[:4, :4]).real < 0))
+
+    #--------------------------------------------------------------------------
+    # Responses. The affine system is written as one linear system of the state and a constant 1,
+    #     d/dt [dx, 1] = [[A, f0 + B du], [0, 0]] [dx, 1]
+    # so that its exact solution over a step h is a single matrix exponential of that 7 x 7 matrix.
+
+    def Transition(self, du, h):
+        M = np.zeros((7, 7))
+        M[:6, :6] = self.A
+        M[:6, 6] = self.f0 + self.B @ du
+        return linalg.expm(M * h)
+
+    def response(self, t, time_changes=(), dx0=None):
+        '''
+        State at the times t (increasing, from 0) for the A3 style 'time_changes' [(time, delta change, thrust change),
+        ...] from the trim state plus 'dx0'. Returns a 'simulation.Trajectory' of the full state x0 + dx.
+        '''
+        t = np.asarray(t, dtype=float)
+        schedule = s.ControlSchedule(0.0, 0.0, time_changes)
+        # Input segment of every output time; as in A3 a change applies once t is strictly past its time
+        segment = np.searchsorted(schedule.times, t, side="left")
+        z = np.append(np.zeros(6) if dx0 is None else np.asarray(dx0, dtype=float), 1.0)
+        y = np.empty((6, len(t)))
+        t_now = 0.0
+
+        for k in range(len(schedule.times) + 1):
+            du = np.array([schedule.delta[k], schedule.thrust[k]])
+            index = np.nonzero(segment == k)[0]
+            if len(index):
+                y[:, index] = self.Propagate(z, du, t[index] - t_now)[:6]
+            if k < len(schedule.times) and schedule.times[k] > t_now:
+                z = self.Transition(du, schedule.times[k] - t_now) @ z
+                t_now = schedule.times[k]
+
+        return s.Trajectory(t, self.x0[:, None] + y)
+
+    def Propagate(self, z, du, offsets, block=256):
+        # [dx, 1] at the increasing 'offsets' from z with the input change du, shape (7, len(offsets)).
+        # On a uniform grid the states are powers of one transition matrix, applied a block of powers at a time.
+        Z = np.empty((7, len(offsets)))
+        if offsets[0] != 0:
+            z = self.Transition(du, offsets[0]) @ z
+        steps = np.diff(offsets)
+        if len(steps) == 0 or not np.allclose(steps, steps[0], rtol=1e-9, atol=0):
+            Z[:, 0] = z
+            for i, h in enumerate(steps):
+                z = self.Transition(du, h) @ z
+                Z[:, i + 1] = z
+            return Z
+
+        Phi = self.Transition(du, steps[0])
+        powers = np.empty((min(block, len(offsets)), 7, 7))
+        powers[0] = np.eye(7)
+        for i in range(1, len(powers)):
+            powers[i] = Phi @ powers[i - 1]
+        Phi_block = Phi @ powers[-1]
+        for start in range(0, len(offsets), len(powers)):
+            n = min(len(powers), len(offsets) - start)
+            Z[:, start:start + n] = (powers[:n] @ z).T
+            z = Phi_block @ z
+        return Z
+
+#------------------------------------------------------------------------------
+# Linear against nonlinear
+
+def compare(trimVelocity, trimGamma, t_end, initialAltitude, time_changes, **options):
+    '''
+    Run 'time_changes' through the nonlinear 'A3' and through the linear model at its trim, on the same time points.
+    Returns the linear and nonlinear trajectories and the largest absolute difference of each state.
+    '''
+    nonlinear = s.A3(trimVelocity, trimGamma, t_end, initialAltitude, time_changes, display=False, **options)
+    model = LinearModel(nonlinear.Trim, initialAltitude)
+    linear = model.response(nonlinear.data.t, time_changes)
+    error = np.max(np.abs(linear.y - nonlinear.data.y), axis=1)
+    return linear, nonlinear.data, dict(zip(("q", "theta", "ub", "wb", "xe", "ze"), error))
+
+def Display_Comparison(linear, nonlinear):
+    # Both trajectories on the six panels of 'Visualise.Display_Sim'
+    import matplotlib.pyplot as plt
+    import plotview
+    view = plotview.SimView()
+    view.update(nonlinear.t, nonlinear.y)
+    for ax, column in zip(view.axes, plotview.SimView.columns(linear.y)):
+        ax.plot(linear.t, column, "--")
+    view.axes[0].legend(["nonlinear", "linear"])
+    plt.show()
+    return view.figure
+
+
+if __name__ == "__main__":
+    import time
+
+    model = LinearModel.at(100, 0, 2000)
+    for mode in model.modes():
+        print(mode)
+
+    # A3 reference case: elevator step of -0.0052 rad at 100s
+    t = np.linspace(0, 300, 15000)
+    start = time.perf_counter()
+    model.response(t, [(100.0, -0.0052, 0.0)])
+    print(f"Linear response: {1e3 * (time.perf_counter() - start):.2f}ms for {len(t)} points")
+
+    linear, nonlinear, error = compare(100, 0, 300, 2000, [(100.0, -0.0052, 0.0)])
+    print("Largest linear - nonlinear difference:", {name: f"{value:.3g}" for name, value in error.items()})
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'loadgen', measures the latency and throughput of the 'service' on localhost. A number of keep-alive
+connections each send requests back to back; the time from sending a request to reading its whole response is
+recorded per endpoint. Each phase reports the requests per second and the p50, p99 and maximum latency:
+    - trim:      random velocities and path angles, drawn from 'distinct' points so that some repeat (cache hits)
+    - simulate:  A3 elevator steps of random size, each run in a worker process
+The service's own counters (cache hits, trim batches and their mean size) are printed at the end.
+
+    python loadgen.py --spawn                      # start 'service.py' on a free port, load it, stop it
+    python loadgen.py --port 8765 --trims 20000    # load a service that is already running
+'''
+
+# Import libraries & modules
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import numpy as np
+
+SEED = 7
+
+#------------------------------------------------------------------------------
+# Minimal HTTP/1.1 client over one keep-alive connection
+
+class Client:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def request(self, method, path, body=None):
+        data = b"" if body is None else json.dumps(body).encode()
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            header = await self.reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+async def run_phase(host, port, requests, connections):
+    # Send (method, path, body) requests over 'connections' connections; latency of each, and the wall time
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    latencies = []
+    errors = []
+
+    async def worker():
+        client = await Client(host, port).open()
+        try:
+            while not queue.empty():
+                method, path, body = queue.get_nowait()
+                start = time.perf_counter()
+                status, payload = await client.request(method, path, body)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors.append(payload)
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    return np.array(latencies), time.perf_counter() - start, errors
+
+def summary(name, latencies, seconds, errors):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return (f"{name:>9}: {len(latencies)} requests in {seconds:.2f}s = {len(latencies) / seconds:8.0f}/s, "
+            f"p50 {p50:.2f}ms, p99 {p99:.2f}ms, max {latencies.max() * 1000:.1f}ms, {len(errors)} errors")
+
+#------------------------------------------------------------------------------
+
+def trim_requests(n, distinct, rng):
+    V = rng.uniform(60, 200, distinct).round(3)
+    gamma = np.deg2rad(rng.uniform(-5, 5, distinct)).round(6)
+    pick = rng.integers(0, distinct, n)
+    return [("POST", "/trim", {"velocity": float(V[i]), "gamma": float(gamma[i])}) for i in pick]
+
+def simulate_requests(n, rng):
+    steps = rng.uniform(-0.01, 0.01, n).round(5)
+    return [("POST", "/simulate", {"trimVelocity": 100, "trimGamma": 0, "t_end": 300, "initialAltitude": 2000,
+                                   "time_changes": [[100.0, float(step), 0.0]], "sample_rate": 2}) for step in steps]
+
+async def run_load(host, port, trims=10000, distinct=5000, simulations=40, connections=64):
+    rng = np.random.default_rng(SEED)
+    print(summary("trim", *await run_phase(host, port, trim_requests(trims, distinct, rng), connections)))
+    print(summary("simulate", *await run_phase(host, port, simulate_requests(simulations, rng), min(connections, 8))))
+    client = await Client(host, port).open()
+    _, stats = await client.request("GET", "/stats")
+    client.close()
+    print("service:", json.dumps({name: round(value, 2) if isinstance(value, float) else value
+                                  for name, value in stats.items()}))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def spawn_service(port, workers):
+    # Start 'service.py' next to this file and wait until it answers
+    directory = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen([sys.executable, os.path.join(directory, "service.py"), "--port", str(port),
+                                "--workers", str(workers)], cwd=directory, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("service.py exited during start-up")
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("service.py did not start within 60s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the local simulation service and report latencies.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--spawn", action="store_true", help="start service.py on a free port for the run")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes of the spawned service")
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--trims", type=int, default=10000)
+    parser.add_argument("--distinct", type=int, default=5000, help="different trim points among the requests")
+    parser.add_argument("--simulations", type=int, default=40)
+    args = parser.parse_args()
+
+    process = None
+    if args.spawn:
+        args.port = free_port()
+        process = spawn_service(args.port, args.workers)
+    try:
+        asyncio.run(run_load(args.host, args.port, args.trims, args.distinct, args.simulations, args.connections))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
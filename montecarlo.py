@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'montecarlo', estimates how uncertainty in the aircraft parameters spreads into the trim thrust and
+elevator angle and into the A3 response. Each sample is an aircraft ('aircraft.Aircraft') whose uncertain parameters
+are drawn from normal distributions around the 'constants' values. Samples are processed in batches: one vectorised
+'trim_batch' and one 'ensemble.A3Ensemble' solve per batch. After each batch the outputs are folded into
+'StreamingPercentiles', so memory depends on the batch size and the output grid, not on the number of samples.
+
+Example:
+    mc = MonteCarlo(100, 0, 300, 2000, [(100.0, -0.0052, 0.0)], n_samples=2000).run()
+    mc.envelope((5, 50, 95))       # percentile trajectories, each (6, len(mc.t))
+    mc.Display_Envelope()
+'''
+
+# Import libraries & modules
+import numpy as np
+import constants as c
+import aircraft as ac
+import ensemble
+import simulation as s
+
+# Relative standard deviation of each uncertain parameter
+DISPERSION = {"CL0": 0.05, "CLa": 0.05, "CMa": 0.10, "CMde": 0.10, "CD0": 0.10, "K": 0.10,
+              "mass": 0.05, "inertia_yy": 0.10, "air_density": 0.03}
+
+def sample_aircraft(n, dispersion=DISPERSION, rng=None, base=c):
+    # Batch of n aircraft, each uncertain parameter normally distributed around its value in 'base'
+    rng = np.random.default_rng(rng)
+    return ac.Aircraft(base, **{name: getattr(base, name) * (1 + sd * rng.standard_normal(n))
+                                for name, sd in dispersion.items()})
+
+#------------------------------------------------------------------------------
+# Percentiles of a stream of samples, for many outputs at once (e.g. every state at every output time)
+
+class StreamingPercentiles:
+    '''
+    One fixed histogram per output. The bin range is taken from the first batch and widened by 'margin' times its
+    spread on both sides; later values outside it are counted in the end bins. Memory is bins x outputs however many
+    samples are added, and the percentiles are accurate to about one bin width. The exact minimum, maximum, mean and
+    standard deviation are kept as well.
+    '''
+    def __init__(self, bins=1000, margin=1.0):
+        self.bins = bins
+        self.margin = margin
+        self.n = 0
+        self.counts = None
+
+    def update(self, values):
+        # values: (n_samples, ...) with the same output shape every time
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return
+        if self.counts is None:
+            self.shape = values.shape[1:]
+            flat = values.reshape(len(values), -1)
+            low, high = flat.min(axis=0), flat.max(axis=0)
+            pad = self.margin * (high - low) + 1e-9 * (np.abs(low) + np.abs(high)) + 1e-12
+            self.low = low - pad
+            self.width = (high - low + 2 * pad) / self.bins
+            self.counts = np.zeros((flat.shape[1], self.bins), dtype=np.int64)
+            self.min = np.full(flat.shape[1], np.inf)
+            self.max = np.full(flat.shape[1], -np.inf)
+            self.sum = np.zeros(flat.shape[1])
+            self.sum_squares = np.zeros(flat.shape[1])
+
+        flat = values.reshape(len(values), -1)
+        index = np.clip(((flat - self.low) / self.width).astype(np.int64), 0, self.bins - 1)
+        index += np.arange(flat.shape[1]) * self.bins
+        self.counts += np.bincount(index.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+        self.min = np.minimum(self.min, flat.min(axis=0))
+        self.max = np.maximum(self.max, flat.max(axis=0))
+        self.sum += flat.sum(axis=0)
+        self.sum_squares += np.sum(flat**2, axis=0)
+        self.n += len(flat)
+
+    def percentile(self, q):
+        # q-th percentile of every output, interpolated linearly inside its bin
+        cumulative = np.cumsum(self.counts, axis=1)
+        target = q / 100 * self.n
+        k = np.minimum(np.sum(cumulative < target, axis=1), self.bins - 1)
+        rows = np.arange(len(k))
+        before = np.where(k > 0, cumulative[rows, k - 1], 0)
+        in_bin = np.maximum(self.counts[rows, k], 1)
+        value = self.low + (k + np.clip((target - before) / in_bin, 0, 1)) * self.width
+        return np.clip(value, self.min, self.max).reshape(self.shape)
+
+    @property
+    def mean(self):
+        return (self.sum / self.n).reshape(self.shape)
+
+    @property
+    def std(self):
+        variance = self.sum_squares / self.n - (self.sum / self.n)**2
+        return np.sqrt(np.maximum(variance, 0)).reshape(self.shape)
+
+#------------------------------------------------------------------------------
+
+class MonteCarlo:
+    def __init__(self, trimVelocity, trimGamma, t_end, initialAltitude, time_changes, n_samples=1000, batch_size=250,
+                 dispersion=DISPERSION, seed=0, sample_rate=2, bins=1000, method="RK45"):
+        self.trimVelocity = trimVelocity
+        self.trimGamma = trimGamma
+        self.t_end = t_end
+        self.initialAltitude = initialAltitude
+        self.time_changes = time_changes
+        self.n_samples = n_samples
+        self.batch_size = batch_size
+        self.dispersion = dispersion
+        self.seed = seed
+        self.sample_rate = sample_rate
+        self.method = method
+        self.t = s.sample_times(t_end, sample_rate)
+
+        self.thrust = StreamingPercentiles(bins)
+        self.delta = StreamingPercentiles(bins)
+        self.response = StreamingPercentiles(bins)
+        self.failed = 0
+
+    def run(self, progress=None):
+        rng = np.random.default_rng(self.seed)
+        done = 0
+        while done < self.n_samples:
+            n = min(self.batch_size, self.n_samples - done)
+            aircraft = sample_aircraft(n, self.dispersion, rng)
+
+            # Samples whose trim does not converge have no A3 response; they are counted, not simulated
+            trims = s.trim_batch(self.trimVelocity, self.trimGamma, aircraft=aircraft, altitude=self.initialAltitude)
+            ok = trims.converged
+            self.failed += int(np.sum(~ok))
+            self.thrust.update(trims.thrust[ok])
+            self.delta.update(trims.delta[ok])
+
+            if ok.any():
+                members = aircraft.take(ok)
+                run = ensemble.A3Ensemble(self.trimVelocity, self.trimGamma, self.t_end, self.initialAltitude,
+                                          [self.time_changes] * len(members), method=self.method, aircraft=members,
+                                          sample_rate=self.sample_rate)
+                # (members, 6, times)
+                self.response.update(np.moveaxis(run.y, 1, 0))
+
+            done += n
+            if progress is not None:
+                progress(done, self.n_samples)
+        return self
+
+    def envelope(self, percentiles=(5, 50, 95)):
+        # Trajectory of every requested percentile, each (6, len(t)); taken state by state and time by time
+        return {q: self.response.percentile(q) for q in percentiles}
+
+    def Display_Envelope(self, percentiles=(5, 50, 95)):
+        # Median line and the band between the outer percentiles on the panels of 'Visualise.Display_Sim'
+        import matplotlib.pyplot as plt
+        import plotview
+        low, middle, high = (self.response.percentile(q) for q in (percentiles[0], percentiles[len(percentiles) // 2], percentiles[-1]))
+        view = plotview.SimView()
+        view.update(self.t, middle)
+        for ax, lower, upper in zip(view.axes, plotview.SimView.columns(low), plotview.SimView.columns(high)):
+            # Altitude is -ze, so its bounds swap
+            ax.fill_between(self.t, np.minimum(lower, upper), np.maximum(lower, upper), alpha=0.3)
+        plt.show()
+        return view.figure
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    mc = MonteCarlo(100, 0, 300, 2000, [(100.0, -0.0052, 0.0)], n_samples=1000).run()
+    print(f"{mc.n_samples} samples in {time.perf_counter() - start:.1f}s, {mc.failed} trims failed")
+    print("Trim thrust 5/50/95%:", [round(float(mc.thrust.percentile(q)), 1) for q in (5, 50, 95)])
+    altitude = {q: -value[5, -1] for q, value in mc.envelope((95, 50, 5)).items()}
+    print("Final altitude 5/50/95%:", [round(float(value), 1) for value in altitude.values()])
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'plotview', holds the 3x2 figure of an aircraft response ('Visualise.Display_Sim') as a persistent view.
+The axes, titles and labels are created once; 'SimView.update' only replaces the data of the six lines, so redrawing
+for a new run costs the same as drawing the first one. Long trajectories are reduced to the minimum and maximum of
+each pixel column before drawing ('minmax_decimate'), which keeps the drawing time flat as the trajectory grows and
+still shows every peak. 'begin_stream', 'append' and 'end_stream' draw a trajectory while it is being computed,
+blitting only the lines over a cached background; the GUI ('UI') streams its runs this way.
+'''
+
+# Import libraries & modules
+import numpy as np
+
+# (row, column, title, y label) of the panels, in the order of 'SimView.columns'
+PANELS = [(0, 0, "$u_{B}$ Body Axis Velocity vs Time", "$u_{B}$ [m/s]"),
+          (0, 1, "$w_{B}$ Body Axis Velocity vs Time", "$w_{B}$ [m/s]"),
+          (1, 0, "q Angular Velocity vs Time", "q [rad/s]"),
+          (1, 1, "${\\Theta}$ Pitch Angle vs Time", "${\\Theta}$ [$^{0}$]"),
+          (2, 0, "$x_{E}$ Horizontal Position vs Time", "$x_{e}$ [m]"),
+          (2, 1, "h Altitude  vs Time", "Altitude h [m]")]
+
+def minmax_decimate(t, y, n_bins):
+    # Keep the first and last sample and the minimum and maximum of y in each of 'n_bins' equal blocks of samples
+    n = len(t)
+    if n <= 2 * n_bins:
+        return t, y
+    k = n // n_bins
+    m = k * n_bins
+    block = np.asarray(y[:m]).reshape(n_bins, k)
+    imin = block.argmin(axis=1)
+    imax = block.argmax(axis=1)
+    base = np.arange(n_bins) * k
+    index = np.column_stack([base + np.minimum(imin, imax), base + np.maximum(imin, imax)]).ravel()
+    index = np.unique(np.concatenate([[0], index, np.arange(m, n)]))
+    return np.asarray(t)[index], np.asarray(y)[index]
+
+#------------------------------------------------------------------------------
+
+class SimView:
+    def __init__(self, fig=None):
+        # Draw into 'fig' when one is given, otherwise into a new pyplot figure
+        if fig is None:
+            import matplotlib.pyplot as plt
+            fig = plt.figure(figsize=(9, 7))
+        self.figure = fig
+        fig.clear()
+        ax = fig.subplots(3, 2)
+        self.axes = []
+        self.lines = []
+        for row, column, title, ylabel in PANELS:
+            self.axes.append(ax[row, column])
+            self.lines.append(ax[row, column].plot([], [])[0])
+            ax[row, column].set_title(title, fontsize=12)
+            ax[row, column].set_ylabel(ylabel)
+            ax[row, column].set_xlabel("t [s]")
+        fig.tight_layout()
+
+        self.backgrounds = None
+        self.t = np.empty(0)
+        self.y = np.empty((6, 0))
+        self.count = 0
+
+    @staticmethod
+    def columns(y):
+        # Plotted quantities from the state rows (q, theta, ub, wb, xe, ze)
+        return [y[2], y[3], y[0], np.rad2deg(y[1]), y[4], -np.asarray(y[5])]
+
+    def pixels(self, ax):
+        # Width of an axes in pixels, the number of decimation bins
+        return max(int(ax.bbox.width), 100)
+
+    def set_lines(self, t, y):
+        for ax, line, column in zip(self.axes, self.lines, self.columns(y)):
+            line.set_data(*minmax_decimate(t, column, self.pixels(ax)))
+
+    def update(self, t, y):
+        # Replace the plotted trajectory, e.g. with a 'Trajectory' as view.update(data.t, data.y)
+        self.set_lines(t, y)
+        for ax in self.axes:
+            ax.relim()
+            ax.autoscale_view()
+        self.figure.canvas.draw_idle()
+
+    #--------------------------------------------------------------------------
+    # Streaming
+
+    def begin_stream(self, t_end):
+        # Fix the time axis to the run and cache the backgrounds without the lines
+        self.t = np.empty(1024)
+        self.y = np.empty((6, 1024))
+        self.count = 0
+        for ax, line in zip(self.axes, self.lines):
+            ax.set_xlim(0, t_end)
+            line.set_data([], [])
+            line.set_animated(True)
+        self.capture()
+
+    def capture(self):
+        canvas = self.figure.canvas
+        canvas.draw()
+        if getattr(canvas, "supports_blit", False):
+            self.backgrounds = [canvas.copy_from_bbox(ax.bbox) for ax in self.axes]
+        else:
+            self.backgrounds = None
+
+    def append(self, t, y):
+        # Add samples (t of shape (n,), y of shape (6, n)) and redraw only the lines
+        t = np.atleast_1d(t)
+        y = np.reshape(y, (6, -1))
+        if self.count + len(t) > len(self.t):
+            size = max(2 * len(self.t), self.count + len(t))
+            self.t = np.resize(self.t, size)
+            self.y = np.concatenate([self.y, np.empty((6, size - self.y.shape[1]))], axis=1)
+        self.t[self.count:self.count + len(t)] = t
+        self.y[:, self.count:self.count + len(t)] = y
+        self.count += len(t)
+
+        # Widen the y limits when the new samples leave them; this needs one full redraw
+        first = self.count == len(t)
+        rescale = False
+        for ax, column in zip(self.axes, self.columns(y)):
+            low, high = (np.inf, -np.inf) if first else ax.get_ylim()
+            if column.min() < low or column.max() > high:
+                low, high = min(low, column.min()), max(high, column.max())
+                margin = 0.05 * (high - low) or 0.05 * max(abs(high), 1.0)
+                ax.set_ylim(low - margin, high + margin)
+                rescale = True
+
+        self.set_lines(self.t[:self.count], self.y[:, :self.count])
+        canvas = self.figure.canvas
+        if rescale:
+            self.capture()
+        if self.backgrounds is None:
+            canvas.draw_idle()
+            return
+        for ax, line, background in zip(self.axes, self.lines, self.backgrounds):
+            canvas.restore_region(background)
+            ax.draw_artist(line)
+            canvas.blit(ax.bbox)
+        canvas.flush_events()
+
+    def end_stream(self):
+        # Back to a static figure holding everything that was streamed; the limits fixed while streaming are released,
+        # so that later updates rescale again
+        for ax, line in zip(self.axes, self.lines):
+            line.set_animated(False)
+            ax.set_autoscale_on(True)
+        self.backgrounds = None
+        self.update(self.t[:self.count], self.y[:, :self.count])
+
+
+if __name__ == "__main__":
+    import time
+    import matplotlib
+    matplotlib.use("Agg")
+    import simulation as s
+
+    # Drawing time of the view against the trajectory length
+    view = SimView()
+    for t_end in (300, 3000, 30000):
+        data = s.A3(100, 0, t_end, 2000, [(100, -0.0052, 0)], display=False).data
+        start = time.perf_counter()
+        view.update(data.t, data.y)
+        view.figure.canvas.draw()
+        print(f"{len(data.t):7d} samples: {1e3 * (time.perf_counter() - start):.1f}ms per redraw")
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'realtime', advances the longitudinal model one fixed step at a time, for loops that run at a fixed rate
+(e.g. hardware in the loop at 100 - 1000 Hz) and supply the elevator angle and thrust at every step.
+'RealTimeSimulator.step' uses the classic Runge-Kutta 4 method on the fused equations of motion ('forms.Fused_Equations'),
+writing every stage into buffers allocated once, so no arrays are created while stepping. Each step records its
+computation time, and steps that take longer than the deadline are counted.
+'''
+
+# Import libraries & modules
+import time
+import numpy as np
+import forms as f
+import simulation as s
+
+class RealTimeSimulator:
+    def __init__(self, trimVelocity, trimGamma, initialAltitude, deadline = 1e-3, history = 100000):
+        # Start from trim, like A3
+        self.Trim = s.trim_service.trim(trimVelocity, trimGamma, altitude = initialAltitude)
+        self.t = 0.0
+        self.y = np.array([0, self.Trim.theta, self.Trim.ub, self.Trim.wb, 0, -initialAltitude], dtype = float)
+        self.Equations = f.Fused_Equations()
+
+        # Runge-Kutta stage buffers
+        self.k1 = np.empty(6)
+        self.k2 = np.empty(6)
+        self.k3 = np.empty(6)
+        self.k4 = np.empty(6)
+        self.stage = np.empty(6)
+        # The equations read the state and the stage through memoryviews of the buffers, which unpack straight to
+        # python floats without the list of 'tolist'
+        self.y_view = memoryview(self.y)
+        self.stage_view = memoryview(self.stage)
+
+        # Step latency statistics; the latest 'history' latencies are kept in a ring buffer for percentiles
+        self.deadline = deadline
+        self.latencies = np.zeros(history)
+        self.steps = 0
+        self.misses = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def step(self, dt, delta, thrust):
+        start = time.perf_counter()
+        E, y, stage, k1, k2, k3, k4 = self.Equations, self.y, self.stage, self.k1, self.k2, self.k3, self.k4
+        y_view, stage_view = self.y_view, self.stage_view
+        t = self.t
+
+        E(t, y_view, delta, thrust, k1)
+        np.multiply(k1, 0.5 * dt, out = stage)
+        stage += y
+        E(t + 0.5 * dt, stage_view, delta, thrust, k2)
+        np.multiply(k2, 0.5 * dt, out = stage)
+        stage += y
+        E(t + 0.5 * dt, stage_view, delta, thrust, k3)
+        np.multiply(k3, dt, out = stage)
+        stage += y
+        E(t + dt, stage_view, delta, thrust, k4)
+
+        # y += dt / 6 * (k1 + 2 k2 + 2 k3 + k4)
+        np.add(k2, k3, out = stage)
+        stage *= 2
+        stage += k1
+        stage += k4
+        stage *= dt / 6
+        y += stage
+        self.t = t + dt
+
+        latency = time.perf_counter() - start
+        self.latencies[self.steps % len(self.latencies)] = latency
+        self.steps += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+        if latency > self.deadline:
+            self.misses += 1
+        return y
+
+    def run(self, duration, rate, controls):
+        '''
+        Step in real time at 'rate' Hz for 'duration' seconds. 'controls(t, y)' returns the elevator angle and thrust
+        for the next step. Here a deadline miss is a step that finishes after the start of the next period.
+        Returns the number of periods that were overrun.
+        '''
+        dt = 1.0 / rate
+        overruns = 0
+        next_tick = time.perf_counter()
+        for _ in range(int(duration * rate)):
+            delta, thrust = controls(self.t, self.y)
+            self.step(dt, delta, thrust)
+            next_tick += dt
+            remaining = next_tick - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                overruns += 1
+        return overruns
+
+    def stats(self):
+        recent = self.latencies[:min(self.steps, len(self.latencies))]
+        return {"steps": self.steps,
+                "mean_latency": self.total_latency / max(self.steps, 1),
+                "p99_latency": float(np.percentile(recent, 99)) if self.steps else 0.0,
+                "max_latency": self.max_latency,
+                "deadline": self.deadline,
+                "deadline_misses": self.misses}
+
+
+if __name__ == "__main__":
+    # Elevator step of the A3 reference case, stepped at 1 kHz as fast as possible
+    sim = RealTimeSimulator(100, 0, 2000)
+    for i in range(300000):
+        delta = sim.Trim.delta - (0.0052 if sim.t > 100 else 0.0)
+        sim.step(1e-3, delta, sim.Trim.thrust)
+    print(f"t = {sim.t:.1f}s, altitude = {-sim.y[5]:.2f}m")
+    print(sim.stats())
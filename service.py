@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'service', serves trim conditions, B1 style sweeps and headless A3 runs over HTTP/JSON on the local
+machine, so that other tools do not each pay the SciPy import and the 'constants' set-up. It uses only the standard
+library (asyncio) next to the simulation modules:
+
+    POST /trim      {"velocity": 100, "gamma": 0.0, "altitude": 2000}        gamma in radians, altitude optional
+    POST /sweep     {"V_values": [...], "gamma_values": [...]}                as 'engine.trim_sweep'
+    POST /simulate  {"trimVelocity": 100, "trimGamma": 0, "t_end": 300, "initialAltitude": 2000,
+                     "time_changes": [[100, -0.0052, 0]], "sample_rate": 2}    as 'engine.simulate'
+    GET  /stats, GET /health
+
+Trim requests that arrive together are answered by one vectorised 'trim_batch': each request is queued and the queue
+is solved once the event loop has read everything waiting on the sockets (or after 'max_delay'). Sweeps and A3 runs
+go to a pool of worker processes that import the simulation and solve a trim when the service starts. Every result
+is cached by a hash of its request ('sweep.case_id'), and identical requests in progress share one computation.
+
+    python service.py --port 8765 --workers 2
+    python loadgen.py --spawn
+'''
+
+# Import libraries & modules
+import argparse
+import asyncio
+import functools
+import json
+import signal
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import forms as f
+import simulation as s
+from sweep import case_id
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+class RequestError(Exception):
+    pass
+
+def fields(body, names, optional=()):
+    # The named fields of a request body, with the optional ones that are present
+    missing = [name for name in names if name not in body]
+    if missing:
+        raise RequestError(f"Missing fields {missing}")
+    return {name: body[name] for name in tuple(names) + tuple(name for name in optional if name in body)}
+
+def numbers(args, shapes):
+    # Convert the named fields to floats (shape ()) or nested lists of floats; a field that does not convert to finite
+    # numbers (null becomes nan), or has another shape (None for any length), is the client's error
+    for name, shape in shapes.items():
+        if name not in args:
+            continue
+        try:
+            value = np.asarray(args[name], dtype=float)
+            if not np.isfinite(value).all():
+                raise ValueError
+        except (TypeError, ValueError):
+            raise RequestError(f"Field '{name}' must be numeric, got {args[name]!r}") from None
+        if value.ndim != len(shape) or any(n is not None and n != size for n, size in zip(shape, value.shape)):
+            raise RequestError(f"Field '{name}' has shape {value.shape}, expected {shape}")
+        args[name] = value.tolist()
+    return args
+
+def choice(args, name, names):
+    # An optional string field that must be one of 'names'; null keeps the default
+    value = args.get(name)
+    if value is not None and not (isinstance(value, str) and value in names):
+        raise RequestError(f"Unknown {name} {value!r}, choose from {list(names)}")
+
+#------------------------------------------------------------------------------
+# Work done in the worker processes. Only plain python values go in and out.
+
+def warm_worker():
+    # Pay the imports and the first trim when the worker starts rather than on its first request
+    import engine
+    engine.trim(100, 0)
+
+def run_sweep(V_values, gamma_values):
+    import engine
+    grid = engine.trim_sweep(V_values, gamma_values)
+    return {"V_values": grid.V_values.tolist(), "gamma_values": grid.gamma_values.tolist(),
+            "alpha": grid.alpha.tolist(), "delta": grid.delta.tolist(), "thrust": grid.thrust.tolist(),
+            "converged": grid.converged.tolist()}
+
+def run_simulate(trimVelocity, trimGamma, t_end, initialAltitude, time_changes, **options):
+    import engine
+    trajectory = engine.simulate(trimVelocity, trimGamma, t_end, initialAltitude,
+                                 [tuple(change) for change in time_changes], **options)
+    return {"t": trajectory.t.tolist(), "y": trajectory.y.tolist(), "success": bool(trajectory.success),
+            "trim": {"delta": float(trajectory.trim.delta), "thrust": float(trajectory.trim.thrust)}}
+
+#------------------------------------------------------------------------------
+# Coalescing of concurrent trim requests
+
+class TrimBatcher:
+    def __init__(self, max_batch=1024, max_delay=0.0):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = []
+        self.handle = None
+        self.batches = 0
+        self.trims = 0
+
+    def submit(self, velocity, gamma, altitude=0.0):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((velocity, gamma, altitude, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.handle is None:
+            # call_soon runs after the requests already readable in this loop iteration have been queued
+            self.handle = loop.call_later(self.max_delay, self.flush) if self.max_delay else loop.call_soon(self.flush)
+        return future
+
+    def flush(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        velocity, gamma, altitude = (np.array([request[k] for request in pending], dtype=float) for k in range(3))
+        try:
+            trims = s.trim_batch(velocity, gamma, altitude=altitude)
+        except Exception as error:
+            for *_, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.batches += 1
+        self.trims += len(pending)
+        for k, (*_, future) in enumerate(pending):
+            if not future.done():
+                future.set_result({"alpha": float(trims.alpha[k]), "delta": float(trims.delta[k]),
+                                   "theta": float(trims.theta[k]), "thrust": float(trims.thrust[k]),
+                                   "ub": float(trims.ub[k]), "wb": float(trims.wb[k]),
+                                   "converged": bool(trims.converged[k])})
+
+#------------------------------------------------------------------------------
+
+class Service:
+    def __init__(self, workers=2, cache_size=4096, max_batch=1024, max_delay=0.0):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.running = {}
+        self.batcher = TrimBatcher(max_batch, max_delay)
+        self.pool = None
+        self.counters = {"requests": 0, "cache_hits": 0, "shared": 0, "errors": 0}
+        self.started = time.time()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self.pool = ProcessPoolExecutor(self.workers, initializer=warm_worker)
+        # Start every worker now: a pool only spawns a process when it is given work
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, time.sleep, 0.1) for _ in range(self.workers)))
+        self.server = await asyncio.start_server(self.Connection, host, port)
+        return self.server
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    #--------------------------------------------------------------------------
+    # HTTP/1.1 with keep-alive; the requests of one connection are answered in order
+
+    async def Connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, path, _ = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.Dispatch(method, path, body)
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def Dispatch(self, method, path, body):
+        self.counters["requests"] += 1
+        routes = {"/trim": self.Trim, "/sweep": self.Sweep, "/simulate": self.Simulate}
+        if method == "GET" and path in ("/stats", "/health"):
+            return 200, self.stats() if path == "/stats" else {"status": "ok"}
+        if path not in routes:
+            return 404, {"error": f"Unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "Use POST"}
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                raise RequestError("The body must be a JSON object")
+            return 200, await self.Cached(path, request, routes[path])
+        except (RequestError, json.JSONDecodeError) as error:
+            self.counters["errors"] += 1
+            return 400, {"error": str(error)}
+        except Exception as error:
+            self.counters["errors"] += 1
+            return 500, {"error": f"{type(error).__name__}: {error}"}
+
+    async def Cached(self, path, request, compute):
+        # LRU cache by request hash; identical requests in progress wait for the same result
+        key = case_id(path, request)
+        if key in self.cache:
+            self.counters["cache_hits"] += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if key in self.running:
+            self.counters["shared"] += 1
+            return await asyncio.shield(self.running[key])
+
+        task = asyncio.ensure_future(compute(request))
+        self.running[key] = task
+        try:
+            result = await task
+        finally:
+            del self.running[key]
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    #--------------------------------------------------------------------------
+    # Endpoints
+
+    async def Trim(self, request):
+        args = numbers(fields(request, ("velocity", "gamma"), ("altitude",)), {"velocity": (), "gamma": (), "altitude": ()})
+        return await self.batcher.submit(float(args["velocity"]), float(args["gamma"]), float(args.get("altitude", 0.0)))
+
+    async def Sweep(self, request):
+        args = numbers(fields(request, ("V_values", "gamma_values")), {"V_values": (None,), "gamma_values": (None,)})
+        if not args["V_values"] or not args["gamma_values"]:
+            raise RequestError("V_values and gamma_values must not be empty")
+        return await asyncio.get_running_loop().run_in_executor(self.pool, run_sweep, args["V_values"], args["gamma_values"])
+
+    async def Simulate(self, request):
+        args = fields(request, ("trimVelocity", "trimGamma", "t_end", "initialAltitude", "time_changes"),
+                      ("method", "backend", "sample_rate"))
+        numbers(args, {"trimVelocity": (), "trimGamma": (), "t_end": (), "initialAltitude": (), "sample_rate": ()})
+        if args["time_changes"] != []:
+            numbers(args, {"time_changes": (None, 3)})
+        if args["t_end"] <= 0:
+            raise RequestError("t_end must be positive")
+        if args.get("sample_rate", 1) <= 0:
+            raise RequestError("sample_rate must be positive")
+        if any(not 0 <= change[0] <= args["t_end"] for change in args["time_changes"]):
+            raise RequestError("Every time change must lie in [0, t_end]")
+        choice(args, "method", s.SOLVERS)
+        choice(args, "backend", f.BACKENDS)
+        return await asyncio.get_running_loop().run_in_executor(self.pool, functools.partial(run_simulate, **args))
+
+    def stats(self):
+        return {**self.counters, "trim_batches": self.batcher.batches, "batched_trims": self.batcher.trims,
+                "mean_batch": self.batcher.trims / max(self.batcher.batches, 1), "cache_size": len(self.cache),
+                "workers": self.workers, "uptime": time.time() - self.started}
+
+async def serve(host="127.0.0.1", port=8765, **options):
+    service = Service(**options)
+    server = await service.start(host, port)
+    print(f"Serving on http://{host}:{port} with {service.workers} workers", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON service for trims, sweeps and A3 runs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="worker processes for sweeps and A3 runs")
+    parser.add_argument("--cache", type=int, default=4096, help="results kept in the cache")
+    parser.add_argument("--max-delay", type=float, default=0.0, help="seconds a trim may wait for others to batch with")
+    args = parser.parse_args()
+    # Stop on SIGTERM as on Ctrl-C, so that the worker processes are shut down with the service
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, cache_size=args.cache, max_delay=args.max_delay))
+    except KeyboardInterrupt:
+        pass
@@ -18,49 +18,467 @@ Some limitations are evident once again regarding the quality of intial guesses,
 Newton Raphson root finding technique used to calculate the angle of attack alpha. 
 '''
 # Import libraries & modules
+import bisect
+import time
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy import integrate, optimize
 import forms as f
 import constants as c
+import trimcache
+import trajstore
+import instrument
+import aircraft as ac
+
+#------------------------------------------------------------------------------
+# Right hand side backend used by A3 and B2: "python" is the reference 'forms.Equations', "fused" is
+# 'forms.Fused_Equations'. Change it with 'set_backend' or per run with the 'backend' argument.
+
+backend = "python"
+
+def set_backend(name):
+    global backend
+    if name not in f.BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', choose from {list(f.BACKENDS)}")
+    backend = name
+
+def rhs_backend(name=None, aircraft=c):
+    name = backend if name is None else name
+    if name not in f.BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', choose from {list(f.BACKENDS)}")
+    return f.BACKENDS[name](aircraft)
+
+# Wrapper reporting the integration time and state to 'progress(t, y)' before every evaluation, e.g. to drive a
+# progress bar or a live plot. The states of the solver stages lie close to the solution but not exactly on it, and a
+# rejected step repeats its times. 'progress' may raise SimulationCancelled to stop the run.
+class SimulationCancelled(Exception):
+    pass
+
+def with_progress(Equations, progress):
+    def Equations_Progress(t, y, delta, thrust):
+        progress(t, y)
+        return Equations(t, y, delta, thrust)
+    return Equations_Progress
+
+# 'solve_ivp' methods that use a Jacobian; these are given the analytic 'forms.Jacobian' instead of finite differences
+IMPLICIT_METHODS = ("Radau", "BDF", "LSODA")
+
+def solver_options(method, jacobian):
+    if method in IMPLICIT_METHODS:
+        return {"method": method, "jac": jacobian}
+    return {"method": method}
+
+#------------------------------------------------------------------------------
+# Piecewise constant elevator angle and thrust. The changes are sorted once and accumulated, so the value at any
+# time is a binary search away, and the simulation can be integrated one constant-control segment at a time.
+
+class ControlSchedule:
+    def __init__(self, delta, thrust, time_changes):
+        changes = sorted(time_changes, key=lambda change: change[0])
+        self.times = [change_time for change_time, _, _ in changes]
+        # Value k holds after the first k changes
+        self.delta = np.cumsum([delta] + [delta_change for _, delta_change, _ in changes]).tolist()
+        self.thrust = np.cumsum([thrust] + [thrust_change for _, _, thrust_change in changes]).tolist()
+
+    def __call__(self, t):
+        # As in A3, a change applies once t is strictly past its time
+        k = bisect.bisect_left(self.times, t)
+        return self.delta[k], self.thrust[k]
+
+    def segments(self, t_start, t_end):
+        # (start, end, delta, thrust) of every constant piece between t_start and t_end
+        bounds = [t_start] + [time for time in self.times if t_start < time < t_end] + [t_end]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if end > start:
+                yield (start, end) + self(0.5 * (start + end))
+
+def integrate_schedule(Equations, schedule, t_span, y0, t_eval=None, method="RK45", events=None, stats=None, dense=False, aircraft=c):
+    '''
+    Solve the equations of motion segment by segment, restarting 'solve_ivp' at every control change so that the
+    solver never steps across a discontinuity. Returns a result shaped like the 'solve_ivp' output.
+    'events' are passed to 'solve_ivp' in every segment; a terminal event ends the whole integration.
+    An enabled 'stats' ('instrument.RunStats') receives the counters of every segment.
+    With 'dense' the solver's interpolants are kept in the result, which can then be sampled at any time.
+    'aircraft' is only used for the Jacobian of the implicit methods; 'Equations' must already be built for it.
+    '''
+    stats = instrument.OFF if stats is None else stats
+    t_start, t_end = t_span
+    t_out, y_out = [], []
+    t_events, y_events = [], []
+    counters = {"nfev": 0, "njev": 0, "nlu": 0}
+    solutions = [] if dense else None
+    y = np.asarray(y0, dtype=float)
+
+    for start, end, delta, thrust in schedule.segments(t_start, t_end):
+        if t_eval is None:
+            segment_eval = None
+        else:
+            # Every output time belongs to exactly one segment; the final segment also takes t_end.
+            # The segment end is always evaluated so that the next segment starts from the exact state.
+            upper = t_eval <= end if end == t_end else t_eval < end
+            segment_eval = t_eval[(t_eval >= start) & upper]
+            n_keep = len(segment_eval)
+            if n_keep == 0 or segment_eval[-1] != end:
+                segment_eval = np.append(segment_eval, end)
+
+        result = integrate.solve_ivp(lambda t, y: Equations(t, y, delta, thrust), [start, end], y, t_eval=segment_eval,
+                                     events=events, dense_output=dense,
+                                     **solver_options(method, lambda t, y: f.Jacobian(t, y, delta, thrust, aircraft)))
+        if stats.enabled:
+            # Accepted steps from the interpolants or, without t_eval, from the returned steps; instrumenting a run
+            # does not turn on dense output, so it does not change the run
+            if dense:
+                steps = len(result.sol.ts) - 1
+            else:
+                steps = len(result.t) - 1 if t_eval is None else None
+            stats.add_solver(method, result.nfev, result.njev, result.nlu, steps, dense=steps if dense else 0)
+        if dense:
+            solutions.append(result.sol)
+        for key in counters:
+            counters[key] += result[key]
+        if events is not None:
+            t_events.append(result.t_events)
+            y_events.append(result.y_events)
+
+        # Without t_eval every segment returns its start point, which is the end point of the previous one
+        keep = slice(n_keep) if t_eval is not None else slice(1 if t_out else 0, None)
+        t_out.append(result.t[keep])
+        y_out.append(result.y[:, keep])
+        if result.status != 0:
+            break
+        y = result.y[:, -1]
+
+    with stats.phase("post-process"):
+        if events is not None:
+            # One array per event, covering all segments
+            t_events = [np.concatenate(times) for times in zip(*t_events)]
+            y_events = [np.concatenate([np.reshape(state, (-1, len(y))) for state in states]) for states in zip(*y_events)]
+        else:
+            t_events = y_events = None
+
+        return Trajectory(np.concatenate(t_out), np.concatenate(y_out, axis=1), status=result.status,
+                          message=result.message, t_events=t_events, y_events=y_events, solutions=solutions, **counters)
+
+def sample_times(t_end, sample_rate):
+    # 'sample_rate' evenly spaced points per second from 0 up to and including t_end
+    return np.linspace(0, t_end, int(np.ceil(t_end * sample_rate)) + 1)
+
+# Solver classes behind the 'solve_ivp' method names, for stepping the solvers directly
+SOLVERS = {"RK23": integrate.RK23, "RK45": integrate.RK45, "DOP853": integrate.DOP853,
+           "Radau": integrate.Radau, "BDF": integrate.BDF, "LSODA": integrate.LSODA}
+
+def stream_schedule(Equations, schedule, t_span, y0, writer, n_samples, method="RK45", stats=None, aircraft=c):
+    '''
+    Same integration as 'integrate_schedule' with t_eval = np.linspace(t_start, t_end, n_samples), but the samples
+    are generated step by step and passed to 'writer' (a 'trajstore.TrajectoryWriter') instead of being collected,
+    so memory use does not grow with the length of the run. Returns the solver counters.
+    '''
+    stats = instrument.OFF if stats is None else stats
+    t_start, t_end = t_span
+    spacing = (t_end - t_start) / (n_samples - 1)
+    counters = {"nfev": 0, "njev": 0, "nlu": 0, "status": 0, "message": ""}
+    y = np.asarray(y0, dtype=float)
+    k = 0   # index of the next sample
+
+    for start, end, delta, thrust in schedule.segments(t_start, t_end):
+        options = solver_options(method, lambda t, y: f.Jacobian(t, y, delta, thrust, aircraft))
+        options.pop("method")
+        solver = SOLVERS[method](lambda t, y: Equations(t, y, delta, thrust), start, y, end, **options)
+        last = end == t_end
+        steps = dense = 0
+
+        while solver.status == "running":
+            solver.step()
+            if solver.status == "failed":
+                break
+            steps += 1
+            # Samples covered by this step; a sample at a segment end belongs to the next segment, except t_end
+            k_stop = k
+            while k_stop < n_samples and (t_start + k_stop * spacing < solver.t or (solver.status == "finished" and last)):
+                k_stop += 1
+            if k_stop > k:
+                times = np.minimum(t_start + np.arange(k, k_stop) * spacing, end)
+                writer.append(times, solver.dense_output()(times))
+                dense += 1
+                k = k_stop
+
+        stats.add_solver(method, solver.nfev, solver.njev, solver.nlu, steps, dense)
+        counters["nfev"] += solver.nfev
+        counters["njev"] += solver.njev
+        counters["nlu"] += solver.nlu
+        if solver.status == "failed":
+            counters["status"] = -1
+            counters["message"] = "Solver step failed"
+            break
+        y = solver.y
+
+    counters["success"] = counters["status"] >= 0
+    return counters
+
+def stream_to_store(Equations, schedule, t_span, y0, path, n_samples, method="RK45", stats=None, aircraft=c):
+    # Integrate into a trajectory directory at 'path' and return it memory-mapped
+    with trajstore.TrajectoryWriter(path) as writer:
+        writer.meta.update(stream_schedule(Equations, schedule, t_span, y0, writer, n_samples, method, stats, aircraft))
+    return trajstore.load_trajectory(path)
+
+#------------------------------------------------------------------------------
+# Plain result of a simulation: the time points t and the states y (6 x len(t)), as in the 'solve_ivp' output,
+# together with the solver counters. No plotting involved; 'Visualise.Display_Sim' accepts it directly.
+# A dense trajectory (from 'integrate_schedule(..., dense=True)') holds only the solver's own steps in t and y and keeps
+# the interpolant of every constant-control segment, so it can be sampled at any time afterwards.
+
+class Trajectory:
+    def __init__(self, t, y, status=0, message="", t_events=None, y_events=None, nfev=0, njev=0, nlu=0, solutions=None):
+        self.t = t
+        self.y = y
+        self.status = status
+        self.message = message
+        self.success = status >= 0
+        self.t_events = t_events
+        self.y_events = y_events
+        self.nfev = nfev
+        self.njev = njev
+        self.nlu = nlu
+        self.solutions = solutions
+
+    # Named views of the state rows
+    q = property(lambda self: self.y[0])
+    theta = property(lambda self: self.y[1])
+    ub = property(lambda self: self.y[2])
+    wb = property(lambda self: self.y[3])
+    xe = property(lambda self: self.y[4])
+    ze = property(lambda self: self.y[5])
+    altitude = property(lambda self: -self.y[5])
+
+    @property
+    def dense(self):
+        return bool(self.solutions)
+
+    @property
+    def boundaries(self):
+        # Start and end of every segment: the control change times, where the solver stopped exactly
+        return [self.solutions[0].t_min] + [solution.t_max for solution in self.solutions]
+
+    def sample(self, times):
+        '''
+        States (6 x len(times)) at any times within the run, from the interpolant of the segment holding each time.
+        A time on a control change is taken from the segment that ends there, i.e. the exact state at the change.
+        '''
+        if not self.dense:
+            raise ValueError("Trajectory has no dense output; integrate it with dense=True")
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        ends = [solution.t_max for solution in self.solutions]
+        index = np.minimum(np.searchsorted(ends, times, side="left"), len(ends) - 1)
+        y = np.empty((len(self.y), len(times)))
+        for k in np.unique(index):
+            mask = index == k
+            y[:, mask] = self.solutions[k](times[mask])
+        return y
+
+    def resample(self, times):
+        # Same run on the given time points, e.g. a fixed rate grid for export
+        times = np.asarray(times, dtype=float)
+        return Trajectory(times, self.sample(times), status=self.status, message=self.message, t_events=self.t_events,
+                          y_events=self.y_events, nfev=self.nfev, njev=self.njev, nlu=self.nlu, solutions=self.solutions)
+
+    def plot_samples(self, per_step=4, max_points=20000):
+        '''
+        Time points for drawing: 'per_step' points inside every solver step, so long steps are drawn smoothly
+        and short ones are not oversampled, limited to about 'max_points'. Returns (t, y).
+        '''
+        if not self.dense:
+            return self.t, self.y
+        per_step = max(1, min(per_step, max_points // max(len(self.t) - 1, 1)))
+        fractions = np.arange(per_step) / per_step
+        t = (self.t[:-1, None] + np.diff(self.t)[:, None] * fractions).ravel()
+        t = np.append(t, self.t[-1])
+        return t, self.sample(t)
 
 #------------------------------------------------------------------------------
 # Class for handling the intitial and user inputted trim conditons
 
 class Trim:
-    def __init__(self, trimVelocity, trimGamma):
+    def __init__(self, trimVelocity, trimGamma, initial_guess = 0.01, aircraft = c, altitude = 0.0):
         self.velocity = trimVelocity
         self.gamma = trimGamma
+        # The altitude only matters for an aircraft with an atmosphere, whose density there is then used
+        self.altitude = altitude
+        self.aircraft = ac.at_altitude(aircraft, altitude)
         
-        # Solve for alpha
-        initial_guess = 0.01  # Provide an initial guess
-        self.alpha = optimize.newton(self.alpha_trim_func, initial_guess)
-        
+        # Solve for alpha, starting from the initial guess, keeping the Newton iterations and final residual
+        self.alpha, result = optimize.newton(self.alpha_trim_func, initial_guess, full_output=True)
+        self.iterations = result.iterations
+        self.converged = result.converged
+        self.residual = abs(self.alpha_trim_func(self.alpha))
+        self.Trim_Outputs()
+
+    # Build a trim condition from an already known alpha, e.g. one read from a cache
+    @classmethod
+    def from_alpha(cls, trimVelocity, trimGamma, alpha, aircraft=c, altitude=0.0):
+        trim = cls.__new__(cls)
+        trim.velocity = trimVelocity
+        trim.gamma = trimGamma
+        trim.altitude = altitude
+        trim.aircraft = ac.at_altitude(aircraft, altitude)
+        trim.alpha = alpha
+        trim.iterations = 0
+        trim.converged = True
+        trim.residual = None
+        trim.Trim_Outputs()
+        return trim
+
+    def Trim_Outputs(self):
         # Solve for delta
-        self.delta = -(c.CM0 + c.CMa * self.alpha) / c.CMde
+        a = self.aircraft
+        self.delta = f.Trim_Elevator(self.alpha, a)
     
         # Calculating other variables to output
-        self.theta = self.alpha + trimGamma
-        self.ub = trimVelocity * np.cos(self.alpha)
-        self.wb = trimVelocity * np.sin(self.alpha)
+        self.theta = self.alpha + self.gamma
+        self.ub = self.velocity * np.cos(self.alpha)
+        self.wb = self.velocity * np.sin(self.alpha)
     
         # Calculating thrust
-        self.thrust = f.Engine_Thrust(self.alpha, self.delta, self.theta, trimVelocity)
+        self.thrust = f.Engine_Thrust(self.alpha, self.delta, self.theta, self.velocity, a)
         
     def alpha_trim_func(self, alpha):
-        self.delta = -(c.CM0 + c.CMa * alpha) / c.CMde
+        a = self.aircraft
+        self.delta = f.Trim_Elevator(alpha, a)
+
+        return (-f.Lift(alpha, self.delta, self.velocity, a) * np.cos(alpha) 
+                - f.Drag(alpha, self.delta, self.velocity, a) * np.sin(alpha) 
+                + a.mass * a.gravity * np.cos(alpha + self.gamma))
 
-        return (-f.Lift(alpha, self.delta, self.velocity) * np.cos(alpha) 
-                - f.Drag(alpha, self.delta, self.velocity) * np.sin(alpha) 
-                + c.mass * c.gravity * np.cos(alpha + self.gamma))
+# Shared trim cache used by A3, B2 and the UI. Replace it with e.g. trimcache.TrimService(Trim, path="trims.sqlite")
+# to keep the results between runs.
+trim_service = trimcache.TrimService(Trim)
+
+#------------------------------------------------------------------------------
+# Batch trim solver: the same trim equations as 'Trim', solved for whole arrays of velocities and path angles at once
+
+class TrimBatch:
+    def __init__(self, V, gamma, alpha, converged, iterations, aircraft=c):
+        self.velocity = V
+        self.gamma = gamma
+        self.alpha = alpha
+        self.converged = converged
+        self.iterations = iterations
+        self.aircraft = aircraft
+
+        # Same relations as in 'Trim'
+        self.delta = f.Trim_Elevator(alpha, aircraft)
+        self.theta = alpha + gamma
+        self.ub = V * np.cos(alpha)
+        self.wb = V * np.sin(alpha)
+        self.thrust = f.Engine_Thrust(alpha, self.delta, self.theta, V, aircraft)
+
+class TrimGrid(TrimBatch):
+    def __init__(self, V_values, gamma_values, batch):
+        # Grid axes: velocity along axis 0, gamma along axis 1
+        self.V_values = V_values
+        self.gamma_values = gamma_values
+        self.__dict__.update(vars(batch))
+
+def alpha_trim_grid(alpha, V, gamma, aircraft=c):
+    # Vectorised 'Trim.alpha_trim_func' together with its analytic derivative d/dalpha
+    a = aircraft
+    if getattr(a, "aero", None) is None:
+        # With delta eliminated through the moment equation, CL is linear in alpha: CL = CL_a0 + CL_a1 * alpha
+        CL_a0 = a.CL0 - a.CLde * a.CM0 / a.CMde
+        CL_a1 = a.CLa - a.CLde * a.CMa / a.CMde
+        CL = CL_a0 + CL_a1 * alpha
+        CD = a.CD0 + a.K * CL**2
+        CD_a1 = 2 * a.K * CL * CL_a1
+    else:
+        # Table model: delta from the moment equation by Newton's method, and the total derivatives along it
+        delta, ddelta = a.aero.trim_elevator(alpha)
+        CL, CD, _ = a.aero.coefficients(alpha, delta)
+        dCL_da, dCD_da, _, dCL_dd, dCD_dd, _ = a.aero.derivatives(alpha, delta)
+        CL_a1 = dCL_da + dCL_dd * ddelta
+        CD_a1 = dCD_da + dCD_dd * ddelta
+
+    dynamic = 0.5 * a.air_density * V**2 * a.wing_surface
+    cos_a = np.cos(alpha)
+    sin_a = np.sin(alpha)
+    weight = a.mass * a.gravity
+
+    residual = -dynamic * (CL * cos_a + CD * sin_a) + weight * np.cos(alpha + gamma)
+    slope = (-dynamic * (CL_a1 * cos_a - CL * sin_a + CD_a1 * sin_a + CD * cos_a)
+             - weight * np.sin(alpha + gamma))
+    return residual, slope
+
+def _fill_from_neighbours(alpha, converged):
+    # Copy the nearest converged value along each axis in turn into unconverged cells
+    guess = np.where(converged, alpha, np.nan)
+    for axis in range(guess.ndim):
+        for direction in (1, -1):
+            filled = np.moveaxis(guess, axis, 0)
+            rows = range(1, filled.shape[0]) if direction == 1 else range(filled.shape[0] - 2, -1, -1)
+            for i in rows:
+                # Slices rather than filled[i], which is a scalar copy for 1-D input
+                row, previous = filled[i:i + 1], filled[i - direction:i - direction + 1]
+                missing = np.isnan(row)
+                row[missing] = previous[missing]
+    return guess
+
+def trim_batch(V, gamma, alpha_guess=0.01, tol=1.48e-8, maxiter=50, aircraft=c, altitude=0.0):
+    '''
+    Trim the aircraft element-wise for the broadcast arrays V and gamma (radians).
+    All cells are iterated together with Newton's method on arrays; each cell stops updating once its
+    step is below 'tol'. Cells that do not converge are restarted from their converged neighbours.
+    'alpha_guess' may be a scalar or an array of the same shape, e.g. the alpha of a previous solve.
+    'aircraft' may be a batch ('aircraft.Aircraft' with array parameters), broadcast against V and gamma.
+    With an atmosphere on the aircraft, 'altitude' (scalar or array) sets the density of each cell.
+    '''
+    aircraft = ac.at_altitude(aircraft, altitude)
+    shape = np.broadcast_shapes(np.shape(V), np.shape(gamma), getattr(aircraft, "shape", ()))
+    V = np.atleast_1d(np.broadcast_to(np.asarray(V, dtype=float), shape))
+    gamma = np.atleast_1d(np.broadcast_to(np.asarray(gamma, dtype=float), shape))
+    if getattr(aircraft, "batch", False):
+        aircraft = aircraft.broadcast(V.shape)
+
+    alpha = np.broadcast_to(np.asarray(alpha_guess, dtype=float), V.shape).copy()
+    converged = np.zeros(V.shape, dtype=bool)
+    iterations = np.zeros(V.shape, dtype=int)
+
+    # Second pass only runs if some cells failed and have a converged neighbour to start from
+    for attempt in range(2):
+        active = ~converged
+        for _ in range(maxiter):
+            if not active.any():
+                break
+            residual, slope = alpha_trim_grid(alpha[active], V[active], gamma[active], ac.take(aircraft, active))
+            step = residual / slope
+            alpha[active] -= step
+            iterations[active] += 1
+
+            done = np.abs(step) < tol
+            failed = ~np.isfinite(step)
+            index = np.flatnonzero(active)
+            converged.flat[index[done]] = True
+            active.flat[index[done | failed]] = False
+
+        if converged.all() or not converged.any():
+            break
+        alpha = np.where(converged, alpha, _fill_from_neighbours(alpha, converged))
+
+    return TrimBatch(V, gamma, alpha, converged, iterations, aircraft)
+
+def trim_grid(V_array, gamma_array, alpha_guess=0.01, tol=1.48e-8, maxiter=50, aircraft=c, altitude=0.0):
+    # Trim every combination of V_array (axis 0) and gamma_array (axis 1, radians), see 'trim_batch'
+    V_values = np.atleast_1d(np.asarray(V_array, dtype=float))
+    gamma_values = np.atleast_1d(np.asarray(gamma_array, dtype=float))
+    V, gamma = np.meshgrid(V_values, gamma_values, indexing="ij")
+
+    return TrimGrid(V_values, gamma_values, trim_batch(V, gamma, alpha_guess, tol, maxiter, aircraft, altitude))
 
 #------------------------------------------------------------------------------
 # Class to display data from other classes: plotting dynamic behavior and trim conditions
+# matplotlib is only imported when something is plotted, so that runs without plots (display=False, sweep workers)
+# never load it
 
 class Visualise():
     
     # Plotting aircraft parameter response
-    def Display_Sim(self, Data):
+    def Display_Sim(self, Data, fig=None):
         # Split data into components
         self.t = Data.t
         self.q = Data.y[0]
@@ -74,46 +492,25 @@ class Visualise():
         self.altitude = self.ze * -1
         #self.altitude += initialAltitude
 
-        fig, ax = plt.subplots(3, 2, figsize=(9, 7))
-
-        ax[0, 0].plot(self.t, self.ub)
-        ax[0, 0].set_title("$u_{B}$ Body Axis Velocity vs Time", fontsize=12)
-        ax[0, 0].set_ylabel("$u_{B}$ [m/s]")
-        ax[0, 0].set_xlabel("t [s]")
-
-        ax[0, 1].plot(self.t, self.wb)
-        ax[0, 1].set_title("$w_{B}$ Body Axis Velocity vs Time", fontsize=12)
-        ax[0, 1].set_ylabel("$w_{B}$ [m/s]")
-        ax[0, 1].set_xlabel("t [s]")
-        
-        ax[1, 1].plot(self.t, self.theta)
-        ax[1, 1].set_title("${\Theta}$ Pitch Angle vs Time", fontsize=12)
-        ax[1, 1].set_ylabel("${\Theta}$ [$^{0}$]")
-        ax[1, 1].set_xlabel("t [s]")
-
-        ax[1, 0].plot(self.t, self.q)
-        ax[1, 0].set_title("q Angular Velocity vs Time", fontsize=12)
-        ax[1, 0].set_ylabel("q [rad/s]")
-        ax[1, 0].set_xlabel("t [s]")
-
-        ax[2, 0].plot(self.t, self.xe)
-        ax[2, 0].set_title("$x_{E}$ Horizontal Position vs Time", fontsize=12)
-        ax[2, 0].set_ylabel("$x_{e}$ [m]")
-        ax[2, 0].set_xlabel("t [s]")
-
-        ax[2, 1].plot(self.t, self.altitude)
-        ax[2, 1].set_title("h Altitude  vs Time", fontsize=12)
-        ax[2, 1].set_ylabel("Altitude h [m]")
-        ax[2, 1].set_xlabel("t [s]")
-
-        plt.tight_layout()
+        # The axes are created once per figure ('plotview.SimView'); later calls only replace the line data
+        import plotview
+        view = getattr(self, "view", None)
+        if view is None or (fig is not None and view.figure is not fig):
+            self.view = view = plotview.SimView(fig)
+        if isinstance(Data, Trajectory):
+            view.update(*Data.plot_samples())
+        else:
+            view.update(Data.t, Data.y)
+        fig = view.figure
 
         # Output the plot
         return fig
     
-    def Display_B1(self, V_values, gamma_values, T_values, delta_values):
+    def Display_B1(self, V_values, gamma_values, T_values, delta_values, show=True):
+       import matplotlib.pyplot as plt
+
        # Create a single figure with all the required subplots
-       plt.figure(figsize=(14, 10))
+       fig = plt.figure(figsize=(14, 10))
 
        # Plot Thrust vs Velocity
        plt.subplot(2, 2, 1)
@@ -155,13 +552,15 @@ class Visualise():
        plt.tight_layout()
 
        # Display the plots
-       plt.show()
+       if show:
+           plt.show()
+       return fig
 
 #------------------------------------------------------------------------------
 # B1 - To calculate trim conditions for various values of velocity and path angle
 
 class B1(Visualise):
-    def __init__(self, V_min, V_max, gamma_min, gamma_max, V_step, gamma_step):
+    def __init__(self, V_min, V_max, gamma_min, gamma_max, V_step, gamma_step, display=True):
         # Define the ranges for V and gamma
         self.V_min = V_min
         self.V_max = V_max
@@ -176,84 +575,183 @@ class B1(Visualise):
         self.V_values = np.arange(self.V_min, self.V_max, self.V_step)
         self.gamma_values = np.arange(self.gamma_min, self.gamma_max, self.gamma_step)
 
-        # Create arrays to store T and delta
-        self.T_values = np.empty((len(self.V_values), len(self.gamma_values)))
-        self.delta_values = np.empty((len(self.V_values), len(self.gamma_values)))
+        # Trim every (V, gamma) cell in one batch solve
+        self.trims = trim_grid(self.V_values, np.deg2rad(self.gamma_values))
 
-        for i, V in enumerate(self.V_values):
-            for j, gamma in enumerate(self.gamma_values):
-                # Create a new Trim instance with the current V and gamma
-                trim_condition = Trim(V, np.deg2rad(gamma))
+        # Store T and delta values from the trim conditions
+        self.T_values = self.trims.thrust
+        self.delta_values = np.rad2deg(self.trims.delta)
 
-                # Store T and delta values from the trim condition
-                self.T_values[i, j] = trim_condition.thrust
-                self.delta_values[i, j] = np.rad2deg(trim_condition.delta)
-        
-        self.Display_B1(self.V_values, self.gamma_values, self.T_values, self.delta_values)
+        if display:
+            self.Display_B1(self.V_values, self.gamma_values, self.T_values, self.delta_values)
 #-------------------------------------------------------------------------------------------------------------------------
 # B2 - To find the time required to climb a specified altitude at a specified angle and velocity
 class B2(Visualise):
-    def __init__(self, trimVelocity, trimGamma, t_end, initialAltitude, maxAltitude, pitchTime, climbVelocity, climbGamma, climbTimeGuess = 0, climbStep = 0.5):
+    '''
+    Finds the shortest climb time (time spent at the climb trim after 'pitchTime') that takes the aircraft to
+    'maxAltitude'. The climb time is bracketed starting from 'climbTimeGuess' in steps that double from 'climbStep',
+    then refined to 'climbTol' seconds with Brent's method.
+    criterion = "final": the altitude at t_end must be at least maxAltitude (the original brute-force search).
+    criterion = "reached": maxAltitude must be reached at any time before t_end; every trial simulation then stops
+    as soon as it gets there. Because of the phugoid after the climb this gives a shorter climb time than "final".
+    As in A3, 'data' holds the solver steps and samples any other time lazily, unless 'sample_rate' asks for a grid.
+    '''
+    def __init__(self, trimVelocity, trimGamma, t_end, initialAltitude, maxAltitude, pitchTime, climbVelocity, climbGamma, climbTimeGuess = 0, climbStep = 0.5, backend = None, method = "RK45", climbTol = 0.01, criterion = "final", display = True, store = None, stats = None, sample_rate = None, aircraft = c):
+        if criterion not in ("final", "reached"):
+            raise ValueError(f"Unknown criterion '{criterion}', choose 'final' or 'reached'")
+        self.aircraft = aircraft
+        self.Equations = rhs_backend(backend, aircraft)
+        self.stats = instrument.run_stats(stats, "B2")
+
         # Find trim conditions
-        trimParams = Trim(trimVelocity, trimGamma)
+        with self.stats.phase("trim"):
+            # Both at the initial altitude, which is where the climb starts
+            trimParams = trim_service.trim(trimVelocity, trimGamma, aircraft, initialAltitude)
+            trimParams2 = trim_service.trim(climbVelocity, climbGamma, aircraft, initialAltitude)
         self.Trim = trimParams
-        
-        trimParams2 = Trim(climbVelocity, climbGamma)
         self.Trim2 = trimParams2
+        self.stats.add_trim("trim", trimParams)
+        self.stats.add_trim("climb trim", trimParams2)
         
-        self.climbTime = climbTimeGuess
         self.pitchTime = pitchTime
-        
-        finalAltitude = initialAltitude
-        
-        while finalAltitude < maxAltitude:
-            y = integrate.solve_ivp(self.SimControl, [0,t_end], [0,trimParams.theta, trimParams.ub, trimParams.wb, 0, -initialAltitude], t_eval=np.linspace(0,t_end,t_end*50))
-            finalAltitude = -y.y[5][len(y.y[5])-1]
-            
-            self.climbTime += climbStep
+        self.t_end = t_end
+        self.maxAltitude = maxAltitude
+        self.method = method
+        self.criterion = criterion
+        self.y0 = [0, trimParams.theta, trimParams.ub, trimParams.wb, 0, -initialAltitude]
+
+        # Search statistics
+        self.nSimulations = 0
+        self.simulationTime = 0.0
+        start = time.perf_counter()
+
+        self.climbTime = self.ClimbSearch(climbTimeGuess, climbStep, climbTol)
+        self.searchTime = time.perf_counter() - start
+
+        # Full trajectory at the climb time found, for plotting
+        self.schedule = self.Schedule()
+        with self.stats.phase("integrate"):
+            if store is None:
+                y = integrate_schedule(self.Equations, self.schedule, [0, t_end], self.y0, t_eval=None if sample_rate is None else sample_times(t_end, sample_rate), method=method, stats=self.stats, dense=sample_rate is None, aircraft=aircraft)
+            else:
+                y = stream_to_store(self.Equations, self.schedule, [0, t_end], self.y0, store, len(sample_times(t_end, sample_rate or 50)), method, self.stats, aircraft)
+        self.data = y
             
         # Send data to "Display" function to be plotted
-        self.Display_Sim(y)
-        
-        print(f"Climb Duration: {self.climbTime}s")
+        if display:
+            with self.stats.phase("plot"):
+                self.Display_Sim(y)
+            print(f"Climb Duration: {self.climbTime:.3f}s ({self.nSimulations} simulations, {self.simulationTime:.2f}s)")
+        self.stats.finish()
+
+    # Event function: zero when the altitude reaches maxAltitude on the way up
+    def AltitudeReached(self, t, y):
+        return -y[5] - self.maxAltitude
+    AltitudeReached.terminal = True
+    AltitudeReached.direction = 1
+
+    def ClimbMargin(self, climbTime):
+        # Positive if the criterion is met with this climb time, negative if not
+        self.climbTime = climbTime
+        self.schedule = self.Schedule()
+
+        start = time.perf_counter()
+        with self.stats.phase("integrate"):
+            if self.criterion == "reached":
+                y = integrate_schedule(self.Equations, self.schedule, [0, self.t_end], self.y0, method=self.method, events=[self.AltitudeReached], stats=self.stats, aircraft=self.aircraft)
+            else:
+                y = integrate_schedule(self.Equations, self.schedule, [0, self.t_end], self.y0, method=self.method, stats=self.stats, aircraft=self.aircraft)
+        self.simulationTime += time.perf_counter() - start
+        self.nSimulations += 1
+
+        if self.criterion == "final":
+            return -y.y[5][-1] - self.maxAltitude
+        if len(y.t_events[0]) > 0:
+            # Seconds to spare before t_end
+            return self.t_end - y.t_events[0][0]
+        # Altitude short of maxAltitude at the highest point of the run
+        return -y.y[5].min() - self.maxAltitude
+
+    def ClimbSearch(self, climbTimeGuess, climbStep, climbTol):
+        # Bracket the smallest sufficient climb time, doubling the step each time
+        low = high = climbTimeGuess
+        step = climbStep
+        if self.ClimbMargin(climbTimeGuess) >= 0:
+            while low > 0:
+                high = low
+                low = max(low - step, 0)
+                step *= 2
+                if self.ClimbMargin(low) < 0:
+                    break
+            else:
+                return 0.0
+        else:
+            while True:
+                low = high
+                high = high + step
+                step *= 2
+                if self.ClimbMargin(high) >= 0:
+                    break
+                if high > self.t_end - self.pitchTime:
+                    raise ValueError(f"maxAltitude {self.maxAltitude} m is not reached within t_end = {self.t_end} s")
+
+        return optimize.brentq(self.ClimbMargin, low, high, xtol=climbTol)
     
+    # Climb trim between pitchTime and pitchTime + climbTime, level trim otherwise
+    def Schedule(self):
+        delta_change = self.Trim2.delta - self.Trim.delta
+        thrust_change = self.Trim2.thrust - self.Trim.thrust
+        return ControlSchedule(self.Trim.delta, self.Trim.thrust,
+                               [(self.pitchTime, delta_change, thrust_change),
+                                (self.pitchTime + self.climbTime, -delta_change, -thrust_change)])
+
     # Function to change delta and thrust during IVP calculations
     def SimControl(self, t, y):
-        if t > self.pitchTime and t < self.pitchTime + self.climbTime:
-            delta = self.Trim2.delta
-            thrust = self.Trim2.thrust
-        else:
-            delta = self.Trim.delta
-            thrust = self.Trim.thrust
-
-        return f.Equations(t, y, delta, thrust)
+        delta, thrust = self.schedule(t)
+        return self.Equations(t, y, delta, thrust)
 #--------------------------------------------------------------------------------------------------------------------------
 # A3 - defining a class to control elevator angle changes and test the accuracy of trimming function
 class A3(Visualise):
-    def __init__(self, trimVelocity, trimGamma, t_end, initialAltitude, time_changes):
+    def __init__(self, trimVelocity, trimGamma, t_end, initialAltitude, time_changes, backend=None, method="RK45", trim_table=None, display=True, store=None, progress=None, stats=None, sample_rate=None, aircraft=c):
         self.time_changes = time_changes
+        self.stats = instrument.run_stats(stats, "A3")
+        self.aircraft = aircraft
+        self.Equations = rhs_backend(backend, aircraft)
+        if progress is not None:
+            self.Equations = with_progress(self.Equations, progress)
         
-        # Find trim conditions
-        trimParams = Trim(trimVelocity, trimGamma)
+        # Find trim conditions, from the precomputed 'trimtable.TrimTable' when one is given and covers this point
+        with self.stats.phase("trim"):
+            # The table is built for the default aircraft from 'constants' at its fixed density and with the fits
+            use_table = trim_table is not None and aircraft is c and c.atmosphere is None and c.aero is None
+            trimParams = trim_table.trim(trimVelocity, trimGamma) if use_table else None
+            if trimParams is None:
+                trimParams = trim_service.trim(trimVelocity, trimGamma, aircraft, initialAltitude)
         self.Trim = trimParams
+        self.stats.add_trim("trim", trimParams)
+        
+        self.schedule = ControlSchedule(trimParams.delta, trimParams.thrust, time_changes)
         
-        y = integrate.solve_ivp(self.SimControl, [0, t_end], [0, trimParams.theta, trimParams.ub, trimParams.wb, 0, -initialAltitude], t_eval=np.linspace(0, int(t_end), int(t_end * 50)))
+        y0 = [0, trimParams.theta, trimParams.ub, trimParams.wb, 0, -initialAltitude]
+        with self.stats.phase("integrate"):
+            if store is None:
+                # Without a sample rate only the solver steps are stored; 'self.data.sample(times)' gives any other time
+                y = integrate_schedule(self.Equations, self.schedule, [0, t_end], y0, t_eval=None if sample_rate is None else sample_times(t_end, sample_rate), method=method, stats=self.stats, dense=sample_rate is None, aircraft=aircraft)
+            else:
+                # Stream the samples to disk and keep only a memory-mapped view
+                y = stream_to_store(self.Equations, self.schedule, [0, t_end], y0, store, len(sample_times(t_end, sample_rate or 50)), method, self.stats, aircraft)
         
         self.data = y
         # Send data to "Display" function to be plotted
-        self.Display_Sim(y)
+        if display:
+            with self.stats.phase("plot"):
+                self.Display_Sim(y)
+        self.stats.finish()
     
     # Function to change delta and thrust during IVP calculations
     def SimControl(self, t, y):
-        delta = self.Trim.delta
-        thrust = self.Trim.thrust
-        #A3 parameter control
-        for change_time, delta_change, thrust_change in self.time_changes:
-            if t > change_time:
-                delta += delta_change
-                thrust += thrust_change
-
-        return f.Equations(t, y, delta, thrust)
+        delta, thrust = self.schedule(t)
+        return self.Equations(t, y, delta, thrust)
 
 
 #----------------------------------------------------------------------------------------------------------
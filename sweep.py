@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'sweep', runs parameter studies of 'Trim', 'A3' and 'B2' across all processor cores.
+A study is either a list of cases (dictionaries of keyword arguments) or a grid (a list of values per argument,
+expanded to every combination). Cases are sent to a process pool in chunks, and each result is appended to a
+json lines file as soon as its chunk finishes. The same file is the checkpoint: running the sweep again skips the
+cases already in it. The workers use the headless 'engine' and never import matplotlib.
+
+Example:
+    sweep = Sweep("A3", grid={"trimVelocity": [90, 100, 110], "trimGamma": [0], "t_end": [300],
+                              "initialAltitude": [2000], "time_changes": [[(100.0, -0.0052, 0.0)]]},
+                  path="a3_sweep.jsonl")
+    results = sweep.run()
+'''
+
+# Import libraries & modules
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+KINDS = ("Trim", "A3", "B2")
+ALTITUDE_RATE = 10   # Samples per second of the A3 altitude for its minimum and maximum
+
+def case_id(kind, case):
+    # Stable id of a case, independent of its position in the study
+    return hashlib.sha1(json.dumps([kind, case], sort_keys=True).encode()).hexdigest()[:16]
+
+def expand_grid(grid):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+#------------------------------------------------------------------------------
+# Work done inside the worker processes. Only plain python values go in and out.
+
+def run_chunk(kind, cases):
+    import numpy as np
+    import engine
+    import simulation as s
+
+    if kind == "Trim":
+        # One vectorised solve for the whole chunk
+        trims = s.trim_batch([case["trimVelocity"] for case in cases], [case["trimGamma"] for case in cases])
+        return [{"alpha": float(trims.alpha[i]), "delta": float(trims.delta[i]), "theta": float(trims.theta[i]),
+                 "thrust": float(trims.thrust[i]), "converged": bool(trims.converged[i])}
+                for i in range(len(cases))]
+
+    results = []
+    for case in cases:
+        try:
+            if kind == "A3":
+                trajectory = engine.simulate(**case)
+                # Without a sample rate or store only the solver steps are kept, which are long and miss the peaks
+                # between them, so the altitude is sampled on a fixed grid instead
+                if getattr(trajectory, "dense", False):
+                    altitude = -trajectory.sample(s.sample_times(trajectory.t[-1], ALTITUDE_RATE))[5]
+                else:
+                    altitude = trajectory.altitude
+                results.append({"final_state": trajectory.y[:, -1].tolist(),
+                                "min_altitude": float(np.min(altitude)),
+                                "max_altitude": float(np.max(altitude)), "nfev": int(trajectory.nfev),
+                                "success": bool(trajectory.success)})
+            else:
+                climb = engine.climb(**case)
+                results.append({"climbTime": float(climb.climbTime), "nSimulations": climb.nSimulations,
+                                "final_state": climb.trajectory.y[:, -1].tolist()})
+        except Exception as error:
+            # One failing case must not stop the sweep
+            results.append({"error": f"{type(error).__name__}: {error}"})
+    return results
+
+#------------------------------------------------------------------------------
+
+class Sweep:
+    def __init__(self, kind, cases=None, grid=None, path="sweep.jsonl", workers=None, chunksize=None):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind '{kind}', choose from {KINDS}")
+        if (cases is None) == (grid is None):
+            raise ValueError("Give either 'cases' or 'grid'")
+
+        self.kind = kind
+        self.cases = list(cases) if cases is not None else expand_grid(grid)
+        self.path = path
+        self.workers = workers or os.cpu_count()
+
+        # Trim chunks are vectorised, so they can be large; simulations are balanced over a few chunks per worker
+        if chunksize is None:
+            chunksize = 1000 if kind == "Trim" else max(1, len(self.cases) // (4 * self.workers))
+        self.chunksize = chunksize
+
+    def completed(self):
+        # Results already in the output file, by case id
+        done = {}
+        if os.path.exists(self.path):
+            with open(self.path) as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Last line of an interrupted run
+                        continue
+                    done[record["id"]] = record
+        return done
+
+    def run(self, progress=None):
+        done = self.completed()
+        pending = [(case_id(self.kind, case), case) for case in self.cases]
+        pending = [(identifier, case) for identifier, case in pending if identifier not in done]
+        chunks = [pending[i:i + self.chunksize] for i in range(0, len(pending), self.chunksize)]
+
+        with open(self.path, "a") as file, ProcessPoolExecutor(self.workers) as pool:
+            futures = {pool.submit(run_chunk, self.kind, [case for _, case in chunk]): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                for (identifier, case), result in zip(futures[future], future.result()):
+                    record = {"id": identifier, "case": case, "result": result}
+                    file.write(json.dumps(record) + "\n")
+                    done[identifier] = record
+                file.flush()
+                if progress is not None:
+                    progress(len(done), len(self.cases))
+
+        # Results in the order of the cases
+        return [done[case_id(self.kind, case)] for case in self.cases]
+
+
+if __name__ == "__main__":
+    import numpy as np
+    import time
+
+    start = time.perf_counter()
+    sweep = Sweep("Trim", grid={"trimVelocity": np.arange(50, 200, 1.0).tolist(),
+                                "trimGamma": np.deg2rad(np.arange(-5, 5, 0.1)).tolist()}, path="trim_sweep.jsonl")
+    results = sweep.run()
+    print(f"{len(results)} trim cases in {time.perf_counter() - start:.2f}s with {sweep.workers} workers")
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from scipy.interpolate import CubicSpline
+import constants as c
+import aerotable
+from aerotable import CubicTable
+
+TABLE = aerotable.TABLE
+ALPHA = np.asarray(c.alpha_list, dtype=float)
+DELTA = np.asarray(c.delta_el_list, dtype=float)
+
+def test_reproduces_the_data_points():
+    CL, CM, CD = TABLE.alpha_table.values(ALPHA)
+    np.testing.assert_allclose(CL, c.CL_list, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(CM, c.CM_list, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(CD, c.CD_list, rtol=1e-9, atol=1e-12)
+    CL_el, CM_el = TABLE.delta_table.values(DELTA)
+    np.testing.assert_allclose(CL_el, c.CL_el_list, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(CM_el, c.CM_el_list, rtol=1e-9, atol=1e-12)
+
+def test_matches_the_spline_between_the_points():
+    x = np.linspace(ALPHA[0], ALPHA[-1], 997)
+    values, slopes = TABLE.alpha_table.evaluate(x)
+    for column, data in enumerate((c.CL_list, c.CM_list, c.CD_list)):
+        spline = CubicSpline(ALPHA, data)
+        np.testing.assert_allclose(values[column], spline(x), rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(slopes[column], spline(x, 1), rtol=1e-9, atol=1e-12)
+
+def test_continues_linearly_beyond_the_table():
+    table = CubicTable([0.0, 1.0, 2.0, 4.0], ([0.0, 1.0, 0.0, 2.0],))
+    for end, outside in ((0.0, (-0.5, -2.0, -10.0)), (4.0, (4.5, 6.0, 10.0))):
+        (value,), (slope,) = table.evaluate(end)
+        for x in outside:
+            (continued,), (continued_slope,) = table.evaluate(x)
+            assert continued == pytest.approx(value + slope * (x - end), rel=1e-12, abs=1e-12)
+            assert continued_slope == pytest.approx(slope, rel=1e-12)
+
+def test_scalar_and_array_lookups_agree():
+    rng = np.random.default_rng(1)
+    alpha = rng.uniform(-0.5, 0.5, 50)
+    delta = rng.uniform(-0.3, 0.3, 50)
+    arrays = np.array(TABLE.coefficients(alpha, delta))
+    scalars = np.array([TABLE.coefficients(float(a), float(d)) for a, d in zip(alpha, delta)]).T
+    np.testing.assert_allclose(scalars, arrays, rtol=1e-12, atol=1e-14)
+
+def test_derivatives_match_finite_differences():
+    h = 1e-6
+    for alpha, delta in ((-0.05, 0.0), (0.1, -0.1), (0.2, 0.15)):
+        derivatives = TABLE.derivatives(alpha, delta)
+        by_alpha = (np.array(TABLE.coefficients(alpha + h, delta)) - TABLE.coefficients(alpha - h, delta)) / (2 * h)
+        by_delta = (np.array(TABLE.coefficients(alpha, delta + h)) - TABLE.coefficients(alpha, delta - h)) / (2 * h)
+        np.testing.assert_allclose(derivatives, np.concatenate([by_alpha, by_delta]), rtol=1e-6, atol=1e-8)
+
+def test_trim_elevator_zeroes_the_moment():
+    for alpha in (-0.05, 0.0, 0.08, 0.15):
+        delta, slope = TABLE.trim_elevator(alpha)
+        assert TABLE.coefficients(alpha, float(delta))[2] == pytest.approx(0, abs=1e-12)
+        h = 1e-6
+        expected = (TABLE.trim_elevator(alpha + h)[0] - TABLE.trim_elevator(alpha - h)[0]) / (2 * h)
+        assert slope == pytest.approx(expected, rel=1e-6)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import atmosphere
+import forms as f
+import aircraft as ac
+
+# ISA density [kg/m^3] from the standard tables, against geopotential altitude [m]
+KNOWN = {0: 1.2250, 1000: 1.1117, 5000: 0.7361, 11000: 0.3639, 15000: 0.1937, 20000: 0.08803}
+
+@pytest.mark.parametrize("altitude", KNOWN)
+def test_density_at_known_altitudes(altitude):
+    assert atmosphere.isa_density(altitude) == pytest.approx(KNOWN[altitude], rel=5e-4)
+    assert atmosphere.ISA.density(float(altitude)) == pytest.approx(KNOWN[altitude], rel=5e-4)
+
+def test_table_interpolation_error():
+    h = np.linspace(-1000, 20000, 7919)
+    exact = atmosphere.isa_density(h)
+    np.testing.assert_allclose(atmosphere.ISA.density(h), exact, rtol=5e-7)
+    np.testing.assert_allclose([atmosphere.ISA.density(float(x)) for x in h[::50]], exact[::50], rtol=5e-7)
+
+def test_outside_the_table():
+    assert atmosphere.ISA.density(-5000.0) == atmosphere.ISA.density(-1000.0)
+    assert atmosphere.ISA.density(30000.0) == atmosphere.ISA.density(20000.0)
+    assert atmosphere.ISA.gradient(30000.0) == 0
+
+@pytest.mark.parametrize("altitude", [0, 2000, 15000])
+def test_equations_use_the_density_at_altitude(altitude):
+    # The same as a fixed air density equal to the ISA density at -ze
+    isa = ac.Aircraft(atmosphere=atmosphere.ISA)
+    fixed = ac.Aircraft(air_density=float(atmosphere.isa_density(altitude)))
+    y = np.array([0.01, 0.02, 100.0, 2.0, 0.0, -altitude])
+    np.testing.assert_allclose(f.Equations(0, y, -0.05, 2000.0, isa), f.Equations(0, y, -0.05, 2000.0, fixed),
+                               rtol=1e-6, atol=1e-12)
@@ -0,0 +1,23 @@
+import json
+import benchmark
+import forms as f
+
+def test_compare_flags_regressions():
+    baseline = {"A": {"seconds": 1.0}, "B": {"seconds": 2.0}, "C": {"seconds": 1.0}}
+    results = {"A": {"seconds": 1.05}, "B": {"seconds": 2.5}, "D": {"seconds": 9.0}}
+    rows = benchmark.compare(results, baseline, tolerance=0.1)
+
+    assert [row[0] for row in rows] == ["A", "B"]
+    assert [row[4] for row in rows] == [False, True]
+    assert rows[1][3] == 1.25
+
+def test_bench_rhs_times_every_backend():
+    times = benchmark.bench_rhs({"": benchmark.s.c, "fixed": benchmark.ac.Aircraft()}, rounds=1, chunk=200)
+    assert set(times) == {(name, label) for name in f.BACKENDS for label in ("", "fixed")}
+    assert all(0 < seconds < 1e-2 for seconds in times.values())
+
+def test_results_are_json():
+    results = {"Trim": benchmark.bench_trim(5, 1)}
+    document = json.loads(json.dumps({"machine": benchmark.machine_info(), "seed": benchmark.SEED, "results": results}))
+    assert document["results"]["Trim"]["seconds"] > 0
+    assert document["machine"]["python"]
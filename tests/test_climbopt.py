@@ -0,0 +1,45 @@
+import numpy as np
+from scipy import integrate
+import forms as f
+import simulation as s
+from climbopt import NODE, ClimbOptimiser, integrate_segments, segment_sensitivities
+
+def start_states():
+    # Three segments from trims at different speeds and path angles, with different controls and durations
+    trims = [s.Trim(V, gamma) for V, gamma in ((90, 0), (110, 0.05), (130, -0.02))]
+    states = np.array([[0, trim.theta, trim.ub, trim.wb, 0, -1000 - 500 * k] for k, trim in enumerate(trims)]).T
+    delta = np.array([trim.delta for trim in trims]) + np.array([-0.01, 0.0, 0.005])
+    thrust = np.array([trim.thrust for trim in trims]) + np.array([500.0, 0.0, -200.0])
+    return states, delta, thrust, np.array([5.0, 12.0, 8.0])
+
+def test_segments_integrate_like_separate_solves():
+    states, delta, thrust, durations = start_states()
+    end = integrate_segments(states, delta, thrust, durations)
+    for k in range(3):
+        single = integrate.solve_ivp(lambda t, y: f.Equations(t, y, delta[k], thrust[k]), [0, durations[k]], states[:, k],
+                                     rtol=1e-10, atol=1e-10)
+        np.testing.assert_allclose(end[:, k], single.y[:, -1], rtol=1e-7, atol=1e-6)
+
+def test_duration_derivative_is_the_equations():
+    # The end state moves with the duration at the rate of the equations of motion there
+    states, delta, thrust, durations = start_states()
+    nodes = states[NODE].T
+    controls = np.stack([delta, thrust], axis=1)
+    end, derivatives = segment_sensitivities(nodes, controls, 10.0)
+    for k in range(3):
+        y = np.zeros(6)
+        y[NODE] = end[k]
+        rate = np.array(f.Equations(0, y, delta[k], thrust[k]))[NODE]
+        np.testing.assert_allclose(derivatives[k, :, 7], rate, rtol=1e-5, atol=1e-7)
+
+def test_climb_reaches_the_final_altitude():
+    opt = ClimbOptimiser(100, 1000, 1200, segments=6).run()
+    assert opt.success
+    assert opt.defect < 1e-6
+    assert opt.timeBounds[0] <= opt.climbTime <= opt.timeBounds[1]
+    assert abs(-opt.nodes[-1, 4] - 1200) < 1e-6
+
+    # Through the nonlinear A3 the schedule ends level at the final altitude
+    run = opt.replay()
+    assert abs(-run.data.y[5, -1] - 1200) < 1.0
+    assert abs(run.data.y[0, -1]) < 1e-4
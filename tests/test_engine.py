@@ -0,0 +1,44 @@
+import threading
+import numpy as np
+import pytest
+import engine
+import simulation as s
+
+A3_CASE = {"trimVelocity": 100, "trimGamma": 0, "t_end": 60, "initialAltitude": 2000,
+           "time_changes": [(20.0, -0.0052, 0.0)]}
+
+def test_progress_does_not_change_the_run():
+    times = []
+    result = engine.simulate(**A3_CASE, progress=lambda t, y: times.append(t))
+    plain = engine.simulate(**A3_CASE)
+
+    np.testing.assert_array_equal(result.y[:, -1], plain.y[:, -1])
+    assert len(times) >= plain.nfev
+    assert times[0] == 0 and max(times) == pytest.approx(A3_CASE["t_end"])
+
+def test_cancel_from_another_thread():
+    # As in the GUI: the worker polls an event from the progress callback
+    cancel = threading.Event()
+    reached = []
+    outcome = {}
+
+    def progress(t, y):
+        reached.append(t)
+        if t > 10:
+            cancel.set()
+        if cancel.is_set():
+            raise s.SimulationCancelled()
+
+    def worker():
+        try:
+            outcome["result"] = engine.simulate(**A3_CASE, progress=progress)
+        except s.SimulationCancelled:
+            outcome["cancelled"] = True
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+
+    assert not thread.is_alive()
+    assert outcome == {"cancelled": True}
+    assert 10 < reached[-1] < A3_CASE["t_end"]
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+import simulation as s
+from ensemble import A3Ensemble
+
+VELOCITY = [90, 100, 120]
+CHANGES = [[(10.0, -0.0052, 0.0)], [(5.0, 0.003, 500.0), (20.0, -0.003, 0.0)], []]
+
+@pytest.mark.parametrize("method", ["RK45", "RK4"])
+def test_members_match_A3(method):
+    ensemble = A3Ensemble(VELOCITY, 0, 40, 2000, CHANGES, method=method, dt=0.01, sample_rate=10)
+    for i, (velocity, changes) in enumerate(zip(VELOCITY, CHANGES)):
+        member = ensemble.member(i)
+        single = s.A3(velocity, 0, 40, 2000, changes, display=False).data.sample(member.t)
+        # A3 runs at the default solve_ivp tolerance (rtol 1e-3), the members share the step of the least smooth one
+        np.testing.assert_allclose(member.y, single, rtol=2e-3, atol=1e-3)
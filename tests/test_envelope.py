@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+import simulation as s
+from envelope import DELTA_LIMIT, EnvelopeMap
+
+@pytest.fixture(scope="module")
+def envelope():
+    return EnvelopeMap(40, 250, -10, 20, cells=(4, 4), max_depth=5)
+
+def test_refines_only_where_needed(envelope):
+    assert envelope.solves == np.count_nonzero(envelope.evaluated)
+    assert envelope.solves < envelope.uniform_solves / 5
+    # The leaf cells tile the envelope
+    assert np.sum(envelope.cells[:, 2]**2) == (envelope.shape[0] - 1) * (envelope.shape[1] - 1)
+
+def test_interpolation_matches_trim(envelope):
+    rng = np.random.default_rng(0)
+    V = rng.uniform(40, 250, 200)
+    gamma = rng.uniform(-10, 20, 200)
+    thrust, delta, feasible = envelope.interpolate(V, gamma)
+    exact = s.trim_batch(V, np.deg2rad(gamma))
+
+    assert exact.converged.all()
+    # The tolerances are checked at the cell centres, so allow them twice over elsewhere in the cells
+    assert np.max(np.abs(thrust - exact.thrust)) < 2 * envelope.thrust_tol
+    assert np.max(np.abs(delta - exact.delta)) < 2 * envelope.delta_tol
+    exact_feasible = (np.abs(exact.delta) <= DELTA_LIMIT) & (exact.thrust >= 0)
+    assert np.mean(feasible == exact_feasible) > 0.95
+
+def test_cell_corners_are_exact(envelope):
+    # The lower corner of every leaf cell is interpolated in that cell. (Its other corners may lie on the edge of a
+    # larger neighbour, which interpolates between its own corners instead.)
+    i, j, _ = envelope.cells.T
+    thrust, delta, feasible = envelope.interpolate(envelope.V_values[i], envelope.gamma_values[j])
+    np.testing.assert_allclose(thrust, envelope.thrust[i, j], rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(delta, envelope.delta[i, j], rtol=1e-9, atol=1e-12)
+    np.testing.assert_array_equal(feasible, envelope.feasible[i, j])
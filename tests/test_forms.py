@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import aerotable
+import aircraft as ac
+import atmosphere
+import forms as f
+import simulation as s
+
+AIRCRAFT = {"fixed": ac.Aircraft(), "ISA": ac.Aircraft(atmosphere=atmosphere.ISA),
+            "table": ac.Aircraft(aero=aerotable.TABLE)}
+
+def states():
+    # States of an A3 run, with its controls
+    run = s.A3(100, 0, 60, 2000, [(20, -0.0052, 0)], display=False)
+    return [(t, y, *run.schedule(t)) for t, y in zip(run.data.t[::10], run.data.y.T[::10])]
+
+STATES = states()
+
+@pytest.mark.parametrize("name", AIRCRAFT)
+def test_fused_matches_equations(name):
+    aircraft = AIRCRAFT[name]
+    fused = f.Fused_Equations(aircraft)
+    for t, y, delta, thrust in STATES:
+        expected = f.Equations(t, y, delta, thrust, aircraft)
+        np.testing.assert_allclose(fused(t, y, delta, thrust), expected, rtol=1e-9, atol=1e-12)
+        # Also from a list state, into a given output array
+        out = np.empty(6)
+        assert fused(t, list(y), delta, thrust, out) is out
+        np.testing.assert_allclose(out, expected, rtol=1e-9, atol=1e-12)
+
+def central_differences(function, x, relative_step=1e-6):
+    # Columns of the derivative of 'function' with respect to each entry of x
+    x = np.asarray(x, dtype=float)
+    columns = []
+    for k in range(len(x)):
+        h = relative_step * max(1.0, abs(x[k]))
+        step = np.zeros_like(x)
+        step[k] = h
+        columns.append((np.asarray(function(x + step)) - np.asarray(function(x - step))) / (2 * h))
+    return np.stack(columns, axis=1)
+
+@pytest.mark.parametrize("name", AIRCRAFT)
+def test_jacobian_matches_finite_differences(name):
+    aircraft = AIRCRAFT[name]
+    # The ISA density is piecewise linear in altitude; the first state is on a table knot, where it has no derivative
+    for t, y, delta, thrust in STATES[1:]:
+        J = f.Jacobian(t, y, delta, thrust, aircraft)
+        expected = central_differences(lambda x: f.Equations(t, x, delta, thrust, aircraft), y)
+        np.testing.assert_allclose(J, expected, rtol=1e-5, atol=1e-7)
+
+        B = f.Control_Jacobian(t, y, delta, thrust, aircraft)
+        expected = central_differences(lambda u: f.Equations(t, y, u[0], u[1], aircraft), [delta, thrust])
+        np.testing.assert_allclose(B, expected, rtol=1e-5, atol=1e-7)
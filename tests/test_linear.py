@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+import linear
+
+STATES = ("q", "theta", "ub", "wb", "xe", "ze")
+
+def test_error_is_second_order_in_the_input():
+    # The linear model drops terms of second order in the deviation, so halving the elevator step quarters the error
+    errors = [linear.compare(100, 0, 20, 2000, [(1.0, step, 0.0)])[2] for step in (-0.004, -0.002, -0.001)]
+    for coarse, fine in zip(errors[:-1], errors[1:]):
+        for name in STATES:
+            assert 3.3 < coarse[name] / fine[name] < 4.7, name
+
+def test_trim_is_steady():
+    model = linear.LinearModel.at(100, 0, 2000)
+    t = np.linspace(0, 50, 11)
+    y = model.response(t).y
+    np.testing.assert_allclose(y[:4], model.x0[:4, None] * np.ones_like(t), atol=1e-9)
+    # Level flight at 100 m/s
+    np.testing.assert_allclose(y[4], 100 * t, rtol=1e-9)
+    np.testing.assert_allclose(y[5], -2000, atol=1e-6)
+
+def test_uniform_and_uneven_times_agree():
+    model = linear.LinearModel.at(100, 0, 2000)
+    changes = [(2.0, -0.002, 100.0), (7.5, 0.001, 0.0)]
+    uniform = np.linspace(0, 30, 601)
+    # Every other time moved a little, so that these go through the step by step path
+    uneven = uniform.copy()
+    uneven[1::2] += 1e-3
+    a = model.response(uniform, changes).y
+    b = model.response(uneven, changes).y
+    np.testing.assert_allclose(a[:, ::2], b[:, ::2], rtol=1e-9, atol=1e-9)
+
+def test_modes():
+    modes = {mode.name: mode for mode in linear.LinearModel.at(100, 0).modes() if mode.name}
+    assert set(modes) == {"phugoid", "short period"}
+    assert modes["short period"].frequency > 5 * modes["phugoid"].frequency
+    assert modes["short period"].damping > 0
+    assert modes["phugoid"].period == pytest.approx(2 * np.pi / modes["phugoid"].eigenvalue.imag)
@@ -0,0 +1,37 @@
+import numpy as np
+import simulation as s
+from montecarlo import MonteCarlo, StreamingPercentiles
+
+CASE = (100, 0, 30, 2000, [(10.0, -0.0052, 0.0)])
+
+def test_streaming_percentiles_match_numpy():
+    rng = np.random.default_rng(3)
+    values = rng.normal(5.0, 2.0, (4000, 3, 2))
+    stream = StreamingPercentiles(bins=2000)
+    for batch in np.array_split(values, 7):
+        stream.update(batch)
+
+    np.testing.assert_allclose(stream.mean, values.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(stream.std, values.std(axis=0), rtol=1e-9)
+    # Accurate to about a bin width, and a little more for the sampling noise between neighbouring samples
+    bin_width = stream.width.reshape(3, 2)
+    for q in (5, 50, 95):
+        assert np.all(np.abs(stream.percentile(q) - np.percentile(values, q, axis=0)) < 2 * bin_width + 0.02)
+
+def test_without_dispersion_the_samples_fly_the_nominal_case():
+    mc = MonteCarlo(*CASE, n_samples=6, batch_size=4, dispersion={"CD0": 0.0}, sample_rate=1).run()
+    nominal = s.A3(*CASE, display=False, sample_rate=1)
+    trim = nominal.Trim
+
+    assert mc.failed == 0
+    assert mc.thrust.min == mc.thrust.max == trim.thrust
+    np.testing.assert_allclose(mc.delta.mean, trim.delta, rtol=1e-12)
+    np.testing.assert_array_equal(nominal.data.t, mc.t)
+    np.testing.assert_allclose(mc.response.mean, nominal.data.y, rtol=1e-4, atol=1e-6)
+
+def test_seed_is_reproducible():
+    runs = [MonteCarlo(*CASE, n_samples=8, batch_size=4, seed=seed, sample_rate=1).run() for seed in (1, 1, 2)]
+    for q, band in runs[0].envelope((5, 50, 95)).items():
+        np.testing.assert_array_equal(band, runs[1].envelope((q,))[q])
+    assert not np.array_equal(runs[0].thrust.mean, runs[2].thrust.mean)
+    assert runs[0].thrust.n + runs[0].failed == 8
@@ -0,0 +1,24 @@
+import numpy as np
+import forms as f
+from realtime import RealTimeSimulator
+
+def test_step_is_classic_runge_kutta():
+    simulator = RealTimeSimulator(100, 0, 2000)
+    y = simulator.y.copy()
+    delta, thrust, dt = simulator.Trim.delta - 0.0052, simulator.Trim.thrust, 0.01
+
+    def E(t, state):
+        return np.array(f.Equations(t, state, delta, thrust))
+
+    for i in range(50):
+        t = i * dt
+        k1 = E(t, y)
+        k2 = E(t + dt / 2, y + dt / 2 * k1)
+        k3 = E(t + dt / 2, y + dt / 2 * k2)
+        k4 = E(t + dt, y + dt * k3)
+        y = y + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        simulator.step(dt, delta, thrust)
+
+    np.testing.assert_allclose(simulator.y, y, rtol=1e-12, atol=1e-12)
+    assert abs(simulator.t - 50 * dt) < 1e-12
+    assert simulator.steps == 50
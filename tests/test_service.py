@@ -0,0 +1,38 @@
+import asyncio
+import json
+import pytest
+from service import Service
+
+SIMULATE = {"trimVelocity": 100, "trimGamma": 0, "t_end": 300, "initialAltitude": 2000,
+            "time_changes": [[100, -0.0052, 0]]}
+
+def dispatch(service, path, request):
+    return asyncio.run(service.Dispatch("POST", path, json.dumps(request).encode()))
+
+@pytest.mark.parametrize("path, request_", [
+    ("/trim", {"velocity": "abc", "gamma": 0.0}),
+    ("/trim", {"velocity": 100, "gamma": [0.0, 0.1]}),
+    ("/sweep", {"V_values": [90, "fast"], "gamma_values": [0.0]}),
+    ("/simulate", {"trimVelocity": 100, "trimGamma": 0, "t_end": None, "initialAltitude": 2000, "time_changes": []}),
+    ("/simulate", {"trimVelocity": 100, "trimGamma": 0, "t_end": 300, "initialAltitude": 2000,
+                   "time_changes": [[100, -0.0052]]}),
+    ("/simulate", dict(SIMULATE, backend="nope")),
+    ("/simulate", dict(SIMULATE, method=5)),
+    ("/simulate", dict(SIMULATE, method=["RK45"])),
+    ("/simulate", dict(SIMULATE, t_end=-10)),
+    ("/simulate", dict(SIMULATE, sample_rate=0)),
+    ("/simulate", dict(SIMULATE, time_changes=[[400, -0.0052, 0]])),
+    ("/simulate", dict(SIMULATE, time_changes=0)),
+    ("/sweep", {"V_values": [], "gamma_values": [0.0]}),
+])
+def test_non_numeric_fields_are_bad_requests(path, request_):
+    service = Service(workers=0)
+    status, payload = dispatch(service, path, request_)
+    assert status == 400
+    assert "error" in payload
+    assert service.counters["errors"] == 1
+
+def test_trim_accepts_numeric_strings():
+    status, payload = dispatch(Service(workers=0), "/trim", {"velocity": "100", "gamma": 0})
+    assert status == 200
+    assert payload["converged"]
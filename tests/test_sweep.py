@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+import engine
+import trajstore
+from sweep import Sweep
+
+A3_CASE = {"trimVelocity": 100, "trimGamma": 0, "t_end": 60, "initialAltitude": 2000,
+           "time_changes": [(20.0, -0.0052, 0.0)]}
+
+def test_A3_sweep_with_store(tmp_path):
+    cases = [dict(A3_CASE, store=str(tmp_path / f"run{k}"), time_changes=[(20.0, step, 0.0)])
+             for k, step in enumerate((-0.0052, 0.0052))]
+    results = Sweep("A3", cases=cases, path=str(tmp_path / "sweep.jsonl"), workers=1).run()
+
+    for case, record in zip(cases, results):
+        result = record["result"]
+        assert "error" not in result
+        assert result["success"]
+        stored = trajstore.load_trajectory(case["store"])
+        assert result["final_state"] == stored.y[:, -1].tolist()
+        assert result["nfev"] == stored.nfev
+
+def test_A3_altitude_extremes_on_a_fixed_grid(tmp_path):
+    # A thrust pulse: the altitude peaks between two solver steps
+    case = dict(A3_CASE, t_end=200, time_changes=[(5.0, 0.0, 2000.0), (20.0, 0.0, -2000.0)])
+    record, = Sweep("A3", cases=[case], path=str(tmp_path / "sweep.jsonl"), workers=1).run()
+    # The same run sampled finely; the solver steps alone miss the altitude peaks between them
+    fine = engine.simulate(**case, sample_rate=50)
+    steps = engine.simulate(**case)
+    assert record["result"]["max_altitude"] == pytest.approx(np.max(fine.altitude), abs=0.01)
+    assert record["result"]["min_altitude"] == pytest.approx(np.min(fine.altitude), abs=0.01)
+    assert np.max(fine.altitude) - np.max(steps.altitude) > 0.1
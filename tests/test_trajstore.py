@@ -0,0 +1,26 @@
+import numpy as np
+import engine
+import trajstore
+
+A3_CASE = {"trimVelocity": 100, "trimGamma": 0, "t_end": 60, "initialAltitude": 2000,
+           "time_changes": [(20.0, -0.0052, 0.0)]}
+
+def test_stored_trajectory_indexes_like_trajectory(tmp_path):
+    stored = engine.simulate(**A3_CASE, store=str(tmp_path / "run"))
+    memory = engine.simulate(**A3_CASE, sample_rate=50)
+
+    assert stored.y.shape == (6, len(stored.t))
+    assert stored.success and stored.nfev > 0
+    np.testing.assert_allclose(stored.y[:, -1], memory.y[:, -1], rtol=1e-9)
+    np.testing.assert_allclose(stored.y[1], memory.y[1], rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(stored.y[2:4, 10], memory.y[2:4, 10], rtol=1e-9)
+    np.testing.assert_allclose(np.asarray(stored.y) - memory.y, 0, atol=1e-9)
+
+def test_load_trajectory_reopens_the_run(tmp_path):
+    path = str(tmp_path / "run")
+    stored = engine.simulate(**A3_CASE, store=path)
+    loaded = trajstore.load_trajectory(path)
+
+    np.testing.assert_array_equal(np.asarray(loaded.t), np.asarray(stored.t))
+    np.testing.assert_array_equal(np.asarray(loaded.y), np.asarray(stored.y))
+    assert loaded.nfev == stored.nfev
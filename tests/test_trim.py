@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import simulation as s
+import aircraft as ac
+import aerotable
+
+# The grid of the B1 example in 'simulation'
+V_VALUES = np.arange(50, 200, 10)
+GAMMA_VALUES = np.deg2rad(np.arange(-2, 2.5, 0.5))
+
+@pytest.mark.parametrize("aircraft", [s.c, ac.Aircraft(aero=aerotable.TABLE)], ids=["fits", "table"])
+def test_trim_grid_matches_scalar_trim(aircraft):
+    grid = s.trim_grid(V_VALUES, GAMMA_VALUES, aircraft=aircraft)
+    assert grid.alpha.shape == (len(V_VALUES), len(GAMMA_VALUES))
+
+    for i, V in enumerate(V_VALUES):
+        for j, gamma in enumerate(GAMMA_VALUES):
+            trim = s.Trim(V, gamma, aircraft=aircraft)
+            assert grid.converged[i, j] == trim.converged
+            for name in ("alpha", "delta", "theta", "thrust", "ub", "wb"):
+                np.testing.assert_allclose(getattr(grid, name)[i, j], getattr(trim, name), rtol=1e-8, atol=1e-9,
+                                           err_msg=f"{name} at V={V}, gamma={gamma}")
+
+def test_B1_uses_the_grid():
+    b1 = s.B1(50, 200, -2, 2.5, 10, 0.5, display=False)
+    trim = s.Trim(120, np.deg2rad(1.0))
+    i, j = list(b1.V_values).index(120), list(b1.gamma_values).index(1.0)
+    np.testing.assert_allclose(b1.T_values[i, j], trim.thrust, rtol=1e-8)
+    np.testing.assert_allclose(b1.delta_values[i, j], np.rad2deg(trim.delta), rtol=1e-8)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import constants as c
+import simulation as s
+from trimtable import FIELDS, METHODS, StaleTableError, TrimTable
+
+@pytest.fixture(scope="module")
+def table():
+    return TrimTable.build(V_min=60, V_max=200, gamma_min=np.deg2rad(-5), gamma_max=np.deg2rad(10), n_V=15, n_gamma=16)
+
+def test_table_reproduces_its_nodes(table):
+    for V, gamma in [(60, np.deg2rad(-5)), (130, table.gamma_values[7]), (200, np.deg2rad(10))]:
+        exact = s.Trim(V, gamma)
+        found = table.trim(V, gamma)
+        for name in FIELDS:
+            assert getattr(found, name) == pytest.approx(getattr(exact, name), rel=1e-9, abs=1e-12)
+
+@pytest.mark.parametrize("method", METHODS)
+def test_error_bounds_the_cell_centres(table, method):
+    V_mid = 0.5 * (table.V_values[1:] + table.V_values[:-1])
+    gamma_mid = 0.5 * (table.gamma_values[1:] + table.gamma_values[:-1])
+    for V, gamma in [(V_mid[0], gamma_mid[0]), (V_mid[6], gamma_mid[9]), (V_mid[-1], gamma_mid[-1])]:
+        exact = s.Trim(V, gamma)
+        found = table.trim(V, gamma, method)
+        assert found.error == table.error[method]
+        for name in FIELDS:
+            assert abs(getattr(found, name) - getattr(exact, name)) <= 1.001 * found.error[name] + 1e-12
+
+def test_outside_the_envelope(table):
+    assert table.trim(50, 0) is None
+    assert table.trim(100, np.deg2rad(20)) is None
+
+def test_stale_table_is_refused(table, tmp_path, monkeypatch):
+    path = str(tmp_path / "table.npz")
+    table.save(path)
+    loaded = TrimTable.load(path)
+    assert loaded.error == table.error
+    np.testing.assert_array_equal(loaded.data["thrust"], table.data["thrust"])
+
+    monkeypatch.setattr(c, "CD0", c.CD0 * 1.1)
+    assert not table.current()
+    assert table.trim(100, 0) is None
+    with pytest.raises(StaleTableError):
+        TrimTable.load(path)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'trajstore', keeps long simulation outputs on disk instead of in memory.
+A trajectory is a directory with one .npy file per column (t, q, theta, ub, wb, xe, ze). 'TrajectoryWriter' buffers
+a fixed number of samples and appends them to the column files, rewriting the fixed size .npy header after every
+chunk, so each file is always a valid array of everything written so far. 'load_trajectory' memory-maps the columns,
+so plotting and analysis read the data from disk instead of copying it into memory.
+'''
+
+# Import libraries & modules
+import json
+import os
+import numpy as np
+
+COLUMNS = ("t", "q", "theta", "ub", "wb", "xe", "ze")
+HEADER_SIZE = 128
+
+def npy_header(n):
+    # Version 1.0 .npy header for a float64 vector of length n, padded to a fixed size so it can be rewritten in place
+    header = repr({"descr": "<f8", "fortran_order": False, "shape": (n,)})
+    header = header.ljust(HEADER_SIZE - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+#------------------------------------------------------------------------------
+
+class TrajectoryWriter:
+    def __init__(self, path, chunk = 8192):
+        self.path = path
+        self.chunk = chunk
+        self.count = 0
+        self.meta = {}
+        os.makedirs(path, exist_ok = True)
+
+        self.files = {}
+        for name in COLUMNS:
+            self.files[name] = open(os.path.join(path, f"{name}.npy"), "wb")
+            self.files[name].write(npy_header(0))
+
+        # Preallocated buffer of one chunk, one row per column
+        self.buffer = np.empty((len(COLUMNS), chunk))
+        self.filled = 0
+
+    def append(self, t, y):
+        # Add samples: t has shape (n,), y has shape (6, n)
+        t = np.atleast_1d(t)
+        y = np.reshape(y, (6, -1))
+        start = 0
+        while start < len(t):
+            n = min(len(t) - start, self.chunk - self.filled)
+            self.buffer[0, self.filled:self.filled + n] = t[start:start + n]
+            self.buffer[1:, self.filled:self.filled + n] = y[:, start:start + n]
+            self.filled += n
+            start += n
+            if self.filled == self.chunk:
+                self.flush()
+
+    def flush(self):
+        if self.filled == 0:
+            return
+        self.count += self.filled
+        for row, name in enumerate(COLUMNS):
+            file = self.files[name]
+            file.seek(0, os.SEEK_END)
+            file.write(self.buffer[row, :self.filled].astype("<f8").tobytes())
+            file.seek(0)
+            file.write(npy_header(self.count))
+            file.flush()
+        self.filled = 0
+
+    def close(self):
+        self.flush()
+        for file in self.files.values():
+            file.close()
+        with open(os.path.join(self.path, "meta.json"), "w") as file:
+            json.dump(dict(self.meta, samples = self.count), file, indent = 2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+#------------------------------------------------------------------------------
+# Read-only (6, n) view of the state columns, indexed like the 'y' array of a 'simulation.Trajectory': y[k] is the k-th
+# state (a memory-mapped column), y[:, j], y[k, j] and slices read only the samples asked for. np.asarray(y) and
+# arithmetic load the whole array.
+
+class StateColumns(np.lib.mixins.NDArrayOperatorsMixin):
+    def __init__(self, rows):
+        self.rows = rows
+        self.shape = (len(rows), len(rows[0]))
+        self.ndim = 2
+        self.dtype = rows[0].dtype
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        row, *sample = index if isinstance(index, tuple) else (index,)
+        if len(sample) > 1:
+            raise IndexError(f"too many indices for a {self.shape} state array")
+        if isinstance(row, (int, np.integer)):
+            return self.rows[row][sample[0]] if sample else self.rows[row]
+        rows = [self.rows[k] for k in np.arange(len(self.rows))[row]]
+        return np.stack([column[sample[0]] if sample else column for column in rows])
+
+    def __array__(self, dtype = None, copy = None):
+        return np.stack(self.rows).astype(dtype or self.dtype, copy = False)
+
+#------------------------------------------------------------------------------
+# Memory-mapped trajectory. 't' and the rows of 'y' are read-only views of the files, so 'Visualise.Display_Sim'
+# and any analysis work on them without loading the whole run.
+
+class StoredTrajectory:
+    def __init__(self, path):
+        self.path = path
+        self.columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode = "r") for name in COLUMNS}
+        self.t = self.columns["t"]
+        self.y = StateColumns([self.columns[name] for name in COLUMNS[1:]])
+
+        self.meta = {}
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as file:
+                self.meta = json.load(file)
+        # Solver counters as on a 'simulation.Trajectory'; without meta.json the run was not closed
+        self.status = self.meta.get("status", 0 if self.meta else -1)
+        self.message = self.meta.get("message", "" if self.meta else "No meta.json, the run did not finish")
+        self.success = self.status >= 0
+        self.nfev = self.meta.get("nfev", 0)
+        self.njev = self.meta.get("njev", 0)
+        self.nlu = self.meta.get("nlu", 0)
+
+    def __getattr__(self, name):
+        # Named columns (q, theta, ...) and solver counters stored in meta.json
+        columns = self.__dict__.get("columns", {})
+        meta = self.__dict__.get("meta", {})
+        if name in columns:
+            return columns[name]
+        if name in meta:
+            return meta[name]
+        raise AttributeError(name)
+
+    @property
+    def altitude(self):
+        return -self.columns["ze"]
+
+def load_trajectory(path):
+    return StoredTrajectory(path)
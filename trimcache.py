@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'trimcache', remembers trim conditions so that identical requests are not solved again.
+Results are kept in an in-process LRU and, optionally, in an SQLite file shared between runs. Every entry is keyed on
+the velocity, path angle and a hash of the aircraft and aerodynamic constants in 'constants', so changing the aero
+tables or the vehicle parameters automatically bypasses old entries. For an aircraft with an atmosphere the hash uses
+the density at the trim altitude, and for an aircraft with a table aero model the identity of its tables. On a miss, the angle of attack of the nearest
+cached trim points is used as the initial guess for the Newton-Raphson solve.
+One 'TrimService' can be shared between threads (the GUI trims on the Tk thread and simulates on a worker): the LRU
+and the SQLite connection are only used under its lock, and the Newton solve itself runs outside it.
+'''
+
+# Import libraries & modules
+import copy
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+import constants as c
+
+# Constants that the trim solution depends on
+KEY_CONSTANTS = ("CL0", "CLa", "CLde", "CM0", "CMa", "CMde", "CD0", "K",
+                 "gravity", "air_density", "wing_surface", "cbar", "mass")
+
+def coefficient_key(aircraft = c, altitude = 0.0):
+    # Short hash of the current values of KEY_CONSTANTS, from 'constants' or an 'aircraft.Aircraft'.
+    # With an atmosphere the trim depends on the altitude only through the density there, which replaces air_density.
+    values = np.array([getattr(aircraft, name) for name in KEY_CONSTANTS], dtype=float)
+    atmosphere = getattr(aircraft, "atmosphere", None)
+    if atmosphere is not None:
+        values[KEY_CONSTANTS.index("air_density")] = atmosphere.density(float(altitude))
+    aero = getattr(aircraft, "aero", None)
+    tables = b"" if aero is None else aero.key.encode()
+    return hashlib.sha1(values.tobytes() + tables).hexdigest()[:16]
+
+#------------------------------------------------------------------------------
+# Memoizing trim solver. 'solver' is the 'simulation.Trim' class (or anything with the same constructor and
+# 'from_alpha' class method).
+
+class TrimService:
+    def __init__(self, solver, maxsize = 1024, path = None, neighbours = 4):
+        self.solver = solver
+        self.maxsize = maxsize
+        self.neighbours = neighbours
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.db = None
+        if path is not None:
+            # Opened once and used from any thread, always under the lock
+            self.db = sqlite3.connect(path, check_same_thread = False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS trims (coefficients TEXT, velocity REAL, gamma REAL, "
+                            "alpha REAL, PRIMARY KEY (coefficients, velocity, gamma))")
+            self.db.commit()
+
+    def trim(self, trimVelocity, trimGamma, aircraft = c, altitude = 0.0):
+        key = (coefficient_key(aircraft, altitude), float(trimVelocity), float(trimGamma))
+
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.Copy(self.cache[key], cached = True)
+
+            row = None
+            if self.db is not None:
+                row = self.db.execute("SELECT alpha FROM trims WHERE coefficients = ? AND velocity = ? AND gamma = ?",
+                                      key).fetchone()
+            if row is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                guess = self.Guess(*key)
+
+        if row is not None:
+            trim = self.solver.from_alpha(trimVelocity, trimGamma, row[0], aircraft = aircraft, altitude = altitude)
+            self.Store(key, trim, write = False)
+            return self.Copy(trim, cached = True)
+
+        trim = self.solver(trimVelocity, trimGamma, initial_guess = guess, aircraft = aircraft, altitude = altitude)
+        self.Store(key, trim)
+        return self.Copy(trim, cached = False)
+
+    def Copy(self, trim, cached):
+        # Callers get their own copy, flagged when it came from the cache; a cached trim took no Newton iterations
+        trim = copy.copy(trim)
+        trim.cached = cached
+        if cached:
+            trim.iterations = 0
+        return trim
+
+    def Store(self, key, trim, write = True):
+        with self.lock:
+            self.cache[key] = trim
+            self.cache.move_to_end(key)
+            if len(self.cache) > self.maxsize:
+                self.cache.popitem(last = False)
+            if write and self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO trims VALUES (?, ?, ?, ?)", key + (float(trim.alpha),))
+                self.db.commit()
+
+    def Guess(self, coefficients, velocity, gamma):
+        # Inverse distance weighted alpha of the nearest cached points with the same coefficients, called under the lock.
+        # Velocity is scaled so that 100 m/s counts like 1 rad of path angle.
+        points = [(V, g, trim.alpha) for (key, V, g), trim in self.cache.items() if key == coefficients]
+        if self.db is not None:
+            points += self.db.execute(
+                "SELECT velocity, gamma, alpha FROM trims WHERE coefficients = ? "
+                "ORDER BY ((velocity - ?) / 100) * ((velocity - ?) / 100) + (gamma - ?) * (gamma - ?) LIMIT ?",
+                (coefficients, velocity, velocity, gamma, gamma, self.neighbours)).fetchall()
+        if not points:
+            return 0.01
+
+        points = np.array(points, dtype=float)
+        distance = np.hypot((points[:, 0] - velocity) / 100, points[:, 1] - gamma)
+        nearest = np.argsort(distance)[:self.neighbours]
+        weights = 1 / (distance[nearest] + 1e-9)
+        return float(np.sum(weights * points[nearest, 2]) / np.sum(weights))
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "size": len(self.cache)}
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+'''
+
+CMM3 Group 7
+Benjamin, Rodrigo, Maurice, Nick, Jack, Stamatis
+October-November 2023
+
+This module, 'trimtable', precomputes trim conditions over a velocity - path angle envelope so that they can be
+looked up without running Newton-Raphson at query time. The table is solved once with 'simulation.trim_grid' (the
+batch form of 'Trim'), saved as a compressed .npz file, and queried by bilinear or bicubic interpolation on its
+uniform grid. When the table is built, the exact trim is also solved at every cell centre; the largest interpolation
+error found there is stored with the table and reported with every lookup.
+The table also stores the 'trimcache.coefficient_key' of the aero constants it was solved with. 'load' refuses a table
+whose key no longer matches (or rebuilds it), and a table answers no lookups once the constants have changed, so the
+exact solve is used instead of stale trims.
+Run 'python trimtable.py' to build the default table used by the UI.
+'''
+
+# Import libraries & modules
+import os
+import numpy as np
+from scipy import interpolate
+import simulation as s
+import trimcache
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trim_table.npz")
+FIELDS = ("alpha", "delta", "theta", "thrust")
+METHODS = ("linear", "cubic")
+
+class StaleTableError(ValueError):
+    pass
+
+#------------------------------------------------------------------------------
+# Trim condition read from the table, with the same attributes as 'simulation.Trim'
+
+class TableTrim:
+    def __init__(self, trimVelocity, trimGamma, values, error):
+        self.velocity = trimVelocity
+        self.gamma = trimGamma
+        self.alpha = values["alpha"]
+        self.delta = values["delta"]
+        self.theta = values["theta"]
+        self.thrust = values["thrust"]
+        self.ub = trimVelocity * np.cos(self.alpha)
+        self.wb = trimVelocity * np.sin(self.alpha)
+
+        # Largest interpolation error of each field found at the cell centres when the table was built
+        self.error = error
+
+#------------------------------------------------------------------------------
+
+class TrimTable:
+    def __init__(self, V_values, gamma_values, data, error, key = None):
+        self.V_values = V_values
+        self.gamma_values = gamma_values
+        self.data = data
+        self.error = error
+        self.splines = {}
+        # 'trimcache.coefficient_key' of the constants the table was solved with
+        self.key = key
+
+        # The grid is uniform, so a cell is found by division instead of a search
+        self.dV = V_values[1] - V_values[0]
+        self.dgamma = gamma_values[1] - gamma_values[0]
+
+    @classmethod
+    def build(cls, V_min = 30, V_max = 343, gamma_min = np.deg2rad(-89), gamma_max = np.deg2rad(89), n_V = 158, n_gamma = 179):
+        V_values = np.linspace(V_min, V_max, n_V)
+        gamma_values = np.linspace(gamma_min, gamma_max, n_gamma)
+
+        trims = s.trim_grid(V_values, gamma_values)
+        if not trims.converged.all():
+            raise ValueError(f"Trim did not converge for {np.count_nonzero(~trims.converged)} cells of the table")
+        table = cls(V_values, gamma_values, {name: getattr(trims, name) for name in FIELDS}, {}, trimcache.coefficient_key())
+
+        # Error estimate: exact trim at the cell centres, where interpolation is least accurate
+        V_mid = 0.5 * (V_values[1:] + V_values[:-1])
+        gamma_mid = 0.5 * (gamma_values[1:] + gamma_values[:-1])
+        exact = s.trim_grid(V_mid, gamma_mid, alpha_guess = 0.5 * (trims.alpha[1:, 1:] + trims.alpha[:-1, :-1]))
+        V, gamma = np.meshgrid(V_mid, gamma_mid, indexing="ij")
+        for method in METHODS:
+            values = table.lookup(V, gamma, method)
+            table.error[method] = {name: float(np.max(np.abs(values[name] - getattr(exact, name)))) for name in FIELDS}
+        return table
+
+    def save(self, path = DEFAULT_PATH):
+        errors = {f"error_{method}_{name}": value for method in METHODS for name, value in self.error[method].items()}
+        np.savez_compressed(path, V_values = self.V_values, gamma_values = self.gamma_values, key = self.key,
+                            **self.data, **errors)
+
+    @classmethod
+    def load(cls, path = DEFAULT_PATH, rebuild = False):
+        # A table solved with other constants (or saved without its key) raises StaleTableError, or with 'rebuild'
+        # is solved again with the current ones and saved over the old file
+        with np.load(path) as archive:
+            key = str(archive["key"]) if "key" in archive.files else None
+            if key == trimcache.coefficient_key():
+                data = {name: archive[name] for name in FIELDS}
+                error = {method: {name: float(archive[f"error_{method}_{name}"]) for name in FIELDS} for method in METHODS}
+                return cls(archive["V_values"], archive["gamma_values"], data, error, key)
+        if not rebuild:
+            raise StaleTableError(f"{path} was built for other aero constants; rebuild it with 'python trimtable.py'")
+        table = cls.build()
+        table.save(path)
+        return table
+
+    def current(self):
+        # Whether the constants are still those the table was solved with
+        return self.key == trimcache.coefficient_key()
+
+    def contains(self, V, gamma):
+        return ((self.V_values[0] <= V) & (V <= self.V_values[-1])
+                & (self.gamma_values[0] <= gamma) & (gamma <= self.gamma_values[-1]))
+
+    def lookup(self, V, gamma, method = "linear"):
+        # Interpolated fields for V and gamma inside the table (scalars or arrays)
+        if method == "cubic":
+            if not self.splines:
+                self.splines = {name: interpolate.RectBivariateSpline(self.V_values, self.gamma_values, values)
+                                for name, values in self.data.items()}
+            return {name: spline(V, gamma, grid = False) for name, spline in self.splines.items()}
+        if method != "linear":
+            raise ValueError(f"Unknown method '{method}', choose from {METHODS}")
+
+        # Bilinear interpolation
+        x = (np.asarray(V, dtype = float) - self.V_values[0]) / self.dV
+        y = (np.asarray(gamma, dtype = float) - self.gamma_values[0]) / self.dgamma
+        i = np.clip(x.astype(int), 0, len(self.V_values) - 2)
+        j = np.clip(y.astype(int), 0, len(self.gamma_values) - 2)
+        u = x - i
+        v = y - j
+        return {name: ((1 - u) * (1 - v) * values[i, j] + u * (1 - v) * values[i + 1, j]
+                       + (1 - u) * v * values[i, j + 1] + u * v * values[i + 1, j + 1])
+                for name, values in self.data.items()}
+
+    def trim(self, trimVelocity, trimGamma, method = "linear"):
+        # Single trim condition from the table, or None outside its envelope or once the constants have changed
+        if not self.contains(trimVelocity, trimGamma) or not self.current():
+            return None
+        if method == "linear":
+            values = self.Bilinear_Scalar(float(trimVelocity), float(trimGamma))
+        else:
+            values = {name: float(value) for name, value in self.lookup(trimVelocity, trimGamma, method).items()}
+        return TableTrim(trimVelocity, trimGamma, values, self.error[method])
+
+    def Bilinear_Scalar(self, V, gamma):
+        # Same as the linear 'lookup' for one point, without the array overhead
+        x = (V - self.V_values[0]) / self.dV
+        y = (gamma - self.gamma_values[0]) / self.dgamma
+        i = min(int(x), len(self.V_values) - 2)
+        j = min(int(y), len(self.gamma_values) - 2)
+        u = x - i
+        v = y - j
+        values = {}
+        for name, table in self.data.items():
+            (f00, f01), (f10, f11) = table[i:i + 2, j:j + 2].tolist()
+            values[name] = (1 - u) * (1 - v) * f00 + u * (1 - v) * f10 + (1 - u) * v * f01 + u * v * f11
+        return values
+
+def trim_lookup(trimVelocity, trimGamma, table = None, method = "linear"):
+    # Trim from the table when possible, otherwise the exact (cached) Newton-Raphson solve
+    trim = None if table is None else table.trim(trimVelocity, trimGamma, method)
+    if trim is None:
+        trim = s.trim_service.trim(trimVelocity, trimGamma)
+    return trim
+
+
+if __name__ == "__main__":
+    table = TrimTable.build()
+    table.save()
+    print(f"Saved {DEFAULT_PATH}: {len(table.V_values)} x {len(table.gamma_values)} points")
+    for method in METHODS:
+        print(f"Interpolation error bound ({method}): {table.error[method]}")